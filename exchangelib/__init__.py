@@ -6,13 +6,16 @@ from .attachments import FileAttachment, ItemAttachment
 from .autodiscover import discover
 from .configuration import Configuration
 from .credentials import DELEGATE, IMPERSONATION, Credentials, ServiceAccount
+from .errors import DeadlineExceeded
 from .ewsdatetime import EWSDate, EWSDateTime, EWSTimeZone, UTC, UTC_NOW
 from .extended_properties import ExtendedProperty, ExternId
 from .folders import SHALLOW, DEEP
 from .items import CalendarItem, Contact, DistributionList, Message, PostItem, Task
 from .properties import Body, HTMLBody, ItemId, Mailbox, Attendee, Room, RoomList
 from .restriction import Q
+from .throttling import RateLimiter, RetryPolicy, RetryRule, SharedRateLimiter, SharedBackoffGate
 from .transport import BASIC, DIGEST, NTLM
+from .util import deadline
 from .version import Build, Version
 
 __all__ = [
@@ -21,13 +24,16 @@ __all__ = [
     'discover',
     'Configuration',
     'DELEGATE', 'IMPERSONATION', 'Credentials', 'ServiceAccount',
+    'DeadlineExceeded',
     'EWSDate', 'EWSDateTime', 'EWSTimeZone', 'UTC', 'UTC_NOW',
     'ExtendedProperty',
     'CalendarItem', 'Contact', 'DistributionList', 'Message', 'PostItem', 'Task',
     'ItemId', 'Mailbox', 'Attendee', 'Room', 'RoomList', 'Body', 'HTMLBody',
     'Q',
+    'RateLimiter', 'RetryPolicy', 'RetryRule', 'SharedRateLimiter', 'SharedBackoffGate',
     'SHALLOW', 'DEEP',
     'BASIC', 'DIGEST', 'NTLM',
+    'deadline',
     'Build', 'Version',
 ]
 
@@ -79,6 +79,9 @@ class Account(object):
         # We may need to override the default server version on a per-account basis because Microsoft may report one
         # server version up-front but delegate account requests to an older backend server.
         self.version = self.protocol.version
+        # On Exchange 2013 and later, the server returns a cookie identifying the backend server that holds the
+        # mailbox. We replay it on requests for this account, so they are not proxied through a random backend server.
+        self.affinity_cookie = None
         self.root = Root.get_distinguished(account=self)
 
         assert isinstance(self.protocol, Protocol)
@@ -229,20 +232,8 @@ class Account(object):
                  BulkCreateResult objects are normal Item objects except they only contain the 'item_id' and 'changekey'
                  of the created item, and the 'item_id' on any attachments that were also created.
         """
-        assert message_disposition in MESSAGE_DISPOSITION_CHOICES
-        assert send_meeting_invitations in SEND_MEETING_INVITATIONS_CHOICES
-        if folder is not None:
-            assert isinstance(folder, Folder)
-            if folder.account != self:
-                raise ValueError('"Folder must belong to this account')
-        if message_disposition == SAVE_ONLY and folder is None:
-            raise AttributeError("Folder must be supplied when in save-only mode")
-        if message_disposition == SEND_AND_SAVE_COPY and folder is None:
-            folder = self.sent  # 'Sent' is default EWS behaviour
-        if message_disposition == SEND_ONLY and folder is not None:
-            raise AttributeError("Folder must be None in send-ony mode")
-        # bulk_create() on a queryset does not make sense because it returns items that have already been created
-        assert not isinstance(items, QuerySet)
+        folder = self._validate_bulk_create(folder=folder, items=items, message_disposition=message_disposition,
+                                            send_meeting_invitations=send_meeting_invitations)
         log.debug(
             'Adding items for %s (folder %s, message_disposition: %s, send_meeting_invitations: %s)',
             self,
@@ -266,6 +257,24 @@ class Account(object):
             )
         )
 
+    def _validate_bulk_create(self, folder, items, message_disposition, send_meeting_invitations):
+        # Validates the bulk_create() arguments and returns the folder to create the items in
+        assert message_disposition in MESSAGE_DISPOSITION_CHOICES
+        assert send_meeting_invitations in SEND_MEETING_INVITATIONS_CHOICES
+        if folder is not None:
+            assert isinstance(folder, Folder)
+            if folder.account != self:
+                raise ValueError('"Folder must belong to this account')
+        if message_disposition == SAVE_ONLY and folder is None:
+            raise AttributeError("Folder must be supplied when in save-only mode")
+        if message_disposition == SEND_AND_SAVE_COPY and folder is None:
+            folder = self.sent  # 'Sent' is default EWS behaviour
+        if message_disposition == SEND_ONLY and folder is not None:
+            raise AttributeError("Folder must be None in send-ony mode")
+        # bulk_create() on a queryset does not make sense because it returns items that have already been created
+        assert not isinstance(items, QuerySet)
+        return folder
+
     def bulk_update(self, items, conflict_resolution=AUTO_RESOLVE, message_disposition=SAVE_ONLY,
                     send_meeting_invitations_or_cancellations=SEND_TO_NONE, suppress_read_receipts=True):
         """
@@ -284,17 +293,13 @@ class Account(object):
         :param suppress_read_receipts: nly supported from Exchange 2013. True or False
         :return: a list of either ItemId or exception instances in the same order as the input.
         """
-        assert conflict_resolution in CONFLICT_RESOLUTION_CHOICES
-        assert message_disposition in MESSAGE_DISPOSITION_CHOICES
-        assert send_meeting_invitations_or_cancellations in SEND_MEETING_INVITATIONS_AND_CANCELLATIONS_CHOICES
-        assert suppress_read_receipts in (True, False)
-        if message_disposition == SEND_ONLY:
-            raise ValueError('Cannot send-only existing objects. Use SendItem service instead')
-        # bulk_update() on a queryset does not make sense because there would be no opportunity to alter the items. In
-        # fact, it could be dangerous if the queryset contains an '.only()'. This would wipe out certain fields
-        # entirely.
-        if isinstance(items, QuerySet):
-            raise ValueError('Cannot bulk update on a queryset')
+        self._validate_bulk_update(
+            items=items,
+            conflict_resolution=conflict_resolution,
+            message_disposition=message_disposition,
+            send_meeting_invitations_or_cancellations=send_meeting_invitations_or_cancellations,
+            suppress_read_receipts=suppress_read_receipts,
+        )
         log.debug(
             'Updating items for %s (conflict_resolution %s, message_disposition: %s, send_meeting_invitations: %s)',
             self,
@@ -318,6 +323,21 @@ class Account(object):
             )
         )
 
+    @staticmethod
+    def _validate_bulk_update(items, conflict_resolution, message_disposition,
+                              send_meeting_invitations_or_cancellations, suppress_read_receipts):
+        assert conflict_resolution in CONFLICT_RESOLUTION_CHOICES
+        assert message_disposition in MESSAGE_DISPOSITION_CHOICES
+        assert send_meeting_invitations_or_cancellations in SEND_MEETING_INVITATIONS_AND_CANCELLATIONS_CHOICES
+        assert suppress_read_receipts in (True, False)
+        if message_disposition == SEND_ONLY:
+            raise ValueError('Cannot send-only existing objects. Use SendItem service instead')
+        # bulk_update() on a queryset does not make sense because there would be no opportunity to alter the items. In
+        # fact, it could be dangerous if the queryset contains an '.only()'. This would wipe out certain fields
+        # entirely.
+        if isinstance(items, QuerySet):
+            raise ValueError('Cannot bulk update on a queryset')
+
     def bulk_delete(self, ids, delete_type=HARD_DELETE, send_meeting_cancellations=SEND_TO_NONE,
                     affected_task_occurrences=ALL_OCCURRENCIES, suppress_read_receipts=True):
         """
@@ -332,10 +352,12 @@ class Account(object):
         :param suppress_read_receipts: only supported from Exchange 2013. True or False.
         :return: a list of either True or exception instances in the same order as the input.
         """
-        assert delete_type in DELETE_TYPE_CHOICES
-        assert send_meeting_cancellations in SEND_MEETING_CANCELLATIONS_CHOICES
-        assert affected_task_occurrences in AFFECTED_TASK_OCCURRENCES_CHOICES
-        assert suppress_read_receipts in (True, False)
+        self._validate_bulk_delete(
+            delete_type=delete_type,
+            send_meeting_cancellations=send_meeting_cancellations,
+            affected_task_occurrences=affected_task_occurrences,
+            suppress_read_receipts=suppress_read_receipts,
+        )
         log.debug(
             'Deleting items for %s (delete_type: %s, send_meeting_invitations: %s, affected_task_occurences: %s)',
             self,
@@ -361,6 +383,14 @@ class Account(object):
             suppress_read_receipts=suppress_read_receipts,
         ))
 
+    @staticmethod
+    def _validate_bulk_delete(delete_type, send_meeting_cancellations, affected_task_occurrences,
+                              suppress_read_receipts):
+        assert delete_type in DELETE_TYPE_CHOICES
+        assert send_meeting_cancellations in SEND_MEETING_CANCELLATIONS_CHOICES
+        assert affected_task_occurrences in AFFECTED_TASK_OCCURRENCES_CHOICES
+        assert suppress_read_receipts in (True, False)
+
     def bulk_send(self, ids, save_copy=True, copy_to_folder=None):
         # Send existing draft messages. If requested, save a copy in 'copy_to_folder'
         if copy_to_folder and not save_copy:
@@ -397,10 +427,10 @@ class Account(object):
             for i in MoveItem(account=self).call(items=ids, to_folder=to_folder)
         )
 
-    def fetch(self, ids, folder=None, only_fields=None):
+    def fetch(self, ids, folder=None, only_fields=None, lazy=False):
         # 'folder' is used for validating only_fields
         # 'only_fields' specifies which fields to fetch, instead of all possible fields, as strings or FieldPaths.
-        validation_folder = folder or Folder(account=self)  # Default to a folder type that supports all item types
+        # 'lazy' makes the items decode their field values on first access.
         # 'ids' could be an unevaluated QuerySet, e.g. if we ended up here via `fetch(ids=some_folder.filter(...))`. In
         # that case, we want to use its iterator. Otherwise, peek() will start a count() which is wasteful because we
         # need the item IDs immediately afterwards. iterator() will only do the bare minimum.
@@ -411,6 +441,18 @@ class Account(object):
             # We accept generators, so it's not always convenient for caller to know up-front if 'ids' is empty. Allow
             # empty 'ids' and return early.
             return
+        validation_folder, only_fields = self._get_fetch_fields(folder=folder, only_fields=only_fields)
+        for i in GetItem(account=self).call(items=ids, additional_fields=only_fields):
+            if isinstance(i, Exception):
+                yield i
+            else:
+                item = validation_folder.item_model_from_tag(i.tag).from_xml(elem=i, account=self, lazy=lazy)
+                item.folder = folder
+                yield item
+
+    def _get_fetch_fields(self, folder, only_fields):
+        # Returns the folder to validate fields against, and the FieldPath objects to fetch
+        validation_folder = folder or Folder(account=self)  # Default to a folder type that supports all item types
         if only_fields:
             allowed_fields = validation_folder.allowed_fields()
             only_fields = list(only_fields)
@@ -423,13 +465,7 @@ class Account(object):
                 assert field_path.field in allowed_fields
         else:
             only_fields = {FieldPath(field=f) for f in validation_folder.allowed_fields()}
-        for i in GetItem(account=self).call(items=ids, additional_fields=only_fields):
-            if isinstance(i, Exception):
-                yield i
-            else:
-                item = validation_folder.item_model_from_tag(i.tag).from_xml(elem=i, account=self)
-                item.folder = folder
-                yield item
+        return validation_folder, only_fields
 
     def __str__(self):
         txt = '%s' % self.primary_smtp_address
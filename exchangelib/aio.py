@@ -0,0 +1,532 @@
+# coding=utf-8
+"""
+An asyncio-native request path for EWS services, as an alternative to the thread pool and the blocking 'requests'
+sessions used by Protocol. This is useful when fanning out requests over many accounts, where the number of threads
+quickly becomes the bottleneck.
+
+Requires Python 3.6+, since this module uses async generators, and the 'aiohttp' package. Only the 'basic' and 'no
+authentication' auth types are supported. NTLM authentication is bound to a TCP connection, and aiohttp does not let us
+control which connection a request is sent on.
+
+Example:
+
+    async_account = AsyncAccount(account)
+    items = await async_account.fetch(ids=ids)
+    async for item in account.inbox.filter(subject='foo'):
+        print(item.subject)
+    await close_connections()
+
+The retry, redirect and API version fallback behaviour is the same as for the synchronous services.
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import logging
+import ssl
+from weakref import WeakKeyDictionary
+
+from requests.structures import CaseInsensitiveDict
+from six import text_type, string_types
+
+from . import tracing
+from .errors import ErrorInvalidSchemaVersionForMailboxVersion, ErrorInvalidServerVersion, RateLimitError, \
+    RedirectError, TransportError
+from .folders import SHALLOW
+from .items import IdOnly, Item, BulkCreateResult, SAVE_ONLY, SEND_TO_NONE, AUTO_RESOLVE, HARD_DELETE, \
+    ALL_OCCURRENCIES
+from .queryset import QuerySet
+from .services import GetItem, CreateItem, UpdateItem, DeleteItem, FindItem, CONGESTION_ERRORS
+from .tracing import RequestTrace
+from .transport import wrap, BASIC, NOAUTH, DEFAULT_HEADERS
+from .util import chunkify, peek, is_xml, time_func, ElementType, POST_LOG_MSG, _get_retry_delay, get_body_size, \
+    _redirect_or_fail, _raise_response_errors
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+log = logging.getLogger(__name__)
+
+# A collection of error classes we want to handle as general connection errors
+CONNECTION_ERRORS = (asyncio.TimeoutError,) if aiohttp is None else (aiohttp.ClientError, asyncio.TimeoutError)
+
+# Maps an event loop to a {Protocol: AsyncProtocol} dict. aiohttp sessions must only be used from the loop they were
+# created in.
+_async_protocols = WeakKeyDictionary()
+
+
+class AsyncRequest(object):
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class AsyncResponse(object):
+    # Contains the parts of an aiohttp response that the error handling helpers in exchangelib.util need. These helpers
+    # were written for requests.Response objects.
+    def __init__(self, status_code, headers, text, url, request_headers=None, content=b'', cookies=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.cookies = cookies or {}
+        self.text = text
+        self.content = content
+        self.url = url
+        self.history = []  # We never follow redirects automatically
+        self.request = AsyncRequest(headers=request_headers)
+
+
+class AsyncProtocol(object):
+    """
+    Holds the aiohttp session used to connect to the service endpoint of a Protocol. The session has a connection pool
+    of the same size as the session pool of the Protocol, to not put more load on the server than the synchronous
+    services would.
+    """
+    SUPPORTED_AUTH_TYPES = (NOAUTH, BASIC)
+
+    def __init__(self, protocol):
+        if aiohttp is None:
+            raise ImportError("The asyncio transport requires the 'aiohttp' package")
+        if protocol.auth_type not in self.SUPPORTED_AUTH_TYPES:
+            raise ValueError("Auth type '%s' is not supported by the asyncio transport. Supported auth types: %s" % (
+                protocol.auth_type, self.SUPPORTED_AUTH_TYPES))
+        self.protocol = protocol
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector_kwargs = dict(limit=self.protocol.SESSION_POOLSIZE)
+            if self.protocol.verify_ssl is not True:
+                connector_kwargs['ssl'] = self.get_ssl_context()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**connector_kwargs),
+                auth=self.get_auth(),
+                # Create a copy of the headers because headers are mutable and session users may modify headers
+                headers=DEFAULT_HEADERS.copy(),
+                # The session is shared between accounts, so don't let cookies leak from one account to another.
+                # Backend cookies are kept per account instead.
+                cookie_jar=aiohttp.DummyCookieJar(),
+            )
+            log.debug('Server %s: Created async session', self.protocol.server)
+        return self._session
+
+    def get_auth(self):
+        if self.protocol.auth_type == NOAUTH:
+            return None
+        credentials = self.protocol.credentials
+        return aiohttp.BasicAuth(login=credentials.username, password=credentials.password)
+
+    def get_ssl_context(self):
+        # Mimic the 'verify' argument of requests, which may also be a path to a CA bundle
+        verify = self.protocol.verify_ssl
+        if isinstance(verify, string_types):
+            return ssl.create_default_context(cafile=verify)
+        return False
+
+    async def close(self):
+        if self._session is not None:
+            log.debug('Server %s: Closing async session', self.protocol.server)
+            await self._session.close()
+            self._session = None
+
+
+def get_async_protocol(protocol):
+    # Returns the AsyncProtocol for this Protocol in the current event loop
+    loop_protocols = _async_protocols.setdefault(asyncio.get_event_loop(), {})
+    try:
+        return loop_protocols[protocol]
+    except KeyError:
+        async_protocol = loop_protocols[protocol] = AsyncProtocol(protocol=protocol)
+        return async_protocol
+
+
+async def close_connections():
+    # Closes all aiohttp sessions that were created in the current event loop
+    loop_protocols = _async_protocols.pop(asyncio.get_event_loop(), {})
+    for async_protocol in loop_protocols.values():
+        await async_protocol.close()
+
+
+async def _post(session, url, headers, data, timeout, cookies=None):
+    async with session.post(url=url, headers=headers, data=data, allow_redirects=False, cookies=cookies,
+                            timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+        content = await r.read()
+        text = await r.text()  # Decodes the body we already read
+        return AsyncResponse(status_code=r.status, headers=r.headers, text=text, url=text_type(r.url),
+                             request_headers=r.request_info.headers, content=content,
+                             cookies={k: v.value for k, v in r.cookies.items()})
+
+
+async def wait_for_backoff_gate(protocol):
+    # The asyncio version of BackoffGate.wait()
+    while True:
+        remaining = protocol.backoff_gate.remaining()
+        if not remaining:
+            return
+        await asyncio.sleep(remaining)
+
+
+async def acquire_rate_limiter(rate_limiter):
+    # The asyncio version of RateLimiter.acquire()
+    while True:
+        delay = rate_limiter.try_acquire()
+        if not delay:
+            return
+        await asyncio.sleep(delay)
+
+
+async def post_ratelimited(protocol, session, url, headers, data, timeout=None, allow_redirects=False, cookies=None,
+                           trace=None):
+    """
+    The asyncio version of exchangelib.util.post_ratelimited(), with the same error handling policies. 'session' is an
+    aiohttp.ClientSession. Authentication is sent with every request, so there is no need to renew sessions when we
+    retry.
+    """
+    wait = 0  # seconds
+    retry = 0
+    attempts = {}  # The number of retries per error class
+    redirects = 0
+    r, d1, d2 = None, None, None
+    t_start = time_func()
+    if trace is None and tracing.HOOKS:
+        trace = tracing.RequestTrace(service=None, account=None, protocol=protocol)
+
+    def get_log_vals():
+        return dict(retry=retry, wait=wait, timeout=timeout, session_id=None, thread_id=None, auth=session.auth,
+                    url=url, verify=protocol.verify_ssl, allow_redirects=allow_redirects,
+                    response_time=None if r is None else d2 - d1, status_code=None if r is None else r.status_code,
+                    request_headers=headers if r is None else r.request.headers,
+                    response_headers=None if r is None else r.headers, request_data=data,
+                    response_data=None if r is None else r.text)
+
+    try:
+        while True:
+            log.debug('Retry %s timeout %s POST\'ing to %s after %ss wait', retry, timeout, url, wait)
+            if trace is not None:
+                trace.url, trace.retry, trace.bytes_sent = url, retry, get_body_size(data)
+                tracing.call_hooks('on_request_start', trace)
+            d1 = time_func()
+            try:
+                r = await _post(session=session, url=url, headers=headers, data=data, timeout=timeout, cookies=cookies)
+            except CONNECTION_ERRORS as e:
+                log.debug('Connection error POST\'ing to %s', url)
+                r = AsyncResponse(status_code=503, headers={'TimeoutException': e}, text='', url=url,
+                                  request_headers=headers)
+            d2 = time_func()
+            if trace is not None:
+                trace.status_code, trace.response_time = r.status_code, d2 - d1
+                trace.bytes_received = len(r.content)
+                tracing.call_hooks('on_response', trace)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(POST_LOG_MSG, get_log_vals())
+            if r.status_code == 503:
+                # The server is overloaded, or the request timed out
+                protocol.session_pool_controller.on_congestion()
+            retry_delay = _get_retry_delay(r, url, protocol, attempts, elapsed=time_func() - t_start)
+            if retry_delay is not None:
+                error_class, delay, jitter = retry_delay
+                wait = delay + jitter
+                log.info("Connection error on URL %s (code %s). Cool down %s secs", url, r.status_code, wait)
+                if trace is not None:
+                    trace.wait = wait
+                    tracing.call_hooks('on_retry', trace)
+                if r.status_code == 503:
+                    # The server is overloaded. Make all requests back off, not just this one
+                    protocol.backoff_gate.back_off(delay)
+                    await wait_for_backoff_gate(protocol)
+                    await asyncio.sleep(jitter)
+                else:
+                    await asyncio.sleep(wait)
+                retry += 1
+                attempts[error_class] += 1
+                continue
+            if r.status_code in (301, 302):
+                url, redirects = _redirect_or_fail(r, redirects, allow_redirects)
+                continue
+            break
+    except (RateLimitError, RedirectError) as e:
+        log.warning(e.value)
+        raise
+    except Exception as e:
+        # Let higher layers handle this. Add full context for better debugging.
+        log.error('%s: %s\n%s', e.__class__.__name__, text_type(e), POST_LOG_MSG % get_log_vals())
+        raise
+    if r.status_code == 500 and r.text and is_xml(r.text):
+        # Some genius at Microsoft thinks it's OK to send a valid SOAP response as an HTTP 500
+        log.debug('Got status code %s but trying to parse content anyway', r.status_code)
+    elif r.status_code != 200:
+        _raise_response_errors(r, protocol, POST_LOG_MSG, get_log_vals())  # Always raises an exception
+    log.debug('Useful response from %s', url)
+    return r
+
+
+async def get_response_xml(service, payload):
+    # The asyncio version of EWSService._get_response_xml()
+    assert isinstance(payload, ElementType)
+    session = get_async_protocol(service.protocol).session
+    account, hint, api_versions = service._get_api_versions()
+    api_version_iter = iter(api_versions)
+    api_version = next(api_version_iter)
+    t_start = time_func()
+    congestion_retries = 0
+    while True:
+        await wait_for_backoff_gate(service.protocol)
+        soap_payload = wrap(content=payload, version=api_version, account=account)
+        rate_limiter = service.protocol.credentials.rate_limiter
+        if rate_limiter is not None:
+            await acquire_rate_limiter(rate_limiter)
+        # aiohttp manages its own connection pool, so there is no session wait to report
+        trace = RequestTrace(service=service.SERVICE_NAME, account=account, protocol=service.protocol) \
+            if tracing.HOOKS else None
+        headers, cookies = service._get_affinity()
+        try:
+            r = await post_ratelimited(
+                protocol=service.protocol,
+                session=session,
+                url=service.protocol.service_endpoint,
+                headers=headers,
+                data=soap_payload,
+                timeout=service.protocol.TIMEOUT,
+                allow_redirects=False,
+                cookies=cookies,
+                trace=trace)
+        finally:
+            if rate_limiter is not None:
+                rate_limiter.release()
+        service._update_affinity(cookies=r.cookies)
+        log.debug('Trying API version %s for account %s', api_version, account)
+        try:
+            return service._get_response_payload(response=r, api_version=api_version, hint=hint)
+        except (ErrorInvalidSchemaVersionForMailboxVersion, ErrorInvalidServerVersion):
+            assert account  # This should never happen for non-account services
+            # The guessed server version is wrong for this account. Try the next version
+            log.debug('API version %s was invalid for account %s', api_version, account)
+            api_version = next(api_version_iter, None)
+            if api_version is None:
+                break
+            continue
+        except CONGESTION_ERRORS as e:
+            service._handle_congestion(e)
+            retry_delay = service._get_congestion_retry_delay(e, attempt=congestion_retries,
+                                                              elapsed=time_func() - t_start)
+            if retry_delay is None:
+                raise
+            delay, jitter = retry_delay
+            log.debug('Server busy. Retrying request after %s seconds', delay + jitter)
+            # Make all requests back off, not just this one
+            service.protocol.backoff_gate.back_off(delay)
+            await wait_for_backoff_gate(service.protocol)
+            await asyncio.sleep(jitter)
+            congestion_retries += 1
+            continue
+    raise ErrorInvalidSchemaVersionForMailboxVersion('Tried versions %s but all were invalid for account %s' %
+                                                     (api_versions, account))
+
+
+async def get_elements(service, payload):
+    # The asyncio version of EWSService._get_elements(). Returns a list of elements and exception instances
+    response = await get_response_xml(service=service, payload=payload)
+    return list(service._get_elements_in_response(response=response))
+
+
+async def paged_call(service, payload_func, max_items, **kwargs):
+    # The asyncio version of PagingEWSMixIn._paged_call(). Returns an async generator of elements
+    next_offset = 0
+    item_count = 0
+    while True:
+        log.debug('%s: Getting items at offset %s', service.SERVICE_NAME, next_offset)
+        kwargs['offset'] = next_offset
+        response = await get_response_xml(service=service, payload=payload_func(**kwargs))
+        rootfolder, next_offset = service._get_page(response)
+        if isinstance(rootfolder, ElementType):
+            container = service._get_page_container(rootfolder)
+            for elem in service._get_elements_in_container(container=container):
+                item_count += 1
+                yield elem
+            if max_items and item_count >= max_items:
+                log.debug("'max_items' count reached")
+                break
+        if not next_offset:
+            break
+        if next_offset != item_count:
+            # Check paging offsets
+            raise TransportError('Unexpected next offset: %s -> %s' % (item_count, next_offset))
+
+
+async def pool_requests(service, payload_func, items, **kwargs):
+    # The asyncio version of EWSPooledMixIn._pool_requests(). Sends all chunks concurrently and returns a list of
+    # elements in the same order as the input. Concurrency is limited by the size of the connection pool.
+    tasks = [
+        asyncio.ensure_future(get_elements(service=service, payload=payload_func(chunk, **kwargs)))
+        for chunk in chunkify(items, service.CHUNKSIZE)
+    ]
+    log.debug('Started %s %s tasks of max %s items', len(tasks), service.SERVICE_NAME, service.CHUNKSIZE)
+    try:
+        results = await asyncio.gather(*tasks)
+    except Exception:
+        # Don't leave the other tasks running in the background
+        for task in tasks:
+            task.cancel()
+        raise
+    return [elem for elems in results for elem in elems]
+
+
+async def find_items(folder, q, shape=IdOnly, depth=SHALLOW, additional_fields=tuple(), order_fields=None,
+                     calendar_view=None, page_size=None, max_items=None, lazy=False):
+    # The asyncio version of Folder.find_items(). Returns an async generator of item IDs or items
+    kwargs = folder._get_find_items_kwargs(q=q, shape=shape, depth=depth, additional_fields=additional_fields,
+                                           order_fields=order_fields, calendar_view=calendar_view,
+                                           page_size=page_size, max_items=max_items)
+    service = FindItem(folder=folder)
+    async for elem in paged_call(service=service, payload_func=service.get_payload, **kwargs):
+        yield folder._find_items_result(elem=elem, shape=shape, additional_fields=additional_fields, lazy=lazy)
+
+
+async def query(qs):
+    # The asyncio version of QuerySet.iterator(). Returns an async generator of the unformatted query results, without
+    # caching the result.
+    if qs.q is None:
+        return
+    if qs._cache is not None:
+        for val in qs._cache:
+            yield val
+        return
+    additional_fields, complex_fields_requested, find_item_kwargs, extra_order_fields = qs._get_query_args()
+    items = find_items(qs.folder, qs.q, **find_item_kwargs)
+    if not complex_fields_requested and extra_order_fields is None:
+        async for item in items:
+            yield item
+        return
+    # We need all item IDs before we can fetch the complex fields, and all items before we can sort client-side
+    items = [item async for item in items]
+    if complex_fields_requested:
+        items = await AsyncAccount(qs.folder.account).fetch(ids=items, folder=qs.folder,
+                                                            only_fields=additional_fields, lazy=qs.is_lazy)
+    if extra_order_fields is not None:
+        items = qs._sort_clientside(items, extra_order_fields)
+    for item in items:
+        yield item
+
+
+async def aiter_queryset(qs):
+    # The asyncio version of QuerySet.__iter__(). Like its synchronous counterpart, this fills the queryset cache when
+    # iteration has finished.
+    if qs._cache is not None:
+        for val in qs._cache:
+            yield val
+        return
+    if qs.q is None:
+        qs._cache = []
+        return
+    log.debug('Initializing cache')
+    _cache = []
+    result_formatter = qs._get_result_formatter()
+    async for item in query(qs):
+        for val in result_formatter((item,)):
+            _cache.append(val)
+            yield val
+    qs._cache = _cache
+
+
+async def _consume(iterable):
+    # Returns the items of a QuerySet, an async iterable or a normal iterable, as a list
+    if isinstance(iterable, QuerySet):
+        return [i async for i in query(iterable)]
+    if hasattr(iterable, '__aiter__'):
+        return [i async for i in iterable]
+    is_empty, iterable = peek(iterable)
+    return [] if is_empty else list(iterable)
+
+
+class AsyncAccount(object):
+    """
+    Wraps an Account to provide coroutine versions of the bulk methods, using the asyncio transport. The methods take
+    the same arguments as their Account counterparts, and return lists instead of generators. 'ids' and 'items' may
+    also be async iterables.
+    """
+    def __init__(self, account):
+        self.account = account
+
+    async def fetch(self, ids, folder=None, only_fields=None, lazy=False):
+        ids = await _consume(ids)
+        if not ids:
+            return []
+        validation_folder, only_fields = self.account._get_fetch_fields(folder=folder, only_fields=only_fields)
+        service = GetItem(account=self.account)
+        res = []
+        for i in await pool_requests(service=service, payload_func=service.get_payload, items=ids,
+                                     additional_fields=only_fields):
+            if isinstance(i, Exception):
+                res.append(i)
+            else:
+                item = validation_folder.item_model_from_tag(i.tag).from_xml(elem=i, account=self.account,
+                                                                             lazy=lazy)
+                item.folder = folder
+                res.append(item)
+        return res
+
+    async def bulk_create(self, folder, items, message_disposition=SAVE_ONLY, send_meeting_invitations=SEND_TO_NONE):
+        folder = self.account._validate_bulk_create(folder=folder, items=items,
+                                                    message_disposition=message_disposition,
+                                                    send_meeting_invitations=send_meeting_invitations)
+        items = await _consume(items)
+        if not items:
+            return []
+        service = CreateItem(account=self.account)
+        return [
+            i if isinstance(i, Exception) else BulkCreateResult.from_xml(elem=i, account=self.account)
+            for i in await pool_requests(service=service, payload_func=service.get_payload, items=items,
+                                         folder=folder, message_disposition=message_disposition,
+                                         send_meeting_invitations=send_meeting_invitations)
+        ]
+
+    async def bulk_update(self, items, conflict_resolution=AUTO_RESOLVE, message_disposition=SAVE_ONLY,
+                          send_meeting_invitations_or_cancellations=SEND_TO_NONE, suppress_read_receipts=True):
+        self.account._validate_bulk_update(
+            items=items,
+            conflict_resolution=conflict_resolution,
+            message_disposition=message_disposition,
+            send_meeting_invitations_or_cancellations=send_meeting_invitations_or_cancellations,
+            suppress_read_receipts=suppress_read_receipts,
+        )
+        items = await _consume(items)
+        if not items:
+            return []
+        service = UpdateItem(account=self.account)
+        return [
+            i if isinstance(i, Exception) else Item.id_from_xml(i)
+            for i in await pool_requests(
+                service=service,
+                payload_func=service.get_payload,
+                items=items,
+                conflict_resolution=conflict_resolution,
+                message_disposition=message_disposition,
+                send_meeting_invitations_or_cancellations=send_meeting_invitations_or_cancellations,
+                suppress_read_receipts=suppress_read_receipts,
+            )
+        ]
+
+    async def bulk_delete(self, ids, delete_type=HARD_DELETE, send_meeting_cancellations=SEND_TO_NONE,
+                          affected_task_occurrences=ALL_OCCURRENCIES, suppress_read_receipts=True):
+        self.account._validate_bulk_delete(
+            delete_type=delete_type,
+            send_meeting_cancellations=send_meeting_cancellations,
+            affected_task_occurrences=affected_task_occurrences,
+            suppress_read_receipts=suppress_read_receipts,
+        )
+        ids = await _consume(ids)
+        if not ids:
+            return []
+        service = DeleteItem(account=self.account)
+        return await pool_requests(
+            service=service,
+            payload_func=service.get_payload,
+            items=ids,
+            delete_type=delete_type,
+            send_meeting_cancellations=send_meeting_cancellations,
+            affected_task_occurrences=affected_task_occurrences,
+            suppress_read_receipts=suppress_read_receipts,
+        )
+
+    def __str__(self):
+        return str(self.account)
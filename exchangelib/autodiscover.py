@@ -11,19 +11,15 @@ If you have problems autodiscovering, start by doing an official test at https:/
 """
 from __future__ import unicode_literals
 
-from contextlib import contextmanager
-import glob
 import logging
 import os
-import shelve
 import sys
 import tempfile
 from threading import Lock
 
 import dns.resolver
-from future.moves.queue import LifoQueue
 import requests.exceptions
-from future.utils import raise_from, PY2, python_2_unicode_compatible
+from future.utils import raise_from, python_2_unicode_compatible
 from six import text_type
 
 from . import transport
@@ -33,7 +29,7 @@ from .errors import AutoDiscoverFailed, AutoDiscoverRedirect, AutoDiscoverCircul
 from .protocol import BaseProtocol, Protocol
 from .transport import DEFAULT_ENCODING, DEFAULT_HEADERS
 from .util import create_element, get_xml_attr, add_xml_child, to_xml, is_xml, post_ratelimited, xml_to_str, \
-    get_domain, CONNECTION_ERRORS
+    get_domain, shelve_open_with_failover, CONNECTION_ERRORS
 
 
 log = logging.getLogger(__name__)
@@ -50,23 +46,6 @@ filename_for_version = 'exchangelib.cache.py{}{}'.format(*sys.version_info[:2])
 AUTODISCOVER_PERSISTENT_STORAGE = os.path.join(tempfile.gettempdir(), filename_for_version)
 
 
-@contextmanager
-def shelve_open_with_failover(filename):
-    # We can expect empty or corrupt files. Whatever happens, just delete the cache file and try again.
-    # 'shelve' may add a backend-specific suffix to the file, so also delete all files with a suffix.
-    # We don't know which file caused the error, so just delete them all.
-    try:
-        shelve_handle = shelve.open(filename)
-    except Exception as e:
-        for f in glob.glob(filename + '*'):
-            log.warning('Deleting invalid cache file %s (%r)', f, e)
-            os.unlink(f)
-        shelve_handle = shelve.open(filename)
-    yield shelve_handle
-    if PY2:
-        shelve_handle.close()
-
-
 @python_2_unicode_compatible
 class AutodiscoverCache(object):
     # Stores the translation from (email domain, credentials) -> AutodiscoverProtocol object so we can re-use TCP
@@ -483,9 +462,7 @@ class AutodiscoverProtocol(BaseProtocol):
 
     def __init__(self, *args, **kwargs):
         super(AutodiscoverProtocol, self).__init__(*args, **kwargs)
-        self._session_pool = LifoQueue(maxsize=self.SESSION_POOLSIZE)
-        for _ in range(self.SESSION_POOLSIZE):
-            self._session_pool.put(self.create_session(), block=False)
+        self._create_session_pool()
 
     def __str__(self):
         return '''\
@@ -30,9 +30,26 @@ class Configuration(object):
         credentials = Credentials(username='MYWINDOMAIN\myusername', password='topsecret')
         account = Account(primary_smtp_address='john@example.com', credentials=credentials, autodiscover=True)
 
+    To retry failed requests, add a retry policy. This one retries connection errors quickly, at most 5 times:
+
+        config = Configuration(server='example.com', credentials=..., retry_policy=RetryPolicy(
+            rules={RetryPolicy.CONNECTION_ERROR: RetryRule(initial_delay=0.05, jitter=0.5, max_attempts=5)}
+        ))
+
+    To stay below the throttling budget of the user, you can limit the rate of requests to the server:
+
+        config = Configuration(server='example.com', credentials=..., rate_limiter=RateLimiter(requests_per_second=5))
+
+    If many processes on the same host use the same account, they can share the rate limit and the back off requests
+    from the server through state files:
+
+        config = Configuration(server='example.com', credentials=...,
+                               rate_limiter=SharedRateLimiter('/var/tmp/ews.rate', requests_per_second=5),
+                               backoff_gate=SharedBackoffGate('/var/tmp/ews.backoff'))
+
     """
     def __init__(self, credentials, server=None, has_ssl=True, service_endpoint=None, auth_type=None,
-                 verify_ssl=True, version=None):
+                 verify_ssl=True, version=None, rate_limiter=None, backoff_gate=None, retry_policy=None):
         if auth_type is not None and auth_type not in AUTH_TYPE_MAP:
             raise ValueError('Unsupported auth type %s' % auth_type)
         if not (server or service_endpoint):
@@ -47,6 +64,18 @@ class Configuration(object):
             verify_ssl=verify_ssl,
             version=version
         )
+        # Throttling budgets and retries are per user, so the rate limiter and the retry policy belong to the
+        # credentials. The protocol may be cached and shared with other Configuration objects, and its credentials may
+        # be an equal but different Credentials object. Don't silently replace values that someone else already set.
+        for attr, value in (('rate_limiter', rate_limiter), ('retry_policy', retry_policy)):
+            if value is None:
+                continue
+            current = getattr(self.protocol.credentials, attr)
+            if current is not None and current is not value:
+                raise ValueError('Credentials %s already have a different %s' % (credentials, attr))
+            setattr(self.protocol.credentials, attr, value)
+        if backoff_gate is not None:
+            self.protocol.backoff_gate = backoff_gate
 
     @property
     def credentials(self):
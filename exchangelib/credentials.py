@@ -11,6 +11,8 @@ import logging
 
 from future.utils import python_2_unicode_compatible
 
+from .throttling import RetryPolicy
+
 log = logging.getLogger(__name__)
 
 IMPERSONATION = 'impersonation'
@@ -28,12 +30,18 @@ class Credentials(object):
     * User Principal Name (UPN)
 
     :param password: Clear-text password
+
+    :param rate_limiter: An optional exchangelib.throttling.RateLimiter instance, limiting the rate of EWS requests sent
+    with these credentials
+
+    :param retry_policy: An optional exchangelib.throttling.RetryPolicy instance. Without a retry policy, requests fail
+    on the first error
     """
     EMAIL = 'email'
     DOMAIN = 'domain'
     UPN = 'upn'
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, rate_limiter=None, retry_policy=None):
         if username.count('@') == 1:
             self.type = self.EMAIL
         elif username.count('\\') == 1:
@@ -42,12 +50,14 @@ class Credentials(object):
             self.type = self.UPN
         self.username = username
         self.password = password
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
 
     @property
     def fail_fast(self):
-        # Used to choose the error handling policy. When True, a fault-tolerant policy is used. False, a fail-fast
-        # policy is used.
-        return True
+        # Used to choose the error handling policy. When False, failed requests are retried according to the retry
+        # policy. When True, a fail-fast policy is used.
+        return self.retry_policy is None
 
     def __hash__(self):
         return hash((self.username, self.password))
@@ -63,14 +73,19 @@ class Credentials(object):
 
 
 class ServiceAccount(Credentials):
-    def __init__(self, username, password, max_wait=3600):
+    def __init__(self, username, password, max_wait=3600, rate_limiter=None, retry_policy=None):
         """
         A Credentials class that enables fault-tolerance handling. Tells internal methods to do an exponential backoff
-        when requests start failing, and wait up to max_wait seconds before failing.
+        when requests start failing, and wait up to max_wait seconds before failing. Pass a RetryPolicy for more
+        control over retries. Its deadline replaces max_wait.
         """
-        super(ServiceAccount, self).__init__(username, password)
-        self.max_wait = max_wait
+        super(ServiceAccount, self).__init__(username, password, rate_limiter=rate_limiter,
+                                             retry_policy=retry_policy or RetryPolicy(deadline=max_wait))
 
     @property
-    def fail_fast(self):
-        return False
+    def max_wait(self):
+        return self.retry_policy.deadline
+
+    @max_wait.setter
+    def max_wait(self, value):
+        self.retry_policy.deadline = value
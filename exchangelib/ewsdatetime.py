@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 
 import datetime
 import logging
+import re
 
 import dateutil.parser
 import pytz
@@ -14,6 +15,14 @@ from .winzone import PYTZ_TO_MS_TIMEZONE_MAP
 
 log = logging.getLogger(__name__)
 
+# The date and datetime formats that EWS uses, e.g. '2009-01-15', '2009-01-15T13:45:56Z' and
+# '2009-01-15T13:45:56.123+01:00'. Parsing these with a regex and int() is much faster than strptime() and dateutil.
+_DATE_RE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})(?:Z|[+-][0-9]{2}:[0-9]{2})?\Z')
+_DATETIME_RE = re.compile(
+    r'([0-9]{4})-([0-9]{2})-([0-9]{2})T([0-9]{2}):([0-9]{2}):([0-9]{2})(?:\.([0-9]{1,7}))?'
+    r'(Z|([+-])([0-9]{2}):([0-9]{2}))?\Z'
+)
+
 
 class EWSDate(datetime.date):
     """
@@ -50,6 +59,9 @@ class EWSDate(datetime.date):
     @classmethod
     def from_string(cls, date_string):
         # Sometimes, we'll receive a date string with timezone information. Not very useful.
+        m = _DATE_RE.match(date_string)
+        if m:
+            return cls(int(m.group(1)), int(m.group(2)), int(m.group(3)))
         if date_string.endswith('Z'):
             dt = datetime.datetime.strptime(date_string, '%Y-%m-%dZ')
         elif ':' in date_string:
@@ -89,9 +101,17 @@ class EWSDateTime(datetime.datetime):
         """
         if not self.tzinfo:
             raise ValueError('EWSDateTime must be timezone-aware')
+        res = '%04d-%02d-%02dT%02d:%02d:%02d' % (self.year, self.month, self.day, self.hour, self.minute, self.second)
         if self.tzinfo.zone == 'UTC':
-            return self.strftime('%Y-%m-%dT%H:%M:%SZ')
-        return self.replace(microsecond=0).isoformat()
+            return res + 'Z'
+        offset = self.utcoffset()
+        offset_seconds = offset.days * 86400 + offset.seconds
+        if offset_seconds % 60 or offset.microseconds:
+            # isoformat() knows how to format offsets with seconds
+            return self.replace(microsecond=0).isoformat()
+        sign = '-' if offset_seconds < 0 else '+'
+        offset_minutes = abs(offset_seconds) // 60
+        return '%s%s%02d:%02d' % (res, sign, offset_minutes // 60, offset_minutes % 60)
 
     @classmethod
     def from_datetime(cls, d):
@@ -121,6 +141,9 @@ class EWSDateTime(datetime.datetime):
     @classmethod
     def from_string(cls, date_string):
         # Parses several common datetime formats and returns timezone-aware EWSDateTime objects
+        m = _DATETIME_RE.match(date_string)
+        if m:
+            return cls._from_match(m)
         if date_string.endswith('Z'):
             # UTC datetime
             naive_dt = super(EWSDateTime, cls).strptime(date_string, '%Y-%m-%dT%H:%M:%SZ')
@@ -135,6 +158,24 @@ class EWSDateTime(datetime.datetime):
         aware_dt = dateutil.parser.parse(date_string)
         return cls.from_datetime(aware_dt.astimezone(UTC))
 
+    @classmethod
+    def _from_match(cls, m):
+        # Converts a match of _DATETIME_RE
+        year, month, day, hour, minute, second, fraction, tz, sign, tz_hour, tz_minute = m.groups()
+        microsecond = int(fraction[:6].ljust(6, '0')) if fraction else 0
+        args = (int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond)
+        if tz is None:
+            # This is a naive datetime. Don't allow this, but signal caller with an appropriate error
+            raise NaiveDateTimeNotAllowed(cls(*args))
+        # Call datetime.__new__() directly. EWSDateTime.__new__() is slow, and only needed for its tzinfo check.
+        if tz == 'Z':
+            return datetime.datetime.__new__(cls, *args + (UTC,))
+        # Convert to UTC
+        offset = datetime.timedelta(hours=int(tz_hour), minutes=int(tz_minute))
+        utc_dt = datetime.datetime(*args) - offset if sign == '+' else datetime.datetime(*args) + offset
+        return datetime.datetime.__new__(cls, utc_dt.year, utc_dt.month, utc_dt.day, utc_dt.hour, utc_dt.minute,
+                                         utc_dt.second, utc_dt.microsecond, UTC)
+
     @classmethod
     def now(cls, tz=None):
         # We want to return EWSDateTime objects
@@ -10,7 +10,7 @@ from six import string_types
 from .errors import ErrorInvalidServerVersion
 from .ewsdatetime import EWSDateTime, EWSDate, NaiveDateTimeNotAllowed
 from .services import TNS
-from .util import create_element, get_xml_attrs, set_xml_value, value_to_xml_text, is_iterable
+from .util import create_element, get_xml_attrs, set_xml_value, value_to_xml_text, is_iterable, StreamedContent
 from .version import Build
 
 string_type = string_types[0]
@@ -274,6 +274,21 @@ class FieldURIField(Field):
         else:
             self.field_uri_postfix = self.field_uri
 
+    def from_xml(self, elem, account):
+        field_elem = elem.find(self.child_tag())
+        if field_elem is None:
+            return self.default
+        return self.value_from_xml(field_elem, account=account)
+
+    def value_from_xml(self, field_elem, account):
+        # Returns the value of the child element that holds the field value. Fields that don't have such an element
+        # override from_xml() instead.
+        raise NotImplementedError()
+
+    def child_tag(self):
+        # The tag of the child element that holds the field value
+        return self.response_tag()
+
     def to_xml(self, value, version):
         field_elem = create_element(self.request_tag())
         return set_xml_value(field_elem, value, version=version)
@@ -297,9 +312,8 @@ class FieldURIField(Field):
 class BooleanField(FieldURIField):
     value_cls = bool
 
-    def from_xml(self, elem, account):
-        field_elem = elem.find(self.response_tag())
-        val = None if field_elem is None else field_elem.text or None
+    def value_from_xml(self, field_elem, account):
+        val = field_elem.text or None
         if val is not None:
             try:
                 return {
@@ -337,9 +351,8 @@ class IntegerField(FieldURIField):
                     raise ValueError("value '%s' on field '%s' must be less than %s" % (value, self.name, self.max))
         return value
 
-    def from_xml(self, elem, account):
-        field_elem = elem.find(self.response_tag())
-        val = None if field_elem is None else field_elem.text or None
+    def value_from_xml(self, field_elem, account):
+        val = field_elem.text or None
         if val is not None:
             try:
                 return self.value_cls(val)
@@ -383,9 +396,8 @@ class EnumField(IntegerField):
                 value = self.enum.index(value) + 1
         return super(EnumField, self).clean(value, version=version)
 
-    def from_xml(self, elem, account):
-        field_elem = elem.find(self.response_tag())
-        val = None if field_elem is None else field_elem.text or None
+    def value_from_xml(self, field_elem, account):
+        val = field_elem.text or None
         if val is not None:
             try:
                 if self.is_list:
@@ -413,24 +425,26 @@ class Base64Field(FieldURIField):
     value_cls = bytes
     is_complex = True
 
-    def from_xml(self, elem, account):
-        field_elem = elem.find(self.response_tag())
-        val = None if field_elem is None else field_elem.text or None
+    def value_from_xml(self, field_elem, account):
+        val = field_elem.text or None
         if val is not None:
             return base64.b64decode(val)
         return self.default
 
     def to_xml(self, value, version):
         field_elem = create_element(self.request_tag())
+        if len(value) >= StreamedContent.MIN_SIZE:
+            # Encode large values in chunks while the request is being sent
+            field_elem.text = StreamedContent(value, base64_encode=True)
+            return field_elem
         return set_xml_value(field_elem, base64.b64encode(value).decode('ascii'), version=version)
 
 
 class DateField(FieldURIField):
     value_cls = EWSDate
 
-    def from_xml(self, elem, account):
-        field_elem = elem.find(self.response_tag())
-        val = None if field_elem is None else field_elem.text or None
+    def value_from_xml(self, field_elem, account):
+        val = field_elem.text or None
         if val is not None:
             try:
                 return self.value_cls.from_string(val)
@@ -448,9 +462,8 @@ class DateTimeField(FieldURIField):
             raise ValueError("Field '%s' must be timezone aware" % self.name)
         return super(DateTimeField, self).clean(value, version=version)
 
-    def from_xml(self, elem, account):
-        field_elem = elem.find(self.response_tag())
-        val = None if field_elem is None else field_elem.text or None
+    def value_from_xml(self, field_elem, account):
+        val = field_elem.text or None
         if val is not None:
             try:
                 return self.value_cls.from_string(val)
@@ -486,9 +499,8 @@ class TextField(FieldURIField):
                     raise ValueError("'%s' value '%s' exceeds length %s" % (self.name, value, self.max_length))
         return value
 
-    def from_xml(self, elem, account):
-        field_elem = elem.find(self.response_tag())
-        val = None if field_elem is None else field_elem.text or None
+    def value_from_xml(self, field_elem, account):
+        val = field_elem.text or None
         if val is not None:
             return val
         return self.default
@@ -497,11 +509,8 @@ class TextField(FieldURIField):
 class TextListField(TextField):
     is_list = True
 
-    def from_xml(self, elem, account):
-        iter_elem = elem.find(self.response_tag())
-        if iter_elem is not None:
-            return get_xml_attrs(iter_elem, '{%s}String' % TNS)
-        return self.default
+    def value_from_xml(self, field_elem, account):
+        return get_xml_attrs(field_elem, '{%s}String' % TNS)
 
 
 class URIField(TextField):
@@ -565,10 +574,9 @@ class BodyField(TextField):
             value = self.value_cls(value)
         return super(BodyField, self).clean(value, version=version)
 
-    def from_xml(self, elem, account):
+    def value_from_xml(self, field_elem, account):
         from .properties import Body, HTMLBody
-        field_elem = elem.find(self.response_tag())
-        val = None if field_elem is None else field_elem.text or None
+        val = field_elem.text or None
         if val is not None:
             body_type = field_elem.get('BodyType')
             return {
@@ -593,20 +601,17 @@ class EWSElementField(FieldURIField):
         self.value_cls = kwargs.pop('value_cls')
         super(EWSElementField, self).__init__(*args, **kwargs)
 
-    def from_xml(self, elem, account):
+    def value_from_xml(self, field_elem, account):
         if self.is_list:
-            iter_elem = elem.find(self.response_tag())
-            if iter_elem is not None:
-                return [self.value_cls.from_xml(elem=e, account=account)
-                        for e in iter_elem.findall(self.value_cls.response_tag())]
-        else:
-            if self.field_uri is None:
-                sub_elem = elem.find(self.value_cls.response_tag())
-            else:
-                sub_elem = elem.find(self.response_tag())
-            if sub_elem is not None:
-                return self.value_cls.from_xml(elem=sub_elem, account=account)
-        return self.default
+            return [self.value_cls.from_xml(elem=e, account=account)
+                    for e in field_elem.findall(self.value_cls.response_tag())]
+        return self.value_cls.from_xml(elem=field_elem, account=account)
+
+    def child_tag(self):
+        if self.field_uri is None:
+            # The value element is not wrapped in a field element
+            return self.value_cls.response_tag()
+        return self.response_tag()
 
     def to_xml(self, value, version):
         if self.field_uri is None:
@@ -662,18 +667,11 @@ class MailboxField(EWSElementField):
             value = self.value_cls(email_address=value)
         return super(MailboxField, self).clean(value, version=version)
 
-    def from_xml(self, elem, account):
-        if self.field_uri is None:
-            sub_elem = elem.find(self.value_cls.response_tag())
-        else:
-            sub_elem = elem.find(self.response_tag())
-        if sub_elem is not None:
-            if self.field_uri is not None:
-                # We want the nested Mailbox, not the wrapper element
-                return self.value_cls.from_xml(elem=sub_elem.find(self.value_cls.response_tag()), account=account)
-            else:
-                return self.value_cls.from_xml(elem=sub_elem, account=account)
-        return self.default
+    def value_from_xml(self, field_elem, account):
+        if self.field_uri is not None:
+            # We want the nested Mailbox, not the wrapper element
+            return self.value_cls.from_xml(elem=field_elem.find(self.value_cls.response_tag()), account=account)
+        return self.value_cls.from_xml(elem=field_elem, account=account)
 
 
 class MailboxListField(EWSElementListField):
@@ -731,18 +729,15 @@ class AttachmentField(EWSElementListField):
         kwargs['value_cls'] = Attachment
         super(AttachmentField, self).__init__(*args, **kwargs)
 
-    def from_xml(self, elem, account):
+    def value_from_xml(self, field_elem, account):
         from .attachments import FileAttachment, ItemAttachment
-        iter_elem = elem.find(self.response_tag())
         # Look for both FileAttachment and ItemAttachment
-        if iter_elem is not None:
-            attachments = []
-            for att_type in (FileAttachment, ItemAttachment):
-                attachments.extend(
-                    [att_type.from_xml(elem=e, account=account) for e in iter_elem.findall(att_type.response_tag())]
-                )
-            return attachments
-        return self.default
+        attachments = []
+        for att_type in (FileAttachment, ItemAttachment):
+            attachments.extend(
+                [att_type.from_xml(elem=e, account=account) for e in field_elem.findall(att_type.response_tag())]
+            )
+        return attachments
 
 
 class LabelField(ChoiceField):
@@ -809,17 +804,11 @@ class IndexedField(FieldURIField):
         self.value_cls = kwargs.pop('value_cls')
         super(IndexedField, self).__init__(*args, **kwargs)
 
-    def from_xml(self, elem, account):
+    def value_from_xml(self, field_elem, account):
         if self.is_list:
-            iter_elem = elem.find(self.response_tag())
-            if iter_elem is not None:
-                return [self.value_cls.from_xml(elem=e, account=account)
-                        for e in iter_elem.findall(self.value_cls.response_tag())]
-        else:
-            sub_elem = elem.find(self.response_tag())
-            if sub_elem is not None:
-                return self.value_cls.from_xml(elem=sub_elem, account=account)
-        return self.default
+            return [self.value_cls.from_xml(elem=e, account=account)
+                    for e in field_elem.findall(self.value_cls.response_tag())]
+        return self.value_cls.from_xml(elem=field_elem, account=account)
 
     def to_xml(self, value, version):
         return set_xml_value(create_element('t:%s' % self.PARENT_ELEMENT_NAME), value, version)
@@ -958,6 +947,3 @@ class EffectiveRightsField(EWSElementField):
         from .properties import EffectiveRights
         kwargs['value_cls'] = EffectiveRights
         super(EffectiveRightsField, self).__init__(*args, **kwargs)
-
-    def from_xml(self, elem, account):
-        return super(EffectiveRightsField, self).from_xml(elem=elem, account=account)
@@ -220,7 +220,7 @@ class Folder(EWSElement):
         return QuerySet(self).get(*args, **kwargs)
 
     def find_items(self, q, shape=IdOnly, depth=SHALLOW, additional_fields=tuple(), order_fields=None,
-                   calendar_view=None, page_size=None, max_items=None):
+                   calendar_view=None, page_size=None, max_items=None, lazy=False):
         """
         Private method to call the FindItem service
 
@@ -233,8 +233,18 @@ class Folder(EWSElement):
         :param calendar_view: a CalendarView instance, if any
         :param page_size: the requested number of items per page
         :param max_items: the max number of items to return
+        :param lazy: if True, items decode their field values on first access
         :return: a generator for the returned item IDs or items
         """
+        kwargs = self._get_find_items_kwargs(q=q, shape=shape, depth=depth, additional_fields=additional_fields,
+                                             order_fields=order_fields, calendar_view=calendar_view,
+                                             page_size=page_size, max_items=max_items)
+        for i in FindItem(folder=self).call(**kwargs):
+            yield self._find_items_result(elem=i, shape=shape, additional_fields=additional_fields, lazy=lazy)
+
+    def _get_find_items_kwargs(self, q, shape, depth, additional_fields, order_fields, calendar_view, page_size,
+                               max_items):
+        # Validates the find_items() arguments and returns the kwargs for FindItem.call()
         assert shape in SHAPE_CHOICES
         assert depth in ITEM_TRAVERSAL_CHOICES
         if additional_fields:
@@ -271,7 +281,7 @@ class Folder(EWSElement):
             additional_fields,
             restriction.q if restriction else None,
         )
-        items = FindItem(folder=self).call(
+        return dict(
             additional_fields=additional_fields,
             restriction=restriction,
             order_fields=order_fields,
@@ -282,17 +292,16 @@ class Folder(EWSElement):
             page_size=page_size,
             max_items=calendar_view.max_items if calendar_view else max_items,
         )
+
+    def _find_items_result(self, elem, shape, additional_fields, lazy=False):
+        # Converts an element returned by FindItem.call() to the object that find_items() should return
+        if isinstance(elem, Exception):
+            return elem
         if shape == IdOnly and additional_fields is None:
-            for i in items:
-                yield i if isinstance(i, Exception) else Item.id_from_xml(i)
-        else:
-            for i in items:
-                if isinstance(i, Exception):
-                    yield i
-                else:
-                    item = self.item_model_from_tag(i.tag).from_xml(elem=i, account=self.account)
-                    item.folder = self
-                    yield item
+            return Item.id_from_xml(elem)
+        item = self.item_model_from_tag(elem.tag).from_xml(elem=elem, account=self.account, lazy=lazy)
+        item.folder = self
+        return item
 
     def bulk_create(self, items, *args, **kwargs):
         return self.account.bulk_create(folder=self, items=items, *args, **kwargs)
@@ -324,7 +333,7 @@ class Folder(EWSElement):
         fld_id_elem = elem.find(FolderId.response_tag())
         fld_id = fld_id_elem.get(FolderId.ID_ATTR)
         changekey = fld_id_elem.get(FolderId.CHANGEKEY_ATTR)
-        kwargs = {f.name: f.from_xml(elem=elem, account=account) for f in cls.supported_fields()}
+        kwargs = cls.fields_from_xml(elem=elem, account=account)
         elem.clear()
         return cls(account=account, folder_id=fld_id, changekey=changekey, **kwargs)
 
@@ -327,13 +327,38 @@ class Item(EWSElement):
         return id_elem.get(ItemId.ID_ATTR), id_elem.get(ItemId.CHANGEKEY_ATTR)
 
     @classmethod
-    def from_xml(cls, elem, account):
+    def from_xml(cls, elem, account, lazy=False):
+        # If 'lazy' is True, the item keeps 'elem' and decodes each field value on first access. See __getattr__()
         assert elem.tag == cls.response_tag(), (cls, elem.tag, cls.response_tag())
         item_id, changekey = cls.id_from_xml(elem=elem)
-        kwargs = {f.name: f.from_xml(elem=elem, account=account) for f in cls.supported_fields()}
+        if lazy:
+            item = cls.__new__(cls)
+            item.__dict__.update(account=account, folder=None, item_id=item_id, changekey=changekey,
+                                 _lazy_xml=_LazyXml(elem))
+            return item
+        kwargs = cls.fields_from_xml(elem=elem, account=account)
         elem.clear()
         return cls(account=account, item_id=item_id, changekey=changekey, **kwargs)
 
+    def __getattr__(self, name):
+        # Python only calls this for attributes that are not set. On lazy items, these are the fields that have not
+        # been accessed yet.
+        try:
+            lazy_xml = self.__dict__['_lazy_xml']
+            field = self._get_decoder()[3][name]
+        except KeyError:
+            raise AttributeError("'%s' object has no attribute '%s'" % (self.__class__.__name__, name))
+        value = lazy_xml.get_value(item=self, field=field)
+        if name == 'attachments':
+            # Like __init__() does
+            if value:
+                for a in value:
+                    a.parent_item = self
+            else:
+                value = []
+        setattr(self, name, value)
+        return value
+
     @classmethod
     def register(cls, attr_name, attr_cls):
         """
@@ -394,6 +419,36 @@ class Item(EWSElement):
         )
 
 
+class _LazyXml(object):
+    # The XML element of a lazy item, and the field values that have been decoded from it. Shallow copies of the item
+    # share this object, because decoding a field value clears the nested elements it was decoded from.
+    __slots__ = ('elem', 'children', 'values')
+
+    def __init__(self, elem):
+        self.elem = elem
+        self.children = None
+        self.values = {}
+
+    def get_value(self, item, field):
+        try:
+            return self.values[field.name]
+        except KeyError:
+            pass
+        _, defaults, _, _ = item._get_decoder()
+        if field.name in defaults:
+            # The field reads its value from a child element. Find all children in one pass, on first access.
+            if self.children is None:
+                self.children = {}
+                for child in self.elem:
+                    self.children.setdefault(child.tag, child)
+            field_elem = self.children.get(field.child_tag())
+            value = field.default if field_elem is None else field.value_from_xml(field_elem, account=item.account)
+        else:
+            value = field.from_xml(elem=self.elem, account=item.account)
+        self.values[field.name] = value
+        return value
+
+
 @python_2_unicode_compatible
 class BulkCreateResult(Item):
     FIELDS = [
@@ -407,7 +462,7 @@ class BulkCreateResult(Item):
     @classmethod
     def from_xml(cls, elem, account):
         item_id, changekey = cls.id_from_xml(elem)
-        kwargs = {f.name: f.from_xml(elem=elem, account=account) for f in cls.supported_fields()}
+        kwargs = cls.fields_from_xml(elem=elem, account=account)
         elem.clear()
         return cls(item_id=item_id, changekey=changekey, **kwargs)
 
@@ -3,11 +3,11 @@ from __future__ import unicode_literals
 import abc
 import logging
 
-from six import text_type, string_types
+from six import text_type, string_types, get_unbound_function
 
 from .fields import SubField, TextField, EmailField, ChoiceField, DateTimeField, EWSElementField, MailboxField, Choice, \
-    BooleanField
-from .services import MNS, TNS
+    BooleanField, FieldURIField
+from .services import MNS, TNS, clear_additional_properties_cache
 from .util import get_xml_attr, create_element
 
 string_type = string_types[0]
@@ -58,6 +58,54 @@ class EWSElement(object):
         elem.clear()
         return cls(**kwargs)
 
+    @classmethod
+    def fields_from_xml(cls, elem, account):
+        # Returns the values of supported_fields() in 'elem' as a dict. Walks the children of 'elem' once, instead of
+        # searching the children for each field.
+        child_fields, defaults, other_fields, _ = cls._get_decoder()
+        kwargs = dict(defaults)
+        found = set()
+        for child in elem:
+            fields = child_fields.get(child.tag)
+            if fields is None or child.tag in found:
+                # Like find(), only use the first child with the tag
+                continue
+            found.add(child.tag)
+            for f in fields:
+                kwargs[f.name] = f.value_from_xml(child, account=account)
+        for f in other_fields:
+            kwargs[f.name] = f.from_xml(elem=elem, account=account)
+        return kwargs
+
+    @classmethod
+    def _get_decoder(cls):
+        # Returns a dict of tag -> the fields that read their value from the child element with that tag, the default
+        # values of those fields, the fields that need the whole element, and a dict of name -> field for all fields.
+        # Cached per class, not inherited.
+        try:
+            return cls.__dict__['_decoder']
+        except KeyError:
+            pass
+        child_fields, defaults, other_fields = {}, {}, []
+        fields = cls.supported_fields()
+        for f in fields:
+            if isinstance(f, FieldURIField) \
+                    and get_unbound_function(type(f).from_xml) is get_unbound_function(FieldURIField.from_xml):
+                child_fields.setdefault(f.child_tag(), []).append(f)
+                defaults[f.name] = f.default
+            else:
+                other_fields.append(f)
+        cls._decoder = child_fields, defaults, tuple(other_fields), {f.name: f for f in fields}
+        return cls._decoder
+
+    @classmethod
+    def _clear_decoders(cls):
+        # Subclasses may share the FIELDS list of this class, so their decoders are cleared as well
+        if '_decoder' in cls.__dict__:
+            del cls._decoder
+        for subclass in cls.__subclasses__():
+            subclass._clear_decoders()
+
     def to_xml(self, version):
         self.clean(version=version)
         # WARNING: The order of addition of XML elements is VERY important. Exchange expects XML elements in a
@@ -101,21 +149,26 @@ class EWSElement(object):
 
     @classmethod
     def add_field(cls, field, idx):
-        # Insert a new field at the preferred place in the tuple and invalidate the fieldname cache
+        # Insert a new field at the preferred place in the tuple and invalidate the fieldname, decoder and field path
+        # caches
         cls.FIELDS.insert(idx, field)
         try:
             delattr(cls, '_fields_map')
         except AttributeError:
             pass
+        cls._clear_decoders()
+        clear_additional_properties_cache()
 
     @classmethod
     def remove_field(cls, field):
-        # Remove the given field and invalidate the fieldname cache
+        # Remove the given field and invalidate the fieldname, decoder and field path caches
         cls.FIELDS.remove(field)
         try:
             delattr(cls, '_fields_map')
         except AttributeError:
             pass
+        cls._clear_decoders()
+        clear_additional_properties_cache()
 
     def __eq__(self, other):
         return hash(self) == hash(other)
@@ -7,10 +7,16 @@ when creating an Account.
 """
 from __future__ import unicode_literals
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import logging
+import os
 import random
+import sys
+import tempfile
+import time
 from multiprocessing.pool import ThreadPool
-from threading import Lock
+from threading import Condition, Event, Lock, Thread
 
 import requests.adapters
 import requests.sessions
@@ -18,17 +24,236 @@ from future.utils import with_metaclass, python_2_unicode_compatible
 from future.moves.queue import LifoQueue, Empty, Full
 
 from .credentials import Credentials
-from .errors import TransportError
+from .errors import TransportError, DeadlineExceeded
 from .services import GetServerTimeZones, GetRoomLists, GetRooms
-from .transport import get_auth_instance, get_service_authtype, get_docs_authtype, AUTH_TYPE_MAP, DEFAULT_HEADERS
-from .util import split_url
-from .version import Version, API_VERSIONS
+from .throttling import AIMDController, BackoffGate, LatencyTracker
+from .transport import get_auth_instance, get_service_authtype, get_docs_authtype, dummy_xml, AUTH_TYPE_MAP, \
+    DEFAULT_HEADERS
+from .util import split_url, shelve_open_with_failover, time_func, get_deadline, call_with_deadline, SingleFlight
+from .version import Build, Version, API_VERSIONS
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
 
 log = logging.getLogger(__name__)
 
+# 'shelve' may pickle objects using different pickle protocol versions. Encode the python version in the filename
+filename_for_version = 'exchangelib.protocol_cache.py{}{}'.format(*sys.version_info[:2])
+PROTOCOL_PERSISTENT_STORAGE = os.path.join(tempfile.gettempdir(), filename_for_version)
+
+# The max number of worker threads shared by all protocols in this process. Each protocol is further limited by its
+# own BoundedExecutor, so a busy protocol can't monopolize the threads.
+MAX_WORKER_THREADS = 64
+# The max number of threads sending hedged requests, see Protocol.HEDGE_REQUESTS. They have their own executor, because
+# tasks on the main executor wait for hedged requests to finish.
+MAX_HEDGING_THREADS = 32
+
+_executors = {}  # Maps the 'hedging' argument of get_executor() to an executor
+_executor_lock = Lock()
+
+# How often the keep-warm thread looks for idle sessions, in seconds. See Protocol.KEEP_WARM
+KEEP_WARM_CHECK_INTERVAL = 10
+
+_keep_warm_thread = None
+_keep_warm_stop = Event()
+_keep_warm_lock = Lock()
+
 
 def close_connections():
+    stop_keep_warm_thread()
     CachingProtocol.clear_cache()
+    shutdown_executor()
+
+
+def get_executor(hedging=False):
+    # Executors are created lazily, so processes that never send pooled or hedged requests don't start any threads
+    with _executor_lock:
+        executor = _executors.get(hedging)
+        if executor is None:
+            max_workers = MAX_HEDGING_THREADS if hedging else MAX_WORKER_THREADS
+            log.debug('Creating executor with max %s worker threads', max_workers)
+            executor = _executors[hedging] = ThreadPoolExecutor(max_workers=max_workers)
+        return executor
+
+
+def shutdown_executor():
+    # Waits for running tasks to finish. New executors are created if we need them later.
+    with _executor_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        log.debug('Shutting down executor')
+        executor.shutdown(wait=True)
+
+
+def start_keep_warm_thread():
+    # Starts the thread that keeps idle sessions of protocols with KEEP_WARM enabled alive. There is only one thread per
+    # process, regardless of the number of protocols.
+    global _keep_warm_thread
+    with _keep_warm_lock:
+        if _keep_warm_thread is not None and _keep_warm_thread.is_alive():
+            return
+        _keep_warm_stop.clear()
+        _keep_warm_thread = Thread(target=_keep_warm_loop, name='exchangelib-keep-warm')
+        _keep_warm_thread.daemon = True
+        _keep_warm_thread.start()
+
+
+def stop_keep_warm_thread():
+    global _keep_warm_thread
+    with _keep_warm_lock:
+        thread, _keep_warm_thread = _keep_warm_thread, None
+        _keep_warm_stop.set()
+    if thread is not None:
+        thread.join()
+
+
+def _keep_warm_loop():
+    while not _keep_warm_stop.wait(KEEP_WARM_CHECK_INTERVAL):
+        # Copy the values. Other threads may add protocols while we are iterating.
+        for protocol in list(CachingProtocol._protocol_cache.values()):
+            if not isinstance(protocol, Protocol) or not protocol.KEEP_WARM:
+                continue
+            try:
+                protocol.keep_warm()
+            except Exception:
+                log.exception('Server %s: Failed to keep sessions warm', protocol.server)
+
+
+class BoundedExecutor(object):
+    """
+    Submits tasks to the process-wide executor, with at most 'max_workers' tasks running or waiting to run at a time.
+    submit() blocks until a slot is available, or raises DeadlineExceeded if the deadline of the current thread passes
+    first. Returns concurrent.futures.Future objects.
+    """
+    def __init__(self, max_workers):
+        assert max_workers >= 1
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self._cond = Condition()
+
+    def submit(self, fn, *args, **kwargs):
+        request_deadline = get_deadline()
+        if request_deadline is not None:
+            # The task must respect the deadline of the thread that submitted it
+            fn, args = call_with_deadline, (request_deadline, fn) + args
+        if not self._acquire(timeout=None if request_deadline is None else request_deadline.remaining()):
+            raise DeadlineExceeded('Deadline of %s seconds exceeded' % request_deadline.seconds)
+        try:
+            future = get_executor().submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _acquire(self, timeout=None):
+        # Block until a slot is available, or for at most 'timeout' seconds. Returns False if we timed out.
+        end = None if timeout is None else time_func() + timeout
+        with self._cond:
+            while self.in_flight >= self.max_workers:
+                if end is None:
+                    self._cond.wait()
+                    continue
+                remaining = end - time_func()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+            self.in_flight += 1
+        return True
+
+    def _release(self, future=None):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.max_workers,))
+
+
+class ProtocolSettingsCache(object):
+    # Persists the service endpoint -> (auth_type, docs_auth_type, version) translation to the filesystem, so a new
+    # process doesn't have to probe a server that another process on the same host has already probed. Probing takes
+    # several requests, some of which are expected to fail, so this can save seconds on every start.
+    #
+    # Like the autodiscover cache, the storage could be readable by unprivileged users, so it must not contain sensitive
+    # information. Auth types and server versions are available to anyone who can reach the server. Just don't persist
+    # any credentials info.
+    #
+    # Entries expire after TTL seconds, so we eventually notice server upgrades and changes to the auth configuration.
+    # When the cached auth type fails, the protocol probes the server again and overwrites the entry. A wrong version is
+    # handled by the version fallback in the services, like a wrong version given by the user.
+    #
+    # The storage is shared by all threads and processes using the cache, so access is serialized with a lock, and
+    # with a lock file where the platform supports it.
+
+    TTL = 24 * 3600  # Seconds
+
+    @property
+    def _storage_file(self):
+        return PROTOCOL_PERSISTENT_STORAGE
+
+    @contextmanager
+    def _open(self):
+        log.debug('Waiting for _protocol_settings_cache_lock')
+        with _protocol_settings_cache_lock:
+            if fcntl is None:
+                with shelve_open_with_failover(self._storage_file) as db:
+                    yield db
+                return
+            with open(self._storage_file + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    with shelve_open_with_failover(self._storage_file) as db:
+                        yield db
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def clear(self):
+        with self._open() as db:
+            db.clear()
+
+    def get(self, service_endpoint):
+        # Returns a (auth_type, docs_auth_type, version) tuple, or None if we have no fresh entry for the endpoint
+        with self._open() as db:
+            entry = db.get(str(service_endpoint))
+        if entry is None:
+            return None
+        try:
+            auth_type, docs_auth_type, build, api_version, timestamp = entry
+            if not 0 <= time.time() - timestamp < self.TTL:
+                log.debug('Cached settings for %s have expired', service_endpoint)
+                return None
+            if auth_type not in AUTH_TYPE_MAP or docs_auth_type not in AUTH_TYPE_MAP:
+                return None
+            version = Version(build=Build(*build) if build else None, api_version=api_version)
+        except (TypeError, ValueError) as e:
+            # Written by an incompatible version of this package. It will be overwritten when we have probed the server.
+            log.debug('Invalid cached settings for %s: %s', service_endpoint, e)
+            return None
+        return auth_type, docs_auth_type, version
+
+    def set(self, service_endpoint, auth_type, docs_auth_type, version):
+        build = version.build
+        build_tuple = None if build is None else (build.major_version, build.minor_version, build.major_build,
+                                                  build.minor_build)
+        with self._open() as db:
+            db[str(service_endpoint)] = (auth_type, docs_auth_type, build_tuple, version.api_version, time.time())
+
+    def delete(self, service_endpoint):
+        # Don't fail on non-existing entries because we could end here multiple times due to race conditions
+        with self._open() as db:
+            try:
+                del db[str(service_endpoint)]
+            except KeyError:
+                pass
+
+
+_protocol_settings_cache = ProtocolSettingsCache()
+_protocol_settings_cache_lock = Lock()
 
 
 class BaseProtocol(object):
@@ -38,6 +263,10 @@ class BaseProtocol(object):
     # low unless you have an agreement with the Exchange admin on the receiving end to hammer the server and
     # rate-limiting policies have been disabled for the connecting user.
     SESSION_POOLSIZE = 4
+    # The session pool size is adjusted at runtime between these limits, depending on how well the server copes with
+    # our requests. SESSION_POOLSIZE is the initial pool size. See AIMDController for details.
+    MIN_SESSION_POOLSIZE = 1
+    MAX_SESSION_POOLSIZE = 16
     # We want only 1 TCP connection per Session object. We may have lots of different credentials hitting the server and
     # each credential needs its own session (NTLM auth will only send credentials once and then secure the connection,
     # so a connection can only handle requests for one credential). Having multiple connections ser Session could
@@ -45,6 +274,15 @@ class BaseProtocol(object):
     CONNECTIONS_PER_SESSION = 1
     # Timeout for HTTP requests
     TIMEOUT = 120
+    # If True, large responses (FindItem, FindFolder and GetItem) are parsed while they are being downloaded, and items
+    # are returned as soon as they have been parsed. This keeps memory use low for large responses, but the session is
+    # busy until the consumer has iterated over all items in a response.
+    STREAM_RESPONSES = False
+    # Sessions that have been idle for longer than this many seconds are replaced by a fresh session before they are
+    # used. Servers and load balancers silently close idle connections, and a request on a closed connection fails and
+    # is only retried after a cool-down period. IIS closes idle connections after 120 seconds by default. Set to None to
+    # never replace idle sessions.
+    SESSION_KEEPALIVE = 100
 
     # The adapter class to use for HTTP requests. Override this if you need e.g. proxy support or specific TLS versions
     HTTP_ADAPTER_CLS = requests.adapters.HTTPAdapter
@@ -59,6 +297,15 @@ class BaseProtocol(object):
         self.auth_type = auth_type
         self.verify_ssl = verify_ssl
         self._session_pool = None  # Consumers need to fill the session pool themselves
+        self._session_pool_size = 0  # The number of sessions we created, including sessions currently in use
+        self._session_pool_lock = Lock()
+        self.session_pool_controller = AIMDController(
+            window=self.SESSION_POOLSIZE,
+            min_window=min(self.MIN_SESSION_POOLSIZE, self.SESSION_POOLSIZE),
+            max_window=max(self.MAX_SESSION_POOLSIZE, self.SESSION_POOLSIZE),
+        )
+        # Closed while the server has asked us to back off. Shared by all sessions.
+        self.backoff_gate = BackoffGate()
 
     def __del__(self):
         # pylint: disable=bare-except
@@ -72,9 +319,33 @@ class BaseProtocol(object):
         log.debug('Server %s: Closing sessions', self.server)
         while True:
             try:
-                self._session_pool.get(block=False).close_socket(self.service_endpoint)
+                session = self._session_pool.get(block=False)
             except Empty:
                 break
+            session.close_socket(self.service_endpoint)
+            with self._session_pool_lock:
+                self._session_pool_size -= 1
+
+    def _create_session_pool(self):
+        # Try to behave nicely with the Exchange server. We want to keep the connection open between requests.
+        # We also want to re-use sessions, to avoid the NTLM auth handshake on every request. The pool size is limited
+        # by the session pool controller, so the queue itself is unbounded.
+        self._session_pool = LifoQueue()
+        for _ in range(self.session_pool_controller.window):
+            self._session_pool_size += 1
+            self._session_pool.put(self.create_session(), block=False)
+
+    def _grow_session_pool(self):
+        # Sessions are created lazily, when there are no idle sessions and the session pool controller allows more
+        # sessions than we currently have.
+        if self._session_pool.qsize() or self._session_pool_size >= self.session_pool_controller.window:
+            return
+        with self._session_pool_lock:
+            if self._session_pool_size >= self.session_pool_controller.window:
+                return
+            self._session_pool_size += 1
+        log.debug('Server %s: Growing session pool to %s sessions', self.server, self._session_pool_size)
+        self._session_pool.put(self.create_session(), block=False)
 
     @classmethod
     def get_adapter(cls):
@@ -87,20 +358,44 @@ class BaseProtocol(object):
         )
 
     def get_session(self):
+        request_deadline = get_deadline()
+        if request_deadline is not None:
+            request_deadline.check(wait=self.backoff_gate.remaining())
+        # Don't take a session while the server has asked us to back off
+        self.backoff_gate.wait()
         _timeout = 60  # Rate-limit messages about session starvation
         while True:
+            self._grow_session_pool()
+            if request_deadline is not None:
+                request_deadline.check()
+                _timeout = min(_timeout, request_deadline.remaining())
             try:
                 log.debug('Server %s: Waiting for session', self.server)
                 session = self._session_pool.get(timeout=_timeout)
                 log.debug('Server %s: Got session %s', self.server, session.session_id)
-                return session
             except Empty:
                 # This is normal when we have many worker threads starving for available sessions
                 log.debug('Server %s: No sessions available for %s seconds', self.server, _timeout)
+                continue
+            if self.SESSION_KEEPALIVE is not None and time_func() - session.last_used > self.SESSION_KEEPALIVE:
+                # The connection has probably been closed by the server
+                log.debug('Server %s: Session %s has been idle for too long', self.server, session.session_id)
+                session = self.renew_session(session)
+            return session
 
     def release_session(self, session):
+        with self._session_pool_lock:
+            must_shrink = self._session_pool_size > self.session_pool_controller.window
+            if must_shrink:
+                self._session_pool_size -= 1
+        if must_shrink:
+            # The session pool controller decided that we have too many sessions
+            log.debug('Server %s: Shrinking session pool to %s sessions', self.server, self._session_pool_size)
+            session.close_socket(self.service_endpoint)
+            return
         # This should never fail, as we don't have more sessions than the queue contains
         log.debug('Server %s: Releasing session %s', self.server, session.session_id)
+        session.last_used = time_func()
         try:
             self._session_pool.put(session, block=False)
         except Full:
@@ -190,47 +485,240 @@ class CachingProtocol(type):
 
 @python_2_unicode_compatible
 class Protocol(with_metaclass(CachingProtocol, BaseProtocol)):
+    # If True, the independent requests needed to set up the protocol run in parallel, and all sessions in the pool are
+    # authenticated up front. This shortens the time until the protocol is ready, and the first requests don't have to
+    # wait for e.g. NTLM handshakes. The price is a burst of requests to the server when the protocol is created.
+    PARALLEL_STARTUP = False
+    # If True, a background thread sends a minimal request on sessions that have been idle for half of
+    # SESSION_KEEPALIVE seconds, so they stay authenticated and connected. This avoids new connections and auth
+    # handshakes for intermittent workloads, at the price of a request every SESSION_KEEPALIVE / 2 seconds per idle
+    # session. The thread is shared by all protocols.
+    KEEP_WARM = False
+    # If True, requests of read-only services (see EWSService.READ_ONLY) that take longer than the HEDGE_PERCENTILE
+    # percentile of recent response times of the service are sent again on another session, and the first response
+    # wins. This cuts the tail latency caused by slow backend servers, at the price of some duplicate requests. Requests
+    # that change anything on the server are never hedged.
+    HEDGE_REQUESTS = False
+    HEDGE_PERCENTILE = 95
+    # If True, identical requests of read-only services that are in flight at the same time are sent only once, and
+    # share the response. This helps when many threads start up and e.g. all need the same folder. Requests for
+    # different accounts are never coalesced, and a read that starts after a write has finished never shares the
+    # response of a read that started before the write. Reads may still miss writes that are in flight, so this is off
+    # by default.
+    COALESCE_REQUESTS = False
+    # If True, the auth types and server version we detect are persisted to the filesystem and re-used by protocols
+    # pointing to the same service endpoint, also in other processes, until the cache entry expires. See
+    # ProtocolSettingsCache.
+    USE_SETTINGS_CACHE = False
+
     def __init__(self, *args, **kwargs):
         version = kwargs.pop('version', None)
         super(Protocol, self).__init__(*args, **kwargs)
+        self.latency_trackers = {}  # Recent response times per service name, used for hedging
+        self.requests_in_flight = SingleFlight()  # Used for coalescing requests
+        self.write_generation = 0  # The number of write requests that have finished. Used for coalescing requests
+        self._write_generation_lock = Lock()
 
         scheme = 'https' if self.has_ssl else 'https'
         self.wsdl_url = '%s://%s/EWS/Services.wsdl' % (scheme, self.server)
         self.messages_url = '%s://%s/EWS/messages.xsd' % (scheme, self.server)
         self.types_url = '%s://%s/EWS/types.xsd' % (scheme, self.server)
 
-        # Autodetect authentication type if necessary
-        if self.auth_type is None:
-            self.auth_type = get_service_authtype(service_endpoint=self.service_endpoint, versions=API_VERSIONS,
-                                                  verify=self.verify_ssl, name=self.credentials.username)
-
-        # Default to the auth type used by the service. We only need this if 'version' is None
-        self.docs_auth_type = self.auth_type
-
-        # Try to behave nicely with the Exchange server. We want to keep the connection open between requests.
-        # We also want to re-use sessions, to avoid the NTLM auth handshake on every request.
-        self._session_pool = LifoQueue(maxsize=self.SESSION_POOLSIZE)
-        for _ in range(self.SESSION_POOLSIZE):
-            self._session_pool.put(self.create_session(), block=False)
-
-        if version:
-            isinstance(version, Version)
-            self.version = version
+        must_probe = self.auth_type is None or version is None
+        cached = _protocol_settings_cache.get(self.service_endpoint) \
+            if must_probe and self.USE_SETTINGS_CACHE else None
+        # True if we are using settings from the persistent cache instead of settings we detected or were given
+        self.settings_from_cache = cached is not None
+        self._settings_lock = Lock()
+        if cached:
+            log.debug('Server %s: Using cached auth type and version', self.server)
+            cached_auth_type, self.docs_auth_type, cached_version = cached
+            if self.auth_type is None:
+                self.auth_type = cached_auth_type
+            self._create_session_pool()
+            self.version = version or cached_version
+        elif self.PARALLEL_STARTUP:
+            self._parallel_startup(version=version)
         else:
-            # Version.guess() needs auth objects and a working session pool
+            # Autodetect authentication type if necessary
+            if self.auth_type is None:
+                self.auth_type = get_service_authtype(service_endpoint=self.service_endpoint, versions=API_VERSIONS,
+                                                      verify=self.verify_ssl, name=self.credentials.username)
+
+            # Default to the auth type used by the service. We only need this if 'version' is None
+            self.docs_auth_type = self.auth_type
+
+            self._create_session_pool()
+
+            if version:
+                isinstance(version, Version)
+                self.version = version
+            else:
+                # Version.guess() needs auth objects and a working session pool
+                try:
+                    # Try to get the auth_type of 'types.xsd' so we can fetch it and look at the version contained there
+                    self.docs_auth_type = get_docs_authtype(verify=self.verify_ssl, docs_url=self.types_url)
+                except TransportError:
+                    pass
+                self.version = Version.guess(self)
+        if must_probe and not cached and self.USE_SETTINGS_CACHE:
+            _protocol_settings_cache.set(service_endpoint=self.service_endpoint, auth_type=self.auth_type,
+                                         docs_auth_type=self.docs_auth_type, version=self.version)
+
+        # Used by services to process service requests that are able to run in parallel. The worker threads are shared
+        # by all protocols, but we allow more tasks than we have sessions, so we have time to process data without
+        # idling the connection.
+        self.thread_pool = BoundedExecutor(max_workers=4 * self.SESSION_POOLSIZE)
+        if self.KEEP_WARM and self.SESSION_KEEPALIVE is not None:
+            start_keep_warm_thread()
+
+    def _parallel_startup(self, version):
+        # The same steps as the serial startup, but requests that don't depend on each other run in parallel. The
+        # service auth type is needed for the session pool. The docs auth type is needed to read the API version hint
+        # from types.xsd. The session pool and the hint are both needed to guess the version.
+        pool = ThreadPool(processes=1)
+        try:
+            hint_result = None if version else pool.apply_async(self._get_docs_authtype_and_hint)
+            if self.auth_type is None:
+                self.auth_type = get_service_authtype(service_endpoint=self.service_endpoint, versions=API_VERSIONS,
+                                                      verify=self.verify_ssl, name=self.credentials.username,
+                                                      parallel=True)
+            self._create_session_pool()
+            self.warm_up_sessions(api_version=version.api_version if version else API_VERSIONS[-1])
+            if version:
+                self.docs_auth_type = self.auth_type
+                self.version = version
+            else:
+                self.docs_auth_type, hint = hint_result.get()
+                if self.docs_auth_type is None:
+                    # Like the serial startup, try reading types.xsd with the auth type used by the service
+                    self.docs_auth_type = self.auth_type
+                    hint = Version.get_api_version_hint(protocol=self)
+                self.version = Version._guess_version_from_service(protocol=self, hint=hint)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _get_docs_authtype_and_hint(self):
+        # Returns the auth type of types.xsd and the API version hint contained there, or (None, None) if we can't get
+        # the auth type. Runs in parallel with the rest of the startup, so it must not change the protocol.
+        try:
+            # Try to get the auth_type of 'types.xsd' so we can fetch it and look at the version contained there
+            docs_auth_type = get_docs_authtype(verify=self.verify_ssl, docs_url=self.types_url)
+        except TransportError:
+            return None, None
+        return docs_auth_type, Version.get_api_version_hint(protocol=self, docs_auth_type=docs_auth_type)
+
+    def on_write_done(self):
+        # Called when a request that may have changed anything on the server has finished, successfully or not
+        with self._write_generation_lock:
+            self.write_generation += 1
+
+    def get_latency_tracker(self, service_name):
+        # dict.setdefault() is atomic, so threads agree on the tracker
+        tracker = self.latency_trackers.get(service_name)
+        if tracker is None:
+            tracker = self.latency_trackers.setdefault(service_name, LatencyTracker())
+        return tracker
+
+    def get_hedge_delay(self, service_name):
+        # Returns the number of seconds to wait for a response before hedging a request, or None if we shouldn't hedge
+        if not self.HEDGE_REQUESTS:
+            return None
+        return self.get_latency_tracker(service_name).percentile(self.HEDGE_PERCENTILE)
+
+    @staticmethod
+    def get_hedging_executor():
+        return get_executor(hedging=True)
+
+    def refresh_cached_settings(self, failed_auth_type):
+        # A request using 'failed_auth_type' was rejected. If the auth type came from the persistent cache, it may be
+        # outdated, so probe the server again and replace the sessions. Returns True if the auth type has changed since
+        # the request was sent, so the request is worth retrying.
+        with self._settings_lock:
+            if self.settings_from_cache:
+                log.debug('Server %s: Cached auth type %s failed. Probing again', self.server, self.auth_type)
+                _protocol_settings_cache.delete(self.service_endpoint)
+                self.settings_from_cache = False
+                auth_type = get_service_authtype(service_endpoint=self.service_endpoint, versions=API_VERSIONS,
+                                                 verify=self.verify_ssl, name=self.credentials.username)
+                if auth_type != self.auth_type:
+                    self.auth_type = auth_type
+                    self._renew_session_pool()
+                if self.USE_SETTINGS_CACHE:
+                    _protocol_settings_cache.set(service_endpoint=self.service_endpoint, auth_type=self.auth_type,
+                                                 docs_auth_type=self.docs_auth_type, version=self.version)
+            return self.auth_type != failed_auth_type
+
+    def _renew_session_pool(self):
+        # Replaces the idle sessions with sessions using the current auth type. Sessions that are in use and fail are
+        # replaced by retire_session().
+        sessions = []
+        while True:
             try:
-                # Try to get the auth_type of 'types.xsd' so we can fetch it and look at the version contained there
-                self.docs_auth_type = get_docs_authtype(verify=self.verify_ssl, docs_url=self.types_url)
-            except TransportError:
-                pass
-            self.version = Version.guess(self)
-
-        # Used by services to process service requests that are able to run in parallel. Thread pool should be
-        # larger than the connection pool so we have time to process data without idling the connection.
-        # Create the pool as the last thing here, since we may fail in the version or auth type guessing, which would
-        # leave open threads around to be garbage collected.
-        thread_poolsize = 4 * self.SESSION_POOLSIZE
-        self.thread_pool = ThreadPool(processes=thread_poolsize)
+                sessions.append(self._session_pool.get(block=False))
+            except Empty:
+                break
+        for session in reversed(sessions):
+            self._session_pool.put(self.renew_session(session), block=False)
+
+    def keep_warm(self):
+        # Sends a minimal request on sessions that will soon be considered stale by get_session()
+        self.warm_up_sessions(api_version=self.version.api_version, min_idle=self.SESSION_KEEPALIVE / 2)
+
+    def warm_up_sessions(self, api_version, min_idle=None):
+        # Sends a minimal request on all idle sessions in parallel, or only on sessions that have been idle for at least
+        # 'min_idle' seconds. This performs the authentication handshake up front, which is expensive for
+        # connection-bound auth types like NTLM. The requests respect the rate limiter of the credentials and the back
+        # off requested by the server. Failures are logged, and the failing sessions are replaced.
+        if self.backoff_gate.remaining():
+            # Don't bother the server while it has asked us to back off
+            log.debug('Server %s: Not warming up sessions while backing off', self.server)
+            return
+        sessions = self._take_idle_sessions(min_idle=min_idle)
+        if not sessions:
+            return
+        log.debug('Server %s: Warming up %s sessions', self.server, len(sessions))
+        data = dummy_xml(version=api_version, name=self.credentials.username)
+        rate_limiter = self.credentials.rate_limiter
+
+        def warm_up(session):
+            # Returns the session to put back in the pool
+            self.backoff_gate.wait()
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            try:
+                r = session.post(url=self.service_endpoint, data=data, allow_redirects=False, timeout=self.TIMEOUT,
+                                 verify=self.verify_ssl)
+            except Exception as e:
+                log.warning('Server %s: Failed to warm up session %s: %s', self.server, session.session_id, e)
+                return self.renew_session(session)
+            finally:
+                if rate_limiter is not None:
+                    rate_limiter.release()
+            if r.status_code == 401:
+                log.warning('Server %s: Failed to authenticate session %s', self.server, session.session_id)
+                return self.renew_session(session)
+            return session
+
+        futures = [get_executor().submit(warm_up, session) for session in sessions]
+        for session, future in zip(sessions, futures):
+            try:
+                session = future.result()
+            except Exception as e:
+                log.warning('Server %s: Failed to warm up session %s: %s', self.server, session.session_id, e)
+            self.release_session(session)
+
+    def _take_idle_sessions(self, min_idle=None):
+        # Removes and returns the sessions in the pool that have been idle for at least 'min_idle' seconds, or all
+        # sessions if 'min_idle' is None. The other sessions stay available to get_session() all the time.
+        now = time_func()
+        with self._session_pool.mutex:
+            queue = self._session_pool.queue
+            sessions = [s for s in queue if min_idle is None or now - s.last_used >= min_idle]
+            for session in sessions:
+                queue.remove(session)
+        return sessions
 
     def get_timezones(self):
         return GetServerTimeZones(protocol=self).call()
@@ -264,6 +752,7 @@ class EWSSession(requests.sessions.Session):
     def __init__(self, protocol):
         self.session_id = random.randint(1, 32767)  # Used for debugging messages in services
         self.protocol = protocol
+        self.last_used = time_func()  # The time this session was last returned to the session pool
         super(EWSSession, self).__init__()
 
     def close_socket(self, url):
@@ -4,6 +4,7 @@ from __future__ import unicode_literals
 from copy import deepcopy
 from itertools import islice
 import logging
+import sys
 
 from future.utils import python_2_unicode_compatible
 
@@ -44,6 +45,7 @@ class QuerySet(object):
         self.calendar_view = None
         self.page_size = None
         self.max_items = None
+        self.is_lazy = False
 
         self._cache = None
 
@@ -68,9 +70,28 @@ class QuerySet(object):
         new_qs.order_fields = None if self.order_fields is None else deepcopy(self.order_fields)
         new_qs.return_format = self.return_format
         new_qs.calendar_view = self.calendar_view
+        new_qs.is_lazy = self.is_lazy
         return new_qs
 
     def _query(self):
+        additional_fields, complex_fields_requested, find_item_kwargs, extra_order_fields = self._get_query_args()
+        if complex_fields_requested:
+            # The FindItems service does not support complex field types. Fallback to getting ids and calling GetItems
+            items = self.folder.fetch(
+                ids=self.folder.find_items(self.q, **find_item_kwargs),
+                only_fields=additional_fields,
+                lazy=self.is_lazy,
+            )
+        else:
+            items = self.folder.find_items(self.q, **find_item_kwargs)
+        if extra_order_fields is None:
+            return items
+        return self._sort_clientside(items, extra_order_fields)
+
+    def _get_query_args(self):
+        # Returns the fields to fetch, whether we need to use GetItem to fetch them, the kwargs for
+        # Folder.find_items(), and the fields we must fetch only for client-side sorting. The latter is None if no
+        # client-side sorting is needed.
         if self.only_fields is None:
             # The list of field paths was not restricted. Get all field paths we support, as a set, but remove item_id
             # and changekey. We get them unconditionally.
@@ -97,6 +118,7 @@ class QuerySet(object):
             calendar_view=self.calendar_view,
             page_size=self.page_size,
             max_items=self.max_items,
+            lazy=self.is_lazy,
         )
 
         if must_sort_clientside:
@@ -105,23 +127,15 @@ class QuerySet(object):
             if extra_order_fields:
                 additional_fields.update(extra_order_fields)
         else:
-            extra_order_fields = set()
+            extra_order_fields = None
 
-        if complex_fields_requested:
-            # The FindItems service does not support complex field types. Fallback to getting ids and calling GetItems
-            items = self.folder.fetch(
-                ids=self.folder.find_items(self.q, **find_item_kwargs),
-                only_fields=additional_fields
-            )
-        else:
+        if not complex_fields_requested and additional_fields:
             # If we requested no additional fields, we can take a shortcut by setting additional_fields=None. This tells
             # find_items() to do less work.
-            if additional_fields:
-                find_item_kwargs['additional_fields'] = additional_fields
-            items = self.folder.find_items(self.q, **find_item_kwargs)
-        if not must_sort_clientside:
-            return items
+            find_item_kwargs['additional_fields'] = additional_fields
+        return additional_fields, complex_fields_requested, find_item_kwargs, extra_order_fields
 
+    def _sort_clientside(self, items, extra_order_fields):
         # Resort to client-side sorting of the order_by fields. This is greedy. Sorting in Python is stable, so when
         # sorting on multiple fields, we can just do a sort on each of the requested fields in reverse order. Reverse
         # each sort operation if the field was marked as such.
@@ -154,16 +168,27 @@ class QuerySet(object):
 
         log.debug('Initializing cache')
         _cache = []
-        result_formatter = {
+        for val in self._get_result_formatter()(self._query()):
+            _cache.append(val)
+            yield val
+        self._cache = _cache
+
+    def __aiter__(self):
+        # Support 'async for item in qs'. The queries are sent using the asyncio transport, which requires Python 3.6+
+        # and the 'aiohttp' package. See exchangelib.aio for details.
+        if sys.version_info < (3, 6):
+            # exchangelib.aio uses async generators
+            raise NotImplementedError('The asyncio transport requires Python 3.6+')
+        from .aio import aiter_queryset
+        return aiter_queryset(self)
+
+    def _get_result_formatter(self):
+        return {
             self.VALUES: self._as_values,
             self.VALUES_LIST: self._as_values_list,
             self.FLAT: self._as_flat_values_list,
             self.NONE: self._as_items,
         }[self.return_format]
-        for val in result_formatter(self._query()):
-            _cache.append(val)
-            yield val
-        self._cache = _cache
 
     def __len__(self):
         if self._cache is not None:
@@ -351,6 +376,13 @@ class QuerySet(object):
         new_qs.order_fields = order_fields
         return new_qs
 
+    def lazy(self):
+        """ Return items that keep their XML and decode each field value on first access, instead of decoding all
+        fields when the items are created. Use this when fetching many fields but reading only a few of them """
+        new_qs = self.copy()
+        new_qs.is_lazy = True
+        return new_qs
+
     def reverse(self):
         """ Return the entire query result in reverse order """
         if not self.order_fields:
@@ -417,6 +449,7 @@ class QuerySet(object):
             items = list(self.folder.fetch(
                 ids=[(kwargs['item_id'], kwargs['changekey'])],
                 only_fields=self.only_fields,
+                lazy=self.is_lazy,
             ))
         else:
             new_qs = self.filter(*args, **kwargs)
@@ -13,14 +13,18 @@ Exchange EWS references:
 from __future__ import unicode_literals
 
 import abc
+from concurrent.futures import wait, FIRST_COMPLETED
+from functools import partial
 from itertools import chain
 import logging
+import time
 import traceback
 from xml.etree.ElementTree import ParseError
 
-from six import text_type
+from requests.cookies import remove_cookie_by_name
+from six import text_type, get_unbound_function
 
-from . import errors
+from . import errors, tracing
 from .errors import EWSWarning, TransportError, SOAPError, ErrorTimeoutExpired, ErrorBatchProcessingStopped, \
     ErrorQuotaExceeded, ErrorCannotDeleteObject, ErrorCreateItemAccessDenied, ErrorFolderNotFound, \
     ErrorNonExistentMailbox, ErrorMailboxStoreUnavailable, ErrorImpersonateUserDenied, ErrorInternalServerError, \
@@ -29,20 +33,203 @@ from .errors import EWSWarning, TransportError, SOAPError, ErrorTimeoutExpired,
     ErrorTooManyObjectsOpened, ErrorInvalidLicense, ErrorInvalidSchemaVersionForMailboxVersion, \
     ErrorInvalidServerVersion, ErrorItemNotFound, ErrorADUnavailable, ResponseMessageError, ErrorInvalidChangeKey, \
     ErrorItemSave, ErrorInvalidIdMalformed, ErrorMessageSizeExceeded, UnauthorizedError, ErrorCannotDeleteTaskOccurrence, \
-    ErrorMimeContentConversionFailed, ErrorRecurrenceHasNoOccurrence 
+    ErrorMimeContentConversionFailed, ErrorRecurrenceHasNoOccurrence, DeadlineExceeded
 from .ewsdatetime import EWSDateTime, UTC
-from .transport import wrap, SOAPNS, TNS, MNS, ENS
+from .throttling import RetryPolicy
+from .tracing import RequestTrace
+from .transport import wrap, get_affinity_headers, SOAPNS, TNS, MNS, ENS, BACKEND_OVERRIDE_COOKIE
 from .util import chunkify, create_element, add_xml_child, get_xml_attr, to_xml, post_ratelimited, ElementType, \
-    xml_to_str, set_xml_value
+    xml_to_str, set_xml_value, time_func, get_deadline, call_with_deadline, iterparse, StreamedContent, RawXml
 from .version import EXCHANGE_2010, EXCHANGE_2013
 
 log = logging.getLogger(__name__)
 
+# Errors that tell us the server is overloaded, and that we should lower the number of concurrent requests
+CONGESTION_ERRORS = (ErrorServerBusy, ErrorTooManyObjectsOpened)
+
+# Serialized AdditionalProperties elements, keyed on the set of field paths and the server build, or the API version if
+# the build is unknown. Default querysets request all fields of an item class, which expands to hundreds of elements on
+# every request.
+_additional_properties_cache = dict()
+ADDITIONAL_PROPERTIES_CACHE_SIZE = 256
+
+
+def clear_additional_properties_cache():
+    # Call this when the fields of an item or folder class change, to free elements for fields that no longer exist
+    _additional_properties_cache.clear()
+
+
+def _field_path_cache_key(field_path):
+    # FieldPath only hashes on the field name for extended properties, so two extended properties registered with the
+    # same attribute name on different item classes would share a cache entry. Include the class of the field and its
+    # value class, which holds the property set ID etc. of extended properties.
+    field = field_path.field
+    return type(field), getattr(field, 'value_cls', None), field.name, field_path.label, field_path.subfield
+
+
+class _ChunkReader(object):
+    # A minimal file-like object over an iterator of byte strings, for iterparse()
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def read(self, size=-1):
+        # iterparse() accepts fewer bytes than requested. An empty string means end of file.
+        for chunk in self._chunks:
+            if chunk:
+                return chunk
+        return b''
+
+
+class StreamingResponse(object):
+    """
+    Parses a SOAP response incrementally while it is being downloaded, so we don't need to keep the full response text
+    and the full XML tree in memory. Iterating over this object yields the ResponseMessage elements of the response.
+
+    A message is yielded as soon as its element container (e.g. 'Items') starts, or when the message is complete if the
+    service has no element container. The elements in the container are parsed on demand by iter_children(). Messages
+    and container elements are detached from the tree when they have been consumed, so peak memory use is roughly the
+    size of one item.
+
+    The HTTP session is busy until the response has been read, so it is only released back to the session pool by
+    close(). Consumers must call close() when they are done, also when they stop reading early.
+    """
+    # The number of bytes to read from the network at a time
+    CHUNK_SIZE = 16 * 1024
+
+    def __init__(self, response, service_name, container_name, on_close=None):
+        self.service_name = service_name
+        self.container_name = container_name
+        self.header = None  # The SOAP Header element. Available when read_body() has returned
+        self._response = response
+        self._on_close = on_close
+        self._events = iterparse(_ChunkReader(response.iter_content(self.CHUNK_SIZE)), events=('start', 'end'))
+        self._stack = []  # The elements that have started but not yet ended
+        self._messages = None
+        self._closed = False
+
+    def _next_event(self):
+        try:
+            event, elem = next(self._events)
+        except StopIteration:
+            raise SOAPError('Bad SOAP response: premature end of response')
+        except ParseError as e:
+            raise SOAPError('Bad SOAP response: %s' % e)
+        if event == 'start':
+            self._stack.append(elem)
+        else:
+            self._stack.pop()
+        return event, elem
+
+    def _is_open(self, elem):
+        # Element identity, not equality
+        return any(e is elem for e in self._stack)
+
+    def complete(self, elem):
+        # Reads until 'elem' is complete
+        while self._is_open(elem):
+            self._next_event()
+
+    def read_body(self):
+        # Reads until the first element in the SOAP Body has started and returns it. The Header element is available
+        # afterwards. A Fault element is read completely, so it can be inspected by the caller.
+        while True:
+            event, elem = self._next_event()
+            if event == 'end' and elem.tag == '{%s}Header' % SOAPNS:
+                self.header = elem
+            elif event == 'start' and len(self._stack) == 3 and self._stack[1].tag == '{%s}Body' % SOAPNS:
+                if elem.tag == '{%s}Fault' % SOAPNS:
+                    self.complete(elem)
+                return elem
+            elif event == 'end' and elem.tag == '{%s}Body' % SOAPNS:
+                raise TransportError('No content in SOAP Body')
+
+    def __iter__(self):
+        if self._messages is None:
+            self._messages = self._iter_messages()
+        return self._messages
+
+    def _iter_messages(self):
+        assert len(self._stack) == 3  # read_body() must be called first
+        response = self._stack[-1]
+        event, elem = self._next_event()
+        if event == 'end' or elem.tag != '{%s}ResponseMessages' % MNS:
+            # Result isn't delivered in a list of FooResponseMessages, but directly in the FooResponse
+            self.complete(response)
+            self._read_to_end()
+            yield response
+            return
+        response_messages = elem
+        message_tag = '{%s}%sResponseMessage' % (MNS, self.service_name)
+        while True:
+            event, elem = self._next_event()
+            if elem is response_messages:
+                break
+            if event == 'end':
+                continue
+            if elem.tag == message_tag:
+                self._read_until_container(elem)
+                yield elem
+            self.complete(elem)
+            response_messages.remove(elem)
+        self._read_to_end()
+
+    def _read_until_container(self, message):
+        while self._is_open(message):
+            event, elem = self._next_event()
+            if event == 'start' and elem.tag == self.container_name:
+                return
+
+    def iter_children(self, container):
+        # Yields the child elements of 'container' as soon as they are complete, and detaches them from the tree
+        if not self._is_open(container):
+            for elem in list(container):
+                yield elem
+            return
+        depth = len(self._stack)
+        while True:
+            event, elem = self._next_event()
+            if elem is container:
+                return
+            if event == 'end' and len(self._stack) == depth:
+                yield elem
+                container.remove(elem)
+
+    def _read_to_end(self):
+        while self._stack:
+            self._next_event()
+        # Let the parser see the end of the data
+        for _ in self._events:
+            pass
+
+    def finish(self):
+        # Reads the rest of the response and closes it
+        if not self._closed:
+            try:
+                for _ in self:
+                    pass
+            finally:
+                self.close()
+
+    def close(self):
+        # Releases the session. If we have not read the entire response, the connection is closed instead of being
+        # reused.
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._response.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+
 
 class EWSService(object):
     __metaclass__ = abc.ABCMeta
 
     SERVICE_NAME = None  # The name of the SOAP service
+    # True if the service doesn't change anything on the server, so it's safe to send the same request twice. Only
+    # read-only services are hedged, see Protocol.HEDGE_REQUESTS.
+    READ_ONLY = False
     element_container_name = None  # The name of the XML element wrapping the collection of returned items
     # Return exception instance instead of raising exceptions for the following errors when contained in an element
     ERRORS_TO_CATCH_IN_RESPONSE = (
@@ -67,14 +254,15 @@ class EWSService(object):
     # def get_payload(self, **kwargs):
     #     raise NotImplementedError()
 
-    def _get_elements(self, payload):
+    def _get_elements(self, payload, stream=False):
         assert isinstance(payload, ElementType)
         try:
             # Send the request, get the response and do basic sanity checking on the SOAP XML
-            response = self._get_response_xml(payload=payload)
+            response = self._get_response_xml(payload=payload, stream=stream)
             # Read the XML and throw any SOAP or general EWS error messages. Return a generator over the result elements
             return self._get_elements_in_response(response=response)
         except (
+                DeadlineExceeded,
                 ErrorAccessDenied,
                 ErrorADUnavailable,
                 ErrorBatchProcessingStopped,
@@ -100,9 +288,8 @@ class EWSService(object):
                 RateLimitError,
                 UnauthorizedError,
         ):
-            # These are known and understood, and don't require a backtrace
-            # TODO: ErrorTooManyObjectsOpened means there are too many connections to the database. We should be able to
-            # act on this by lowering the self.protocol connection pool size.
+            # These are known and understood, and don't require a backtrace. ErrorServerBusy and
+            # ErrorTooManyObjectsOpened have already lowered the session pool size of self.protocol.
             raise
         except Exception:
             # This may run from a thread pool, which obfuscates the stack trace. Print trace immediately.
@@ -111,14 +298,202 @@ class EWSService(object):
                         traceback.format_exc(20))
             raise
 
-    def _get_response_xml(self, payload):
-        # Takes an XML tree and returns SOAP payload as an XML tree
+    def _get_response_xml(self, payload, stream=False):
+        # Takes an XML tree and returns SOAP payload as a list of XML trees, or as a StreamingResponse if 'stream' is
+        # True
         assert isinstance(payload, ElementType)
+        account, hint, api_versions = self._get_api_versions()
+        api_version_iter = iter(api_versions)
+        api_version = next(api_version_iter)
+        t_start = time_func()
+        congestion_retries = 0
+        while True:
+            soap_payload = wrap(content=payload, version=api_version, account=account, stream=True)
+            r, response_time = self._send_request(soap_payload=soap_payload, stream=stream)
+            log.debug('Trying API version %s for account %s', api_version, account)
+            try:
+                res = self._get_response_payload(response=r, api_version=api_version, hint=hint)
+            except (ErrorInvalidSchemaVersionForMailboxVersion, ErrorInvalidServerVersion):
+                assert account  # This should never happen for non-account services
+                # The guessed server version is wrong for this account. Try the next version
+                log.debug('API version %s was invalid for account %s', api_version, account)
+                api_version = next(api_version_iter, None)
+                if api_version is None:
+                    break
+                continue
+            except CONGESTION_ERRORS as e:
+                self._handle_congestion(e)
+                retry_delay = self._get_congestion_retry_delay(e, attempt=congestion_retries,
+                                                               elapsed=time_func() - t_start)
+                if retry_delay is None:
+                    raise
+                delay, jitter = retry_delay
+                request_deadline = get_deadline()
+                if request_deadline is not None:
+                    request_deadline.check(wait=delay + jitter)
+                log.debug('Server busy. Retrying request after %s seconds', delay + jitter)
+                # Make all threads back off, not just this one. The jitter spreads out the retries of the threads when
+                # the gate opens.
+                self.protocol.backoff_gate.back_off(delay)
+                self.protocol.backoff_gate.wait()
+                time.sleep(jitter)
+                congestion_retries += 1
+                continue
+            self.protocol.session_pool_controller.on_success(latency=response_time)
+            return res
+        raise ErrorInvalidSchemaVersionForMailboxVersion('Tried versions %s but all were invalid for account %s' %
+                                                         (api_versions, account))
+
+    def _send_request(self, soap_payload, stream=False):
+        # Sends the request, respecting the rate limiter of the credentials. Returns the response and the response time.
+        # If 'stream' is True, the response is a StreamingResponse which releases the session when it is closed.
+        if self.READ_ONLY and not stream:
+            if self.protocol.COALESCE_REQUESTS:
+                # Identical read requests that are in flight at the same time share one response
+                return self.protocol.requests_in_flight.do(key=self._get_coalescing_key(soap_payload=soap_payload),
+                                                           func=partial(self._send_read_request, soap_payload))
+            return self._send_read_request(soap_payload=soap_payload)
+        if self.READ_ONLY:
+            return self._send_single_request(soap_payload=soap_payload, stream=stream)
+        try:
+            return self._send_single_request(soap_payload=soap_payload, stream=stream)
+        finally:
+            # Reads that start from now on must not share the response of a read that may have started before the write
+            self.protocol.on_write_done()
+
+    def _get_coalescing_key(self, soap_payload):
+        # Requests with the same key have the same response
+        return self.SERVICE_NAME, self.protocol.write_generation, soap_payload
+
+    def _send_read_request(self, soap_payload):
+        hedge_delay = self.protocol.get_hedge_delay(self.SERVICE_NAME)
+        if hedge_delay is not None:
+            return self._send_hedged_request(soap_payload=soap_payload, hedge_delay=hedge_delay)
+        return self._send_single_request(soap_payload=soap_payload)
+
+    def _send_hedged_request(self, soap_payload, hedge_delay):
+        # Sends the request, and sends it again on another session if we have no response after 'hedge_delay' seconds.
+        # Returns the first successful response. The slower request is left to finish in the background, which releases
+        # its session.
+        executor = self.protocol.get_hedging_executor()
+        request_deadline = get_deadline()
+        send = partial(call_with_deadline, request_deadline, self._send_single_request, soap_payload) \
+            if request_deadline is not None else partial(self._send_single_request, soap_payload)
+        first = executor.submit(send)
+        done, _ = wait([first], timeout=hedge_delay)
+        if done:
+            return first.result()
+        log.debug('No %s response after %s seconds. Sending hedged request', self.SERVICE_NAME, hedge_delay)
+        pending = {first, executor.submit(send)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    return f.result()
+                error = error or f.exception()
+        raise error
+
+    def _send_single_request(self, soap_payload, stream=False):
+        auth_type = self.protocol.auth_type
+        try:
+            return self._send_single_request_once(soap_payload=soap_payload, stream=stream)
+        except UnauthorizedError:
+            # The auth type may have come from the persistent settings cache and be outdated. Retry once if the
+            # protocol detected a different auth type.
+            if not self.protocol.refresh_cached_settings(failed_auth_type=auth_type):
+                raise
+        log.debug('Auth type changed from %s to %s. Retrying request', auth_type, self.protocol.auth_type)
+        return self._send_single_request_once(soap_payload=soap_payload, stream=stream)
+
+    def _send_single_request_once(self, soap_payload, stream=False):
+        rate_limiter = self.protocol.credentials.rate_limiter
+        if rate_limiter is not None:
+            request_deadline = get_deadline()
+            if not rate_limiter.acquire(timeout=None if request_deadline is None else request_deadline.remaining()):
+                raise DeadlineExceeded('Deadline of %s seconds exceeded' % request_deadline.seconds)
+        try:
+            if tracing.HOOKS:
+                trace = RequestTrace(service=self.SERVICE_NAME, protocol=self.protocol,
+                                     account=self.account if isinstance(self, EWSAccountService) else None)
+                t0 = time_func()
+                session = self.protocol.get_session()
+                trace.session_wait = time_func() - t0
+                tracing.call_hooks('on_session_wait', trace)
+            else:
+                trace = None
+                session = self.protocol.get_session()
+            headers, cookies = self._get_affinity()
+            t1 = time_func()
+            r, session = post_ratelimited(
+                protocol=self.protocol,
+                session=session,
+                url=self.protocol.service_endpoint,
+                headers=headers,
+                data=soap_payload,
+                timeout=self.protocol.TIMEOUT,
+                verify=self.protocol.verify_ssl,
+                allow_redirects=False,
+                stream=stream,
+                cookies=cookies,
+                trace=trace)
+            t2 = time_func()
+            if self.READ_ONLY and not stream:
+                self.protocol.get_latency_tracker(self.SERVICE_NAME).add(t2 - t1)
+            self._update_affinity(cookies=r.cookies)
+            # The backend cookie is specific to an account, but sessions are shared between accounts
+            remove_cookie_by_name(session.cookies, BACKEND_OVERRIDE_COOKIE)
+            if stream:
+                r = StreamingResponse(response=r, service_name=self.SERVICE_NAME,
+                                      container_name=self.element_container_name,
+                                      on_close=partial(self.protocol.release_session, session))
+            else:
+                self.protocol.release_session(session)
+        finally:
+            if rate_limiter is not None:
+                rate_limiter.release()
+        return r, t2 - t1
+
+    def _get_affinity(self):
+        # Returns the HTTP headers and cookies that route the request to a specific backend server, if any
+        return None, None
+
+    def _update_affinity(self, cookies):
+        # Remembers the backend server that the server wants us to use, if any
+        pass
+
+    def _handle_congestion(self, e):
+        # The server is overloaded. Lower the number of concurrent requests, and make all threads pause if the server
+        # told us how long to back off.
+        self.protocol.session_pool_controller.on_congestion()
+        if isinstance(e, ErrorServerBusy) and e.back_off:
+            self.protocol.backoff_gate.back_off(e.back_off)
+
+    def _get_congestion_retry_delay(self, e, attempt, elapsed):
+        # Returns a (delay, jitter) tuple if we should retry after a congestion error, otherwise None. We only retry if
+        # we know how long the server wants us to back off, and never earlier than that. 'attempt' is the number of
+        # retries so far and 'elapsed' is the number of seconds since the first attempt. Raises RateLimitError if the
+        # retry policy has run out of attempts or time.
+        if not isinstance(e, ErrorServerBusy) or not e.back_off:
+            return None
+        retry_policy = self.protocol.credentials.retry_policy
+        if retry_policy is None:
+            return None
+        retry_delay = retry_policy.get_delay(error_class=RetryPolicy.SERVER_BUSY, attempt=attempt, elapsed=elapsed)
+        if retry_delay is None:
+            return None
+        delay, jitter = retry_delay
+        delay = max(delay, e.back_off)
+        if retry_policy.deadline is not None and elapsed + delay > retry_policy.deadline:
+            raise RateLimitError('Max timeout reached (%s)' % RetryPolicy.SERVER_BUSY)
+        return delay, jitter
+
+    def _get_api_versions(self):
         # Microsoft really doesn't want to make our lives easy. The server may report one version in our initial version
         # guessing tango, but then the server may decide that any arbitrary legacy backend server may actually process
         # the request for an account. Prepare to handle ErrorInvalidSchemaVersionForMailboxVersion errors and set the
-        # server version per-account.
-        from .version import API_VERSIONS, Version
+        # server version per-account. Returns the account, the version hint and the API versions to try, in order.
+        from .version import API_VERSIONS
         if isinstance(self, EWSAccountService):
             account = self.account
             hint = self.account.version
@@ -126,46 +501,42 @@ class EWSService(object):
             account = None
             hint = self.protocol.version
         api_versions = [hint.api_version] + [v for v in API_VERSIONS if v != hint.api_version]
-        for api_version in api_versions:
-            session = self.protocol.get_session()
-            soap_payload = wrap(content=payload, version=api_version, account=account)
-            r, session = post_ratelimited(
-                protocol=self.protocol,
-                session=session,
-                url=self.protocol.service_endpoint,
-                headers=None,
-                data=soap_payload,
-                timeout=self.protocol.TIMEOUT,
-                verify=self.protocol.verify_ssl,
-                allow_redirects=False)
-            self.protocol.release_session(session)
-            log.debug('Trying API version %s for account %s', api_version, account)
+        return account, hint, api_versions
+
+    def _get_response_payload(self, response, api_version, hint):
+        # Parses the HTTP response and returns the SOAP payload. Raises ErrorInvalidSchemaVersionForMailboxVersion or
+        # ErrorInvalidServerVersion if the caller should try the next API version. 'response' only needs to have a
+        # 'text' attribute, so this also works with responses from the asyncio transport.
+        from .version import Version
+        if isinstance(response, StreamingResponse):
+            try:
+                res = self._get_streaming_soap_payload(response=response)
+            except Exception:
+                response.close()
+                raise
+        else:
             try:
-                soap_response_payload = to_xml(r.text)
+                soap_response_payload = to_xml(response.text)
             except ParseError as e:
                 raise SOAPError('Bad SOAP response: %s' % e)
-            try:
-                res = self._get_soap_payload(soap_response=soap_response_payload)
-            except (ErrorInvalidSchemaVersionForMailboxVersion, ErrorInvalidServerVersion):
-                assert account  # This should never happen for non-account services
-                # The guessed server version is wrong for this account. Try the next version
-                log.debug('API version %s was invalid for account %s', api_version, account)
-                continue
-            if api_version != hint.api_version or hint.build is None:
-                # The api_version that worked was different than our hint, or we never got a build version. Set new
-                # version for account.
-                if api_version != hint.api_version:
-                    log.debug('New API version for account %s (%s -> %s)', account, hint.api_version, api_version)
-                else:
-                    log.debug('Adding missing build number for account %s', account)
-                new_version = Version.from_response(requested_api_version=api_version, response=r.text)
-                if isinstance(self, EWSAccountService):
-                    self.account.version = new_version
-                else:
-                    self.protocol.version = new_version
-            return res
-        raise ErrorInvalidSchemaVersionForMailboxVersion('Tried versions %s but all were invalid for account %s' %
-                                                         (api_versions, account))
+            res = self._get_soap_payload(soap_response=soap_response_payload)
+        if api_version != hint.api_version or hint.build is None:
+            # The api_version that worked was different than our hint, or we never got a build version. Set new
+            # version for account.
+            account = self.account if isinstance(self, EWSAccountService) else None
+            if api_version != hint.api_version:
+                log.debug('New API version for account %s (%s -> %s)', account, hint.api_version, api_version)
+            else:
+                log.debug('Adding missing build number for account %s', account)
+            if isinstance(response, StreamingResponse):
+                new_version = Version.from_soap_header(requested_api_version=api_version, header=response.header)
+            else:
+                new_version = Version.from_response(requested_api_version=api_version, response=response.text)
+            if isinstance(self, EWSAccountService):
+                self.account.version = new_version
+            else:
+                self.protocol.version = new_version
+        return res
 
     @classmethod
     def _get_soap_payload(cls, soap_response):
@@ -186,6 +557,17 @@ class EWSService(object):
             return [response]
         return response_messages.findall('{%s}%sResponseMessage' % (MNS, cls.SERVICE_NAME))
 
+    @classmethod
+    def _get_streaming_soap_payload(cls, response):
+        # The streaming version of _get_soap_payload(). Returns the response, which is an iterable of ResponseMessage
+        # elements.
+        elem = response.read_body()
+        if elem.tag == '{%s}Fault' % SOAPNS:
+            cls._raise_soap_errors(fault=elem)  # Will throw SOAPError or custom EWS error
+        if elem.tag != '{%s}%sResponse' % (MNS, cls.SERVICE_NAME):
+            raise SOAPError('Unknown SOAP response: %s' % elem.tag)
+        return response
+
     @classmethod
     def _raise_soap_errors(cls, fault):
         assert isinstance(fault, ElementType)
@@ -200,6 +582,8 @@ class EWSService(object):
                 code = get_xml_attr(detail, '{%s}ResponseCode' % ENS)
             if detail.find('{%s}Message' % ENS) is not None:
                 msg = get_xml_attr(detail, '{%s}Message' % ENS)
+            if code == 'ErrorServerBusy':
+                raise ErrorServerBusy(msg, back_off=cls._get_back_off(detail.find('{%s}MessageXml' % TNS)))
             try:
                 raise vars(errors)[code](msg)
             except KeyError:
@@ -239,12 +623,17 @@ class EWSService(object):
             return self._raise_errors(code=response_code, text=msg_text, msg_xml=msg_xml)
         except self.ERRORS_TO_CATCH_IN_RESPONSE as e:
             return e
+        except CONGESTION_ERRORS as e:
+            self._handle_congestion(e)
+            raise
 
     @classmethod
     def _raise_errors(cls, code, text, msg_xml):
         if not code:
             raise TransportError('Empty ResponseCode in ResponseMessage (MessageText: %s, MessageXml: %s)' % (
                 text, msg_xml))
+        if code == 'ErrorServerBusy':
+            raise ErrorServerBusy(text, back_off=cls._get_back_off(msg_xml))
         if msg_xml is not None:
             # If this is an ErrorInvalidPropertyRequest error, the xml may contain a specific FieldURI
             for tag_name in ('FieldURI', 'IndexedFieldURI', 'ExtendedFieldURI'):
@@ -259,16 +648,44 @@ class EWSService(object):
             raise TransportError('Unknown ResponseCode in ResponseMessage: %s (MessageText: %s, MessageXml: %s)' % (
                     code, text, msg_xml))
 
+    @staticmethod
+    def _get_back_off(msg_xml):
+        # ErrorServerBusy may contain the number of milliseconds the server wants us to wait before sending more
+        # requests. Returns the value in seconds, or None.
+        if msg_xml is None:
+            return None
+        for value in msg_xml.findall('{%s}Value' % TNS):
+            if value.get('Name') == 'BackOffMilliseconds':
+                try:
+                    return int(value.text) / 1000.0
+                except (TypeError, ValueError):
+                    return None
+        return None
+
     def _get_elements_in_response(self, response):
-        assert isinstance(response, list)
-        for msg in response:
-            assert isinstance(msg, ElementType)
-            container_or_exc = self._get_element_container(message=msg, name=self.element_container_name)
-            if isinstance(container_or_exc, ElementType):
-                for c in self._get_elements_in_container(container=container_or_exc):
-                    yield c
-            else:
-                yield container_or_exc
+        assert isinstance(response, (list, StreamingResponse))
+        try:
+            for msg in response:
+                assert isinstance(msg, ElementType)
+                container_or_exc = self._get_element_container(message=msg, name=self.element_container_name)
+                if isinstance(container_or_exc, ElementType):
+                    for c in self._iter_elements_in_container(response=response, container=container_or_exc):
+                        yield c
+                else:
+                    yield container_or_exc
+        finally:
+            if isinstance(response, StreamingResponse):
+                response.close()
+
+    def _iter_elements_in_container(self, response, container):
+        # Streamed containers are still being parsed. Yield elements as soon as they have been parsed, unless the
+        # service needs to see the whole container.
+        if isinstance(response, StreamingResponse):
+            if get_unbound_function(type(self)._get_elements_in_container) \
+                    is get_unbound_function(EWSService._get_elements_in_container):
+                return response.iter_children(container)
+            response.complete(container)
+        return self._get_elements_in_container(container=container)
 
     def _get_elements_in_container(self, container):
         return [elem for elem in container]
@@ -280,6 +697,46 @@ class EWSAccountService(EWSService):
         self.account = account
         super(EWSAccountService, self).__init__(protocol=account.protocol)
 
+    def _get_affinity(self):
+        return get_affinity_headers(account=self.account)
+
+    def _get_coalescing_key(self, soap_payload):
+        # The payload doesn't always identify the mailbox, e.g. with delegate access
+        return self.SERVICE_NAME, self.account.primary_smtp_address, self.account.access_type, soap_payload
+
+    def _update_affinity(self, cookies):
+        affinity_cookie = cookies.get(BACKEND_OVERRIDE_COOKIE)
+        if affinity_cookie and affinity_cookie != self.account.affinity_cookie:
+            log.debug('Account %s: Got new backend cookie', self.account)
+            self.account.affinity_cookie = affinity_cookie
+
+    def _additional_properties_elem(self, additional_fields):
+        # Returns a t:AdditionalProperties element for the field paths. The element is shared between requests.
+        additional_fields = tuple(additional_fields)
+        version = self.account.version
+        build = version.build
+        if build is None:
+            # We haven't talked to the server yet, and the user didn't give us a build number
+            version_key = version.api_version
+        else:
+            version_key = build.major_version, build.minor_version, build.major_build, build.minor_build
+        key = frozenset(_field_path_cache_key(f) for f in additional_fields), version_key
+        try:
+            return _additional_properties_cache[key]
+        except KeyError:
+            pass
+        additional_properties = create_element('t:AdditionalProperties')
+        expanded_fields = chain(*(f.expand(version=version) for f in additional_fields))
+        set_xml_value(additional_properties, expanded_fields, version)
+        # Replace the children with their serialized XML, so the element is never modified after it is cached
+        raw_xml = RawXml.from_children(additional_properties)
+        additional_properties.clear()
+        additional_properties.text = raw_xml
+        if len(_additional_properties_cache) >= ADDITIONAL_PROPERTIES_CACHE_SIZE:
+            _additional_properties_cache.clear()
+        _additional_properties_cache[key] = additional_properties
+        return additional_properties
+
     def _folder_elem(self, folder):
         from .account import DELEGATE
         from .properties import Mailbox
@@ -309,19 +766,23 @@ class PagingEWSMixIn(EWSService):
             log.debug('%s: Getting items at offset %s', log_prefix, next_offset)
             kwargs['offset'] = next_offset
             payload = payload_func(**kwargs)
-            response = self._get_response_xml(payload=payload)
-            rootfolder, next_offset = self._get_page(response)
-            if isinstance(rootfolder, ElementType):
-                container = rootfolder.find(self.element_container_name)
-                if container is None:
-                    raise TransportError('No %s elements in ResponseMessage (%s)' % (self.element_container_name,
-                                                                                     xml_to_str(rootfolder)))
-                for elem in self._get_elements_in_container(container=container):
-                    item_count += 1
-                    yield elem
-                if max_items and item_count >= max_items:
-                    log.debug("'max_items' count reached")
-                    break
+            response = self._get_response_xml(payload=payload, stream=self.protocol.STREAM_RESPONSES)
+            try:
+                rootfolder, next_offset = self._get_page(response)
+                if isinstance(rootfolder, ElementType):
+                    container = self._get_page_container(rootfolder)
+                    for elem in self._iter_elements_in_container(response=response, container=container):
+                        item_count += 1
+                        yield elem
+                    if max_items and item_count >= max_items:
+                        log.debug("'max_items' count reached")
+                        break
+                if isinstance(response, StreamingResponse):
+                    # Read the rest of the response, so the connection can be reused
+                    response.finish()
+            finally:
+                if isinstance(response, StreamingResponse):
+                    response.close()
             if not next_offset:
                 break
             if next_offset != item_count:
@@ -329,8 +790,12 @@ class PagingEWSMixIn(EWSService):
                 raise TransportError('Unexpected next offset: %s -> %s' % (item_count, next_offset))
 
     def _get_page(self, response):
-        assert len(response) == 1
-        rootfolder = self._get_element_container(message=response[0], name='{%s}RootFolder' % MNS)
+        if isinstance(response, StreamingResponse):
+            message = next(iter(response))
+        else:
+            assert len(response) == 1
+            message = response[0]
+        rootfolder = self._get_element_container(message=message, name='{%s}RootFolder' % MNS)
         is_last_page = rootfolder.get('IncludesLastItemInRange').lower() in ('true', '0')
         offset = rootfolder.get('IndexedPagingOffset')
         if offset is None and not is_last_page:
@@ -344,12 +809,20 @@ class PagingEWSMixIn(EWSService):
         log.debug('%s: Got page with next offset %s (last_page %s)', self.SERVICE_NAME, next_offset, is_last_page)
         return rootfolder, next_offset
 
+    def _get_page_container(self, rootfolder):
+        container = rootfolder.find(self.element_container_name)
+        if container is None:
+            raise TransportError('No %s elements in ResponseMessage (%s)' % (self.element_container_name,
+                                                                             xml_to_str(rootfolder)))
+        return container
+
 
 class GetServerTimeZones(EWSService):
     """
     MSDN: https://msdn.microsoft.com/en-us/library/office/dd899371(v=exchg.150).aspx
     """
     SERVICE_NAME = 'GetServerTimeZones'
+    READ_ONLY = True
     element_container_name = '{%s}TimeZoneDefinitions' % MNS
 
     def call(self, returnfulltimezonedata=False):
@@ -377,6 +850,7 @@ class GetRoomLists(EWSService):
     MSDN: https://msdn.microsoft.com/en-us/library/office/dd899486(v=exchg.150).aspx
     """
     SERVICE_NAME = 'GetRoomLists'
+    READ_ONLY = True
     element_container_name = '{%s}RoomLists' % MNS
 
     def call(self):
@@ -395,6 +869,7 @@ class GetRooms(EWSService):
     MSDN: https://msdn.microsoft.com/en-us/library/office/dd899454(v=exchg.150).aspx
     """
     SERVICE_NAME = 'GetRooms'
+    READ_ONLY = True
     element_container_name = '{%s}Rooms' % MNS
 
     def call(self, roomlist):
@@ -418,24 +893,31 @@ class EWSPooledMixIn(EWSService):
         # Chop items list into suitable pieces and let worker threads chew on the work. The order of the output result
         # list must be the same as the input id list, so the caller knows which status message belongs to which ID.
         # Yield results as they become available.
+        if self.protocol.STREAM_RESPONSES:
+            # A streamed response holds its session until we have read it. Worker threads could take all sessions while
+            # we wait for the first result, so we request one chunk at a time instead.
+            for chunk in chunkify(items, self.CHUNKSIZE):
+                for elem in self._get_elements(payload=payload_func(chunk, **kwargs), stream=True):
+                    yield elem
+            return
         results = []
         n = 1
         for chunk in chunkify(items, self.CHUNKSIZE):
             log.debug('Starting %s._get_elements worker %s for %s items', self.__class__.__name__, n, len(chunk))
             n += 1
-            results.append(self.protocol.thread_pool.apply_async(
+            results.append(self.protocol.thread_pool.submit(
                 lambda c: self._get_elements(payload=payload_func(c, **kwargs)),
-                (chunk,)
+                chunk
             ))
             # Results will be available before iteration has finished if 'items' is a slow generator. Return early
             for i, r in enumerate(results, 1):
                 if r is None:
                     continue
-                if not r.ready():
+                if not r.done():
                     # First non-yielded result isn't ready yet. Yielding other ready results would mess up ordering
                     break
                 log.debug('%s._get_elements result %s is ready early', self.__class__.__name__, i)
-                for elem in r.get():
+                for elem in r.result():
                     yield elem
                 results[i-1] = None
         # Yield remaining results in order, as they become available
@@ -444,7 +926,7 @@ class EWSPooledMixIn(EWSService):
                 log.debug('%s._get_elements result %s of %s already sent', self.__class__.__name__, i, len(results))
                 continue
             log.debug('Waiting for %s._get_elements result %s of %s', self.__class__.__name__, i, len(results))
-            elems = r.get()
+            elems = r.result()
             log.debug('%s._get_elements result %s of %s is ready', self.__class__.__name__, i, len(results))
             for elem in elems:
                 yield elem
@@ -456,6 +938,7 @@ class GetItem(EWSAccountService, EWSPooledMixIn):
     """
     CHUNKSIZE = 100
     SERVICE_NAME = 'GetItem'
+    READ_ONLY = True
     element_container_name = '{%s}Items' % MNS
 
     def call(self, items, additional_fields):
@@ -478,10 +961,7 @@ class GetItem(EWSAccountService, EWSPooledMixIn):
         itemshape = create_element('m:ItemShape')
         add_xml_child(itemshape, 't:BaseShape', IdOnly)
         if additional_fields:
-            additional_properties = create_element('t:AdditionalProperties')
-            expanded_fields = chain(*(f.expand(version=self.account.version) for f in additional_fields))
-            set_xml_value(additional_properties, expanded_fields, self.account.version)
-            itemshape.append(additional_properties)
+            itemshape.append(self._additional_properties_elem(additional_fields))
         getitem.append(itemshape)
         item_ids = create_element('m:ItemIds')
         is_empty = True
@@ -756,6 +1236,7 @@ class FindItem(EWSFolderService, PagingEWSMixIn):
     MSDN: https://msdn.microsoft.com/en-us/library/office/aa566370(v=exchg.150).aspx
     """
     SERVICE_NAME = 'FindItem'
+    READ_ONLY = True
     element_container_name = '{%s}Items' % TNS
     CHUNKSIZE = 100
 
@@ -792,10 +1273,7 @@ class FindItem(EWSFolderService, PagingEWSMixIn):
         itemshape = create_element('m:ItemShape')
         add_xml_child(itemshape, 't:BaseShape', shape)
         if additional_fields:
-            additional_properties = create_element('t:AdditionalProperties')
-            expanded_fields = chain(*(f.expand(version=self.account.version) for f in additional_fields))
-            set_xml_value(additional_properties, expanded_fields, self.account.version)
-            itemshape.append(additional_properties)
+            itemshape.append(self._additional_properties_elem(additional_fields))
         finditem.append(itemshape)
         if calendar_view is None:
             view_type = create_element('m:IndexedPageItemView',
@@ -824,6 +1302,7 @@ class FindFolder(EWSFolderService, PagingEWSMixIn):
     MSDN: https://msdn.microsoft.com/en-us/library/office/aa564962(v=exchg.150).aspx
     """
     SERVICE_NAME = 'FindFolder'
+    READ_ONLY = True
     element_container_name = '{%s}Folders' % TNS
 
     def call(self, additional_fields, shape, depth, page_size, max_items):
@@ -848,10 +1327,7 @@ class FindFolder(EWSFolderService, PagingEWSMixIn):
         foldershape = create_element('m:FolderShape')
         add_xml_child(foldershape, 't:BaseShape', shape)
         if additional_fields:
-            additional_properties = create_element('t:AdditionalProperties')
-            expanded_fields = chain(*(f.expand(version=self.account.version) for f in additional_fields))
-            set_xml_value(additional_properties, expanded_fields, self.account.version)
-            foldershape.append(additional_properties)
+            foldershape.append(self._additional_properties_elem(additional_fields))
         findfolder.append(foldershape)
         if self.account.version.build >= EXCHANGE_2010:
             indexedpageviewitem = create_element('m:IndexedPageFolderView', MaxEntriesReturned=text_type(page_size),
@@ -870,6 +1346,7 @@ class GetFolder(EWSAccountService):
     MSDN: https://msdn.microsoft.com/en-us/library/office/aa580263(v=exchg.150).aspx
     """
     SERVICE_NAME = 'GetFolder'
+    READ_ONLY = True
     element_container_name = '{%s}Folders' % MNS
 
     def call(self, folders, additional_fields, shape):
@@ -893,10 +1370,7 @@ class GetFolder(EWSAccountService):
         foldershape = create_element('m:FolderShape')
         add_xml_child(foldershape, 't:BaseShape', shape)
         if additional_fields:
-            additional_properties = create_element('t:AdditionalProperties')
-            expanded_fields = chain(*(f.expand(version=self.account.version) for f in additional_fields))
-            set_xml_value(additional_properties, expanded_fields, self.account.version)
-            foldershape.append(additional_properties)
+            foldershape.append(self._additional_properties_elem(additional_fields))
         getfolder.append(foldershape)
         folder_ids = create_element('m:FolderIds')
         is_empty = True
@@ -982,6 +1456,7 @@ class ResolveNames(EWSService):
     MSDN: https://msdn.microsoft.com/en-us/library/office/aa565329(v=exchg.150).aspx
     """
     SERVICE_NAME = 'ResolveNames'
+    READ_ONLY = True
     element_container_name = '{%s}ResolutionSet' % MNS
 
     def call(self, unresolved_entries, return_full_contact_data=False):
@@ -1008,6 +1483,7 @@ class GetAttachment(EWSAccountService):
     MSDN: https://msdn.microsoft.com/en-us/library/office/aa494316(v=exchg.150).aspx
     """
     SERVICE_NAME = 'GetAttachment'
+    READ_ONLY = True
     element_container_name = '{%s}Attachments' % MNS
 
     def call(self, items, include_mime_content):
@@ -1109,6 +1585,7 @@ class ExportItems(EWSAccountService, EWSPooledMixIn):
     ERRORS_TO_CATCH_IN_RESPONSE = ResponseMessageError
     CHUNKSIZE = 100
     SERVICE_NAME = 'ExportItems'
+    READ_ONLY = True
     element_container_name = "{%s}Data" % MNS
 
     def call(self, items):
@@ -1165,7 +1642,13 @@ class UploadItems(EWSAccountService, EWSPooledMixIn):
             parentfolderid.attrib['Id'] = parent_folder.folder_id
             parentfolderid.attrib['ChangeKey'] = parent_folder.changekey
             item.append(parentfolderid)
-            add_xml_child(item, 't:Data', data_str)
+            if len(data_str) >= StreamedContent.MIN_SIZE:
+                # Write large items in chunks while the request is being sent
+                data = create_element('t:Data')
+                data.text = StreamedContent(data_str)
+                item.append(data)
+            else:
+                add_xml_child(item, 't:Data', data_str)
             itemselement.append(item)
         return uploaditems
 
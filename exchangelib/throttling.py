@@ -0,0 +1,425 @@
+# coding=utf-8
+"""
+Client-side mechanisms that help us behave nicely towards Exchange servers that are under load or apply throttling
+policies to the connecting user.
+"""
+from __future__ import unicode_literals
+
+from collections import deque
+from contextlib import contextmanager
+import logging
+import random
+from threading import Condition, Lock
+import time
+
+from .errors import RateLimitError
+from .util import time_func
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+class AIMDController(object):
+    """
+    Adjusts the number of concurrent requests we send to a server, using AIMD (additive increase, multiplicative
+    decrease) like TCP congestion control does.
+
+    The window grows by 1 for every 'window' successful requests that had a stable response time, i.e. not much slower
+    than the running average. The window shrinks by 'decrease_factor' when the server signals that it is overloaded.
+    Overload signals are only acted upon once per average round-trip, since all requests that are in flight when the
+    server gets overloaded will likely fail.
+
+    The window and the limits may be inspected and changed at runtime.
+    """
+    # Weight of the newest response time in the running average
+    LATENCY_WEIGHT = 0.1
+    # The minimum number of seconds between two decreases of the window, if we don't know the average response time yet
+    MIN_DECREASE_INTERVAL = 1
+
+    def __init__(self, window, min_window, max_window, decrease_factor=0.5, latency_tolerance=1.5):
+        assert 1 <= min_window <= window <= max_window
+        assert 0 < decrease_factor < 1
+        self.window = window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.decrease_factor = decrease_factor
+        # A response time is stable if it is at most 'latency_tolerance' times the average response time
+        self.latency_tolerance = latency_tolerance
+        self.avg_latency = None
+        self._successes = 0
+        self._last_decrease = None
+        self._lock = Lock()
+
+    def on_success(self, latency):
+        with self._lock:
+            if self.avg_latency is None:
+                self.avg_latency = latency
+            is_stable = latency <= self.latency_tolerance * self.avg_latency
+            self.avg_latency += self.LATENCY_WEIGHT * (latency - self.avg_latency)
+            if not is_stable:
+                self._successes = 0
+                return
+            self._successes += 1
+            if self._successes >= self.window:
+                self._successes = 0
+                if self.window < self.max_window:
+                    self.window += 1
+                    log.debug('Increased window to %s', self.window)
+
+    def on_congestion(self):
+        with self._lock:
+            now = time_func()
+            interval = self.MIN_DECREASE_INTERVAL if self.avg_latency is None else self.avg_latency
+            if self._last_decrease is not None and now - self._last_decrease < interval:
+                # We already reacted to this episode of congestion
+                return
+            self._last_decrease = now
+            self._successes = 0
+            self.window = max(self.min_window, int(self.window * self.decrease_factor))
+            log.debug('Decreased window to %s', self.window)
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.window, self.min_window, self.max_window))
+
+
+class BackoffGate(object):
+    """
+    A gate that is closed while the server has asked us to back off. Requests to the server wait for the gate to open
+    before they are sent, so a throttling response pauses all threads instead of just the thread that received it.
+    """
+    def __init__(self):
+        self._open_at = None
+        self._lock = Lock()
+
+    def back_off(self, seconds):
+        # Close the gate for 'seconds'. The gate is never opened earlier than already decided.
+        with self._lock:
+            open_at = time_func() + seconds
+            if self._open_at is None or open_at > self._open_at:
+                log.info('Backing off for %s seconds', seconds)
+                self._open_at = open_at
+
+    def remaining(self):
+        # Returns the number of seconds until the gate opens
+        if self._open_at is None:
+            return 0
+        return max(0, self._open_at - time_func())
+
+    def wait(self):
+        # Block until the gate is open. The gate may be closed again while we are waiting.
+        while True:
+            remaining = self.remaining()
+            if not remaining:
+                return
+            log.debug('Waiting %s seconds for back off to expire', remaining)
+            time.sleep(remaining)
+
+
+class LatencyTracker(object):
+    """
+    Keeps the 'size' most recent response times, so we can tell if a request is unusually slow. Percentiles are only
+    available when we have at least MIN_SAMPLES response times.
+    """
+    MIN_SAMPLES = 20
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = Lock()
+
+    def add(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percent):
+        # Returns the response time that 'percent' percent of the recent response times are at or below, or None
+        with self._lock:
+            if len(self._samples) < self.MIN_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100.0))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class RetryRule(object):
+    """
+    How to retry one class of errors. The delay before retry number N (starting at 0) is
+    initial_delay * multiplier ** N, capped at max_delay. A random delay of up to 'jitter' times the delay is added, so
+    threads that failed at the same time don't retry at the same time.
+
+    :param initial_delay: the delay before the first retry, in seconds
+    :param multiplier: the factor the delay grows by on every retry
+    :param max_delay: the max delay between retries, in seconds, or None for no limit
+    :param jitter: the max random delay to add, as a fraction of the delay
+    :param max_attempts: the max number of retries, or None for no limit
+    """
+    def __init__(self, initial_delay, multiplier=2, max_delay=None, jitter=0.0, max_attempts=None):
+        assert initial_delay >= 0
+        assert multiplier >= 1
+        assert jitter >= 0
+        self.initial_delay = initial_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+
+    def get_delay(self, attempt):
+        # Returns the delay before retry number 'attempt', without jitter
+        delay = self.initial_delay * self.multiplier ** attempt
+        if self.max_delay is not None:
+            delay = min(delay, self.max_delay)
+        return delay
+
+    def get_jitter(self, delay):
+        return random.uniform(0, self.jitter * delay) if self.jitter else 0
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.initial_delay, self.multiplier, self.max_delay, self.jitter,
+                                               self.max_attempts))
+
+
+class RetryPolicy(object):
+    """
+    Decides if and when a failed request is retried. Errors are divided into classes, and each class has its own
+    RetryRule. Classes that are mapped to None in 'rules' are never retried. When we give up, RateLimitError is raised.
+
+    Attach a retry policy to a Credentials object, or pass it to Configuration. Credentials without a retry policy fail
+    on the first error. ServiceAccount credentials get a default policy that retries for up to 'max_wait' seconds.
+
+    :param rules: a dict of error class -> RetryRule or None, overriding DEFAULT_RULES
+    :param default_rule: the rule for error classes that are not in 'rules' or DEFAULT_RULES
+    :param deadline: the max number of seconds from the first attempt until the last retry, or None for no limit
+    """
+    CONNECTION_ERROR = 'connection_error'  # The connection was reset or timed out
+    UNAUTHORIZED = 'unauthorized'  # HTTP 401. This may be a stale session, or a server that is rate-limiting us
+    SERVER_BUSY = 'server_busy'  # HTTP 503
+    ERROR_PAGE = 'error_page'  # Redirect to the generic error page of the server
+    ERROR_CLASSES = (CONNECTION_ERROR, UNAUTHORIZED, SERVER_BUSY, ERROR_PAGE)
+
+    # A connection reset is usually transient and can be retried immediately. The other errors indicate that the server
+    # is in trouble, so we give it some time.
+    DEFAULT_RULES = {
+        CONNECTION_ERROR: RetryRule(initial_delay=0.1, multiplier=4, max_delay=300, jitter=0.5),
+    }
+    DEFAULT_RULE = RetryRule(initial_delay=10, multiplier=2, jitter=0.2)
+
+    def __init__(self, rules=None, default_rule=None, deadline=3600):
+        for error_class in rules or {}:
+            assert error_class in self.ERROR_CLASSES, 'Unknown error class %s' % error_class
+        self.rules = dict(self.DEFAULT_RULES)
+        self.rules.update(rules or {})
+        self.default_rule = default_rule or self.DEFAULT_RULE
+        self.deadline = deadline
+
+    def get_rule(self, error_class):
+        return self.rules.get(error_class, self.default_rule)
+
+    def get_delay(self, error_class, attempt, elapsed):
+        """
+        Returns a (delay, jitter) tuple for retry number 'attempt' of an error of class 'error_class', or None if the
+        error should not be retried. 'elapsed' is the number of seconds since the first attempt. Raises RateLimitError
+        if we have retried too many times or for too long.
+        """
+        rule = self.get_rule(error_class)
+        if rule is None:
+            return None
+        if rule.max_attempts is not None and attempt >= rule.max_attempts:
+            raise RateLimitError('Max retries reached (%s)' % error_class)
+        delay = rule.get_delay(attempt)
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            raise RateLimitError('Max timeout reached (%s)' % error_class)
+        return delay, rule.get_jitter(delay)
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.rules, self.default_rule, self.deadline))
+
+
+class RateLimiter(object):
+    """
+    A client-side rate limiter. Limits the number of requests per second using a token bucket, and the number of
+    concurrent requests. Exchange throttling budgets are per user, so a rate limiter is attached to a Credentials object
+    and shared by all requests using those credentials. Staying under the budget gives higher throughput than running
+    into the server-side throttling.
+
+    :param requests_per_second: the sustained number of requests per second, or None for no limit
+    :param max_concurrent: the max number of requests in flight, or None for no limit
+    :param burst: the max number of requests that may be sent at once after a quiet period. Defaults to
+                  requests_per_second, but at least 1
+    """
+    # Seconds between checks for a free concurrency slot, when using try_acquire()
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, requests_per_second=None, max_concurrent=None, burst=None):
+        assert requests_per_second is None or requests_per_second > 0
+        assert max_concurrent is None or max_concurrent >= 1
+        self.requests_per_second = requests_per_second
+        self.max_concurrent = max_concurrent
+        self.burst = burst or max(1, requests_per_second or 1)
+        self.in_flight = 0
+        self._tokens = self.burst
+        self._last_refill = time_func()
+        self._cond = Condition()
+
+    def _try_acquire(self):
+        # Must be called while holding the lock. Returns 0 if a request may be sent, the number of seconds until a
+        # token is available, or None if we must wait for a concurrent request to finish.
+        if self.max_concurrent is not None and self.in_flight >= self.max_concurrent:
+            return None
+        if self.requests_per_second is not None:
+            delay = self._take_token()
+            if delay:
+                return delay
+        self.in_flight += 1
+        return 0
+
+    def _take_token(self):
+        # Takes a token from the bucket. Returns 0 on success, otherwise the number of seconds until a token is
+        # available
+        now = time_func()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.requests_per_second)
+        self._last_refill = now
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.requests_per_second
+        self._tokens -= 1
+        return 0
+
+    def acquire(self, timeout=None):
+        # Block until we may send a request, or for at most 'timeout' seconds. Returns False if we timed out.
+        end = None if timeout is None else time_func() + timeout
+        with self._cond:
+            while True:
+                delay = self._try_acquire()
+                if delay == 0:
+                    return True
+                if end is not None:
+                    remaining = end - time_func()
+                    if remaining <= 0:
+                        return False
+                    delay = remaining if delay is None else min(delay, remaining)
+                log.debug('Rate limit reached. Waiting %s seconds', delay)
+                self._cond.wait(timeout=delay)
+
+    def try_acquire(self):
+        # Non-blocking version of acquire(). Returns 0 if we may send a request, otherwise the number of seconds to wait
+        # before trying again.
+        with self._cond:
+            delay = self._try_acquire()
+        return self.POLL_INTERVAL if delay is None else delay
+
+    def release(self):
+        # Must be called when a request acquired with acquire() or try_acquire() has finished
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.release()
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.requests_per_second, self.max_concurrent, self.burst))
+
+
+class SharedStateFile(object):
+    """
+    A small file containing a fixed number of floats, used to share throttling state between processes on the same
+    host. Access is serialized with an exclusive lock on the file. Each access opens the file, so locks also work
+    between threads in the same process.
+
+    Requires the 'fcntl' module, which is not available on Windows.
+    """
+    def __init__(self, path, defaults):
+        if fcntl is None:
+            raise ValueError('Sharing throttling state between processes is not supported on this platform')
+        self.path = path
+        self.defaults = tuple(defaults)
+
+    @contextmanager
+    def locked(self):
+        # Yields the current state as a list of floats. Changes to the list are written back to the file.
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    values = [float(v) for v in f.read().split()]
+                except ValueError:
+                    values = []
+                if len(values) != len(self.defaults):
+                    # The file is new or garbled
+                    values = list(self.defaults)
+                state = list(values)
+                yield state
+                if state != values:
+                    # The file was opened in append mode, so we write from the start after truncating
+                    f.truncate(0)
+                    f.write(' '.join('%r' % float(v) for v in state))
+                    f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.path, self.defaults))
+
+
+class SharedBackoffGate(BackoffGate):
+    """
+    A BackoffGate that is shared by all processes using the same state file. Exchange throttles a user across all
+    connections, so when one process is asked to back off, all processes using the same account should pause.
+
+    Install it on a protocol with Configuration(backoff_gate=SharedBackoffGate(path)), or by setting the 'backoff_gate'
+    attribute of an existing protocol. Times are stored as wall clock time, so all processes must share the same clock.
+    """
+    def __init__(self, path):
+        super(SharedBackoffGate, self).__init__()
+        self.state_file = SharedStateFile(path, defaults=(0,))
+
+    def back_off(self, seconds):
+        with self.state_file.locked() as state:
+            open_at = time.time() + seconds
+            if open_at > state[0]:
+                log.info('Backing off for %s seconds', seconds)
+                state[0] = open_at
+
+    def remaining(self):
+        with self.state_file.locked() as state:
+            return max(0, state[0] - time.time())
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.state_file.path,))
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    A RateLimiter where the token bucket is shared by all processes using the same state file, so requests_per_second
+    is the combined rate of all processes. The max_concurrent limit is still per process.
+    """
+    def __init__(self, path, requests_per_second=None, max_concurrent=None, burst=None):
+        super(SharedRateLimiter, self).__init__(requests_per_second=requests_per_second, max_concurrent=max_concurrent,
+                                                burst=burst)
+        # State is (number of tokens, wall clock time of last refill)
+        self.state_file = SharedStateFile(path, defaults=(self.burst, 0))
+
+    def _take_token(self):
+        with self.state_file.locked() as state:
+            now = time.time()
+            tokens = min(self.burst, state[0] + max(0, now - state[1]) * self.requests_per_second)
+            state[1] = now
+            if tokens < 1:
+                state[0] = tokens
+                return (1 - tokens) / self.requests_per_second
+            state[0] = tokens - 1
+            return 0
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.state_file.path, self.requests_per_second, self.max_concurrent,
+                                               self.burst))
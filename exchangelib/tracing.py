@@ -0,0 +1,94 @@
+# coding=utf-8
+"""
+Hooks for tracing EWS requests, e.g. to collect per-request telemetry in production without enabling debug logging.
+
+Subclass RequestHook, override the callbacks you need and register an instance:
+
+    class MyHook(RequestHook):
+        def on_response(self, trace):
+            statsd.timing('ews.%s' % trace.service, trace.response_time)
+
+    register_hook(MyHook())
+
+Hooks are called from the thread sending the request. Tracing has no cost when no hooks are registered.
+"""
+from __future__ import unicode_literals
+
+import logging
+from threading import Lock
+
+log = logging.getLogger(__name__)
+
+# The registered hooks. The list is replaced, not modified, when hooks are (un)registered, so it can be iterated without
+# holding a lock. Callers check for an empty list before doing any tracing work.
+HOOKS = []
+_hooks_lock = Lock()
+
+
+class RequestHook(object):
+    """
+    Base class for request hooks. All callbacks receive a RequestTrace instance and do nothing by default.
+    """
+    def on_session_wait(self, trace):
+        # Called when we got a session from the session pool. trace.session_wait is the time we waited for it.
+        pass
+
+    def on_request_start(self, trace):
+        # Called before each attempt to send the request, including retries and redirects
+        pass
+
+    def on_response(self, trace):
+        # Called when we got a response or a connection error. trace.status_code is 503 on connection errors.
+        pass
+
+    def on_retry(self, trace):
+        # Called before we wait trace.wait seconds to retry the request
+        pass
+
+
+class RequestTrace(object):
+    """
+    Information about a request, updated as the request progresses. 'service' and 'account' are None for requests that
+    are not sent by an EWS service, e.g. autodiscover requests. Times are in seconds. For streamed responses,
+    'bytes_received' is the Content-Length sent by the server, if any.
+    """
+    __slots__ = ('service', 'account', 'protocol', 'url', 'retry', 'wait', 'bytes_sent', 'bytes_received',
+                 'status_code', 'session_wait', 'response_time')
+
+    def __init__(self, service, account, protocol):
+        self.service = service
+        self.account = account
+        self.protocol = protocol
+        self.url = None
+        self.retry = 0
+        self.wait = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.status_code = None
+        self.session_wait = None
+        self.response_time = None
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.service, self.account, self.url, self.retry, self.status_code))
+
+
+def register_hook(hook):
+    global HOOKS
+    assert isinstance(hook, RequestHook)
+    with _hooks_lock:
+        HOOKS = HOOKS + [hook]
+
+
+def unregister_hook(hook):
+    global HOOKS
+    with _hooks_lock:
+        HOOKS = [h for h in HOOKS if h is not hook]
+
+
+def call_hooks(event, trace):
+    # Calls the 'event' callback on all registered hooks. Hooks must not break requests, so errors are only logged.
+    for hook in HOOKS:
+        try:
+            getattr(hook, event)(trace)
+        except Exception:
+            log.exception('Request hook %s failed in %s', hook, event)
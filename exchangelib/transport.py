@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 
 import logging
+from multiprocessing.pool import ThreadPool
 
 import requests.auth
 import requests.sessions
@@ -9,7 +10,7 @@ import requests_ntlm
 
 from .credentials import IMPERSONATION
 from .errors import UnauthorizedError, TransportError, RedirectError, RelativeRedirect
-from .util import create_element, add_xml_child, get_redirect_url, xml_to_str
+from .util import create_element, add_xml_child, get_redirect_url, xml_to_str, xml_to_parts
 
 log = logging.getLogger(__name__)
 
@@ -35,12 +36,43 @@ AUTH_TYPE_MAP = {
 DEFAULT_ENCODING = 'utf-8'
 DEFAULT_HEADERS = {'Content-Type': 'text/xml; charset=%s' % DEFAULT_ENCODING, 'Accept-Encoding': 'compress, gzip'}
 
+# The cookie Exchange 2013+ uses to route requests for a mailbox to a specific backend server
+BACKEND_OVERRIDE_COOKIE = 'X-BackEndOverrideCookie'
 
-def wrap(content, version, account=None):
+
+# The serialized SOAP envelope around the request body, keyed on the values that the envelope depends on. With
+# impersonation, there is an entry for each mailbox.
+_envelope_cache = dict()
+ENVELOPE_CACHE_SIZE = 1000
+
+
+def wrap(content, version, account=None, stream=False):
     """
     Generate the necessary boilerplate XML for a raw SOAP request. The XML is specific to the server version.
     ExchangeImpersonation allows to act as the user we want to impersonate.
+
+    If 'stream' is True and the content contains StreamedContent values, a StreamedRequestBody is returned instead of
+    bytes. Otherwise, StreamedContent values are serialized as normal text.
     """
+    try:
+        parts = xml_to_parts(content, encoding=DEFAULT_ENCODING)
+    except ValueError:
+        # The content contains elements that xml_to_parts() doesn't support
+        envelope, body = _create_envelope(version=version, account=account)
+        body.append(content)
+        return xml_to_str(envelope, encoding=DEFAULT_ENCODING, xml_declaration=True)
+    prefix, suffix = _get_envelope(version=version, account=account)
+    parts[0] = prefix + parts[0]
+    parts[-1] += suffix
+    if len(parts) == 1:
+        return parts[0]
+    if stream:
+        return StreamedRequestBody(parts=parts)
+    return b''.join(p if isinstance(p, bytes) else b''.join(p.iter_chunks()) for p in parts)
+
+
+def _create_envelope(version, account):
+    # Returns the s:Envelope element and its empty s:Body element
     envelope = create_element('s:Envelope', **{
         'xmlns:s': SOAPNS,
         'xmlns:t': TNS,
@@ -62,9 +94,73 @@ def wrap(content, version, account=None):
         header.append(timezonecontext)
     envelope.append(header)
     body = create_element('s:Body')
-    body.append(content)
     envelope.append(body)
-    return xml_to_str(envelope, encoding=DEFAULT_ENCODING, xml_declaration=True)
+    return envelope, body
+
+
+def _get_envelope(version, account):
+    # Returns the serialized envelope before and after the body content. The key must contain all account values that
+    # _create_envelope() uses.
+    if account:
+        key = (version, account.access_type, account.primary_smtp_address if account.access_type == IMPERSONATION
+               else None, account.default_timezone.ms_id)
+    else:
+        key = (version,)
+    try:
+        return _envelope_cache[key]
+    except KeyError:
+        pass
+    envelope, body = _create_envelope(version=version, account=account)
+    body.text = ''  # Serialize as a start and end tag
+    prefix, suffix = b''.join(xml_to_parts(envelope, encoding=DEFAULT_ENCODING, xml_declaration=True)).split(
+        b'<s:Body></s:Body>')
+    res = prefix + b'<s:Body>', b'</s:Body>' + suffix
+    if len(_envelope_cache) >= ENVELOPE_CACHE_SIZE:
+        _envelope_cache.clear()
+    _envelope_cache[key] = res
+    return res
+
+
+class StreamedRequestBody(object):
+    """
+    A request body that writes large StreamedContent values in chunks while the request is being sent, so we never hold
+    the full, encoded request in memory. The rest of the envelope is serialized up front.
+
+    The body has no length, so 'requests' sends it with chunked transfer encoding. It can be iterated more than once,
+    which is needed when the request is sent again, e.g. for NTLM authentication or retries.
+    """
+    def __init__(self, parts):
+        # A list of encoded strings and StreamedContent values, as returned by xml_to_parts()
+        self.parts = parts
+
+    @property
+    def size(self):
+        return sum(len(p) if isinstance(p, bytes) else p.size for p in self.parts)
+
+    def __iter__(self):
+        for p in self.parts:
+            if isinstance(p, bytes):
+                yield p
+            else:
+                for chunk in p.iter_chunks():
+                    yield chunk
+
+    def __repr__(self):
+        return self.__class__.__name__ + '(<%s bytes>)' % self.size
+
+
+def get_affinity_headers(account):
+    """
+    Returns the HTTP headers and cookies that ask the server to route requests for the account to the backend server
+    holding the mailbox. Without these, Exchange 2013+ and Office 365 may proxy each request through a random backend.
+    See https://msdn.microsoft.com/en-us/library/office/dn458789(v=exchg.150).aspx
+    """
+    headers = {
+        'X-AnchorMailbox': account.primary_smtp_address,
+        'X-PreferServerAffinity': 'True',
+    }
+    cookies = {BACKEND_OVERRIDE_COOKIE: account.affinity_cookie} if account.affinity_cookie else None
+    return headers, cookies
 
 
 def get_auth_instance(credentials, auth_type):
@@ -114,29 +210,54 @@ def get_docs_authtype(docs_url, verify):
     return _get_auth_method_from_response(response=r)
 
 
-def get_service_authtype(service_endpoint, versions, verify, name):
+def get_service_authtype(service_endpoint, versions, verify, name, parallel=False):
     # Get auth type by tasting headers from the server. Only do POST requests. HEAD is too error prone, and some servers
     # are set up to redirect to OWA on all requests except POST to /EWS/Exchange.asmx
     log.debug('Getting service auth type for %s', service_endpoint)
     # We don't know the API version yet, but we need it to create a valid request because some Exchange servers only
     # respond when given a valid request. Try all known versions. Gross.
+    if parallel:
+        # Try all versions at once, but prefer the result for the earliest version, like the serial version does
+        pool = ThreadPool(processes=len(versions))
+        try:
+            results = [pool.apply_async(_get_service_authtype_for_version, (None, service_endpoint, version, verify,
+                                                                            name)) for version in versions]
+            for r in results:
+                try:
+                    return r.get()
+                except TransportError:
+                    continue
+        finally:
+            # Don't wait for the remaining probes
+            pool.close()
+        raise TransportError('Failed to get auth type from service')
     from .protocol import BaseProtocol
     with requests.sessions.Session() as s:
         s.mount(service_endpoint, BaseProtocol.get_adapter())
         for version in versions:
-            data = dummy_xml(version=version, name=name)
-            log.debug('Requesting %s from %s', data, service_endpoint)
-            r = s.post(url=service_endpoint, headers=DEFAULT_HEADERS.copy(), data=data, allow_redirects=True,
-                       verify=verify)
             try:
-                auth_type = _get_auth_method_from_response(response=r)
-                log.debug('Auth type is %s', auth_type)
-                return auth_type
+                return _get_service_authtype_for_version(s, service_endpoint, version, verify, name)
             except TransportError:
                 continue
     raise TransportError('Failed to get auth type from service')
 
 
+def _get_service_authtype_for_version(session, service_endpoint, version, verify, name):
+    # Uses a new session if 'session' is None
+    if session is None:
+        from .protocol import BaseProtocol
+        with requests.sessions.Session() as s:
+            s.mount(service_endpoint, BaseProtocol.get_adapter())
+            return _get_service_authtype_for_version(s, service_endpoint, version, verify, name)
+    data = dummy_xml(version=version, name=name)
+    log.debug('Requesting %s from %s', data, service_endpoint)
+    r = session.post(url=service_endpoint, headers=DEFAULT_HEADERS.copy(), data=data, allow_redirects=True,
+                     verify=verify)
+    auth_type = _get_auth_method_from_response(response=r)
+    log.debug('Auth type is %s', auth_type)
+    return auth_type
+
+
 def _get_auth_method_from_response(response):
     # First, get the auth method from headers. Then, test credentials. Don't handle redirects - burden is on caller.
     log.debug('Request headers: %s', response.request.headers)
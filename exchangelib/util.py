@@ -1,31 +1,44 @@
 from __future__ import unicode_literals
 
-from copy import deepcopy
+import base64
+from contextlib import contextmanager
+import copy
 from decimal import Decimal
+import glob
 import io
 import itertools
 import logging
+import os
 import re
+import shelve
 import socket
+import threading
 import time
-from xml.etree.ElementTree import Element, fromstring, ParseError
+from xml.etree.ElementTree import Element, fromstring, iterparse as etree_iterparse, ParseError
+from xml.sax.saxutils import escape
 
 from future.moves.urllib.parse import urlparse
 from future.moves._thread import get_ident
 from future.utils import PY2
+import lxml.etree
 import requests.exceptions
 from six import text_type, string_types
 
-from .errors import TransportError, RateLimitError, RedirectError, RelativeRedirect, CASError, UnauthorizedError, \
-    ErrorInvalidSchemaVersionForMailboxVersion
+from . import tracing
+from .ewsdatetime import EWSDateTime, EWSDate
+from .errors import TransportError, DeadlineExceeded, RateLimitError, RedirectError, RelativeRedirect, CASError, \
+    UnauthorizedError, ErrorInvalidSchemaVersionForMailboxVersion
 
 time_func = time.time if PY2 else time.monotonic
 
 
 log = logging.getLogger(__name__)
 
-ElementType = type(Element('x'))  # Type is auto-generated inside cElementTree
+# The element types of both XML backends. Type is auto-generated inside cElementTree
+ElementType = (type(Element('x')), lxml.etree._Element)
 string_type = string_types[0]
+# The value types that set_xml_value() converts to element text
+_xml_text_types = string_types + (bool, bytes, int, Decimal, EWSDate, EWSDateTime)
 
 # Regex of UTF-8 control characters that are illegal in XML 1.0 (and XML 1.1)
 _illegal_xml_chars_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1F\uD800-\uDFFF\uFFFE\uFFFF]')
@@ -96,8 +109,57 @@ def peek(iterable):
         return False, itertools.chain([first], iterable)
 
 
+# XML backends for parsing responses. See set_xml_backend()
+ETREE = 'etree'
+LXML = 'lxml'
+XML_BACKENDS = (ETREE, LXML)
+_xml_backend = ETREE
+# The lxml parser options. 'huge_tree' allows the large text nodes of attachments
+_lxml_parser_options = dict(resolve_entities=False, huge_tree=True)
+_lxml_parser = lxml.etree.XMLParser(**_lxml_parser_options)
+
+
+def set_xml_backend(name):
+    """
+    Selects the library that parses responses: ETREE (xml.etree.ElementTree, the default) or LXML (lxml.etree). lxml
+    parses large responses faster, but accessing the parsed elements is slower, so measure the difference with
+    scripts/benchmark_parsing.py before switching. Both libraries return elements with the same API, so the rest of the
+    code doesn't need to know which one is used. Requests are always built with xml.etree.ElementTree, because lxml
+    doesn't allow the prefixed tag names that we use.
+    """
+    global _xml_backend
+    if name not in XML_BACKENDS:
+        raise ValueError("'name' %r must be one of %s" % (name, XML_BACKENDS))
+    _xml_backend = name
+
+
+def get_xml_backend():
+    return _xml_backend
+
+
+def iterparse(source, events):
+    # iterparse() of the selected XML backend. Parse errors are always raised as ParseError.
+    if _xml_backend == ETREE:
+        return etree_iterparse(source, events=events)
+    return _lxml_iterparse(source, events=events)
+
+
+def _lxml_iterparse(source, events):
+    try:
+        for event, elem in lxml.etree.iterparse(source, events=events, **_lxml_parser_options):
+            yield event, elem
+    except lxml.etree.XMLSyntaxError as e:
+        raise ParseError(text_type(e))
+
+
 def xml_to_str(tree, encoding=None, xml_declaration=False):
     from xml.etree.ElementTree import ElementTree
+    if isinstance(tree, lxml.etree._Element):
+        # Parsed by the lxml backend
+        if encoding is None:
+            assert not xml_declaration
+            return lxml.etree.tostring(tree, encoding=text_type)
+        return lxml.etree.tostring(tree, encoding=encoding, xml_declaration=xml_declaration)
     # tostring() returns bytecode unless encoding is 'unicode', and does not reliably produce an XML declaration. We
     # ALWAYS want bytecode so we can convert to unicode explicitly.
     if encoding is None:
@@ -110,8 +172,112 @@ def xml_to_str(tree, encoding=None, xml_declaration=False):
     else:
         stream = io.BytesIO()
         stream.write(('<?xml version="1.0" encoding="%s"?>' % encoding).encode(encoding))
+    tree, raw_xml = _replace_raw_xml(tree)
     ElementTree(tree).write(stream, encoding=encoding, xml_declaration=False, method='xml')
-    return stream.getvalue()
+    res = stream.getvalue()
+    for placeholder, xml in raw_xml.items():
+        if isinstance(res, bytes):
+            placeholder, xml = placeholder.encode(encoding), xml.encode(encoding)
+        res = res.replace(placeholder, xml)
+    return res
+
+
+def _replace_raw_xml(tree):
+    # ElementTree can't serialize RawXml values. Returns a copy of the tree where they are replaced by unique
+    # placeholders, and a dict of placeholder -> serialized XML. The tree itself is returned if it has no RawXml values,
+    # and is never modified, since elements with RawXml values are shared between requests.
+    if not any(isinstance(e.text, RawXml) for e in tree.iter()):
+        return tree, {}
+    tree = copy.deepcopy(tree)
+    raw_xml = {}
+    for e in tree.iter():
+        if isinstance(e.text, RawXml):
+            placeholder = 'exchangelib-raw-xml-%s-%s' % (id(tree), len(raw_xml))
+            raw_xml[placeholder] = e.text.xml
+            e.text = placeholder
+    return tree, raw_xml
+
+
+# The start and end tags of request elements, e.g. ('<t:Subject', '</t:Subject>'). Request elements are created with
+# a fixed set of prefixed tag names, so the cache doesn't grow with the number of requests.
+_tag_cache = dict()
+
+
+def _escape_text(text):
+    # Faster than always calling replace(), because most values contain none of these characters
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+def _escape_attrib(value):
+    value = _escape_text(value)
+    if '"' in value:
+        value = value.replace('"', '&quot;')
+    if '\n' in value:
+        value = value.replace('\n', '&#10;')
+    if '\r' in value:
+        value = value.replace('\r', '&#13;')
+    if '\t' in value:
+        value = value.replace('\t', '&#09;')
+    return value
+
+
+def _write_elem(elem, write, write_streamed):
+    tag = elem.tag
+    try:
+        start, end = _tag_cache[tag]
+    except KeyError:
+        if not isinstance(tag, string_types) or tag.startswith('{'):
+            # Qualified names need the namespace handling of ElementTree
+            raise ValueError('Unsupported tag %r' % tag)
+        start, end = _tag_cache.setdefault(tag, ('<%s' % tag, '</%s>' % tag))
+    write(start)
+    for k, v in elem.items():
+        write(' %s="%s"' % (k, _escape_attrib(v)))
+    text = elem.text
+    if text is None and not len(elem):
+        write(' />')
+    else:
+        write('>')
+        if text is not None:
+            if isinstance(text, string_types):
+                write(_escape_text(text))
+            elif isinstance(text, StreamedContent):
+                write_streamed(text)
+            else:
+                write(text.xml)
+        for child in elem:
+            _write_elem(child, write, write_streamed)
+        write(end)
+    if elem.tail:
+        write(_escape_text(elem.tail))
+
+
+def xml_to_parts(tree, encoding='utf-8', xml_declaration=False):
+    """
+    Serializes a request element tree directly to a list of encoded strings, without the overhead of
+    ElementTree.write(). StreamedContent values are not serialized but are inserted into the list as-is, between the
+    encoded strings. RawXml values are inserted without escaping.
+
+    Only prefixed tag names like 't:Subject' are supported. A ValueError is raised for qualified tag names.
+    """
+    parts, text_parts = [], []
+
+    def write_streamed(content):
+        parts.append(''.join(text_parts).encode(encoding))
+        del text_parts[:]
+        parts.append(content)
+
+    if xml_declaration:
+        text_parts.append('<?xml version="1.0" encoding="%s"?>' % encoding)
+    _write_elem(tree, text_parts.append, write_streamed)
+    parts.append(''.join(text_parts).encode(encoding))
+    return parts
 
 
 def get_xml_attr(tree, name):
@@ -127,19 +293,17 @@ def get_xml_attrs(tree, name):
 
 def value_to_xml_text(value):
     # We can't handle bytes in this function because str == bytes on Python2
-    from .ewsdatetime import EWSDateTime, EWSDate
-    from .indexed_properties import PhoneNumber, EmailAddress
-    from .properties import Mailbox, Attendee
     if isinstance(value, string_types):
         return safe_xml_value(value)
     if isinstance(value, bool):
         return '1' if value else '0'
     if isinstance(value, (int, Decimal)):
         return text_type(value)
-    if isinstance(value, EWSDateTime):
-        return value.ewsformat()
-    if isinstance(value, EWSDate):
+    if isinstance(value, (EWSDateTime, EWSDate)):
         return value.ewsformat()
+    # Only import these when needed. Imports inside functions are slow, and this is called for every request value.
+    from .indexed_properties import PhoneNumber, EmailAddress
+    from .properties import Mailbox, Attendee
     if isinstance(value, PhoneNumber):
         return value.phone_number
     if isinstance(value, EmailAddress):
@@ -153,7 +317,6 @@ def value_to_xml_text(value):
 
 def xml_text_to_value(value, value_type):
     # We can't handle bytes in this function because str == bytes on Python2
-    from .ewsdatetime import EWSDateTime
     return {
         bool: lambda v: True if v == 'true' else False if v == 'false' else None,
         int: int,
@@ -164,12 +327,12 @@ def xml_text_to_value(value, value_type):
 
 
 def set_xml_value(elem, value, version):
+    if isinstance(value, _xml_text_types):
+        elem.text = value_to_xml_text(value)
+        return elem
     from .fields import FieldPath, FieldOrder
     from .folders import EWSElement
-    from .ewsdatetime import EWSDateTime, EWSDate
-    if isinstance(value, string_types + (bool, bytes, int, Decimal, EWSDate, EWSDateTime)):
-        elem.text = value_to_xml_text(value)
-    elif is_iterable(value, generators_allowed=True):
+    if is_iterable(value, generators_allowed=True):
         for v in value:
             if isinstance(v, (FieldPath, FieldOrder)):
                 elem.append(v.to_xml())
@@ -198,16 +361,68 @@ def safe_xml_value(value, replacement='?'):
     return text_type(_illegal_xml_chars_RE.sub(replacement, value))
 
 
-# Keeps a cache of Element objects to deepcopy
-_deepcopy_cache = dict()
+class StreamedContent(object):
+    """
+    A large text value of a request element, which is written to the request body in chunks while the request is being
+    sent, instead of being serialized with the rest of the SOAP envelope. Use it as the 'text' of an element. See
+    transport.wrap() for details.
+
+    If 'base64_encode' is True, 'value' is bytes that are base64-encoded chunk by chunk. Otherwise, 'value' is text.
+    """
+    # Values smaller than this are not worth streaming
+    MIN_SIZE = 1024 * 1024
+    # A multiple of 3, so base64-encoded chunks can be concatenated
+    CHUNK_SIZE = 3 * 64 * 1024
+
+    __slots__ = ('value', 'base64_encode')
+
+    def __init__(self, value, base64_encode=False):
+        self.value = value
+        self.base64_encode = base64_encode
+
+    def iter_chunks(self):
+        # Yields the XML-escaped and encoded value in chunks
+        for i in range(0, len(self.value), self.CHUNK_SIZE):
+            chunk = self.value[i:i + self.CHUNK_SIZE]
+            if self.base64_encode:
+                yield base64.b64encode(chunk)
+            else:
+                yield escape(safe_xml_value(chunk)).encode('utf-8')
+
+    @property
+    def size(self):
+        # The number of bytes that iter_chunks() yields
+        if self.base64_encode:
+            return (len(self.value) + 2) // 3 * 4
+        return sum(len(chunk) for chunk in self.iter_chunks())
+
+    def __repr__(self):
+        return self.__class__.__name__ + '(<%s %s>)' % (len(self.value), 'bytes' if self.base64_encode else 'chars')
+
+
+class RawXml(object):
+    """
+    Serialized XML to use as the 'text' of an element. xml_to_parts() inserts it as-is, so the children of an element
+    that is used in many requests only need to be created and serialized once.
+    """
+    __slots__ = ('xml',)
+
+    def __init__(self, xml):
+        self.xml = xml
+
+    @classmethod
+    def from_children(cls, elem):
+        # Returns the serialized children of 'elem'
+        return cls(b''.join(b''.join(xml_to_parts(child)) for child in elem).decode('utf-8'))
+
+    def __repr__(self):
+        return self.__class__.__name__ + '(%r)' % self.xml
 
 
 def create_element(name, **attrs):
-    # copy.deepcopy() is an order of magnitude faster than creating a new Element() every time
-    key = (name, tuple(attrs.items()))  # dict requires key to be immutable
-    if name not in _deepcopy_cache:
-        _deepcopy_cache[key] = Element(name, **attrs)
-    return deepcopy(_deepcopy_cache[key])
+    # Creating a new Element is several times faster than copy.deepcopy() of a cached Element. A shallow copy would be
+    # faster still, but shares the 'attrib' dict with the cached Element, which callers modify.
+    return Element(name, **attrs)
 
 
 def add_xml_child(tree, name, value):
@@ -218,17 +433,25 @@ def add_xml_child(tree, name, value):
 
 def to_xml(text):
     try:
+        if _xml_backend == LXML:
+            # lxml doesn't accept unicode strings with an encoding declaration
+            return lxml.etree.fromstring((text[BOM_LEN:] if text.startswith(BOM) else text).encode('utf-8'),
+                                         _lxml_parser)
         if PY2:
             # On python2, fromstring expects an encoded string
             return fromstring((text[BOM_LEN:] if text.startswith(BOM) else text).encode('utf-8'))
         return fromstring(text[BOM_LEN:] if text.startswith(BOM) else text)
-    except ParseError:
+    except (ParseError, lxml.etree.XMLSyntaxError):
         from lxml.etree import XMLParser, parse, tostring
         # Exchange servers may spit out the weirdest XML. lxml is pretty good at recovering from errors
         log.warning('Fallback to lxml processing of faulty XML')
-        magical_parser = XMLParser(recover=True)
+        magical_parser = XMLParser(recover=True, **_lxml_parser_options)
         no_bom_text = text[BOM_LEN:] if text.startswith(BOM) else text
         root = parse(io.BytesIO(no_bom_text.encode('utf-8')), magical_parser)
+        if _xml_backend == LXML:
+            if root.getroot() is None:
+                raise ParseError('This is not XML: %s' % text)
+            return root.getroot()
         try:
             return fromstring(tostring(root))
         except ParseError as e:
@@ -256,6 +479,134 @@ def is_xml(text):
     return text[:5] == '<?xml'
 
 
+@contextmanager
+def shelve_open_with_failover(filename):
+    # We can expect empty or corrupt files. Whatever happens, just delete the cache file and try again.
+    # 'shelve' may add a backend-specific suffix to the file, so also delete all files with a suffix.
+    # We don't know which file caused the error, so just delete them all.
+    try:
+        shelve_handle = shelve.open(filename)
+    except Exception as e:
+        for f in glob.glob(filename + '*'):
+            log.warning('Deleting invalid cache file %s (%r)', f, e)
+            os.unlink(f)
+        shelve_handle = shelve.open(filename)
+    yield shelve_handle
+    if PY2:
+        shelve_handle.close()
+
+
+class Deadline(object):
+    """
+    A point in time after which we give up on the EWS requests of a call. Use the deadline() context manager to set a
+    deadline.
+    """
+    __slots__ = ('seconds', 'expires')
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time_func() + seconds
+
+    def remaining(self):
+        return max(0, self.expires - time_func())
+
+    def check(self, wait=0):
+        # Raises DeadlineExceeded if the deadline has passed, or will have passed after waiting 'wait' seconds
+        if wait >= self.remaining():
+            raise DeadlineExceeded('Deadline of %s seconds exceeded' % self.seconds)
+
+    def __repr__(self):
+        return self.__class__.__name__ + repr((self.seconds,))
+
+
+_deadline_local = threading.local()
+
+
+def get_deadline():
+    # Returns the Deadline of the current thread, or None
+    return getattr(_deadline_local, 'deadline', None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Sets a time budget in seconds for all EWS requests sent within the context by the current thread, and by worker
+    threads on behalf of this thread. The budget covers waiting for a session, rate limiting, retries and paging. When
+    the budget is spent, DeadlineExceeded is raised instead of waiting or retrying:
+
+        with deadline(2):
+            items = list(account.inbox.filter(subject='foo'))
+
+    Querysets are lazy, so they must be evaluated within the context. A nested deadline can only shorten the outer
+    deadline. 'seconds' may also be a Deadline instance.
+    """
+    outer = get_deadline()
+    d = seconds if isinstance(seconds, Deadline) else Deadline(seconds)
+    if outer is not None and outer.expires < d.expires:
+        d = outer
+    _deadline_local.deadline = d
+    try:
+        yield d
+    finally:
+        _deadline_local.deadline = outer
+
+
+def call_with_deadline(d, func, *args, **kwargs):
+    # Calls 'func' with 'd' as the deadline of the current thread. Used to carry a deadline over to worker threads.
+    with deadline(d):
+        return func(*args, **kwargs)
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key, so only one call per key is in flight at a time. Callers that arrive
+    while a call is in flight wait for it and get its result or exception, instead of making the call themselves.
+    Results are not cached after the call has finished.
+    """
+    def __init__(self):
+        self._calls = {}  # Maps key -> _InFlightCall
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        # Calls 'func' without arguments, or waits for the call already in flight for 'key'. Waiting callers respect the
+        # deadline of their own thread.
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _InFlightCall()
+        if not is_leader:
+            log.debug('Waiting for call in flight')
+            request_deadline = get_deadline()
+            while not call.done.wait(None if request_deadline is None else request_deadline.remaining()):
+                request_deadline.check()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class _InFlightCall(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
 class DummyRequest(object):
     headers = {}
 
@@ -321,7 +672,28 @@ if not PY2:
     CONNECTION_ERRORS += (ConnectionResetError,)
 
 
-def post_ratelimited(protocol, session, url, headers, data, timeout=None, verify=True, allow_redirects=False):
+# The template for debug and error messages in post_ratelimited()
+POST_LOG_MSG = '''\
+Retry: %(retry)s
+Waited: %(wait)s
+Timeout: %(timeout)s
+Session: %(session_id)s
+Thread: %(thread_id)s
+Auth type: %(auth)s
+URL: %(url)s
+Verify: %(verify)s
+Allow redirects: %(allow_redirects)s
+Response time: %(response_time)s
+Status code: %(status_code)s
+Request headers: %(request_headers)s
+Response headers: %(response_headers)s
+Request data: %(request_data)s
+Response data: %(response_data)s
+'''
+
+
+def post_ratelimited(protocol, session, url, headers, data, timeout=None, verify=True, allow_redirects=False,
+                     stream=False, cookies=None, trace=None):
     """
     There are two error-handling policies implemented here: a fail-fast policy intended for stand-alone scripts which
     fails on all responses except HTTP 200. The other policy is intended for long-running tasks that need to respect
@@ -342,67 +714,107 @@ def post_ratelimited(protocol, session, url, headers, data, timeout=None, verify
     malfunctions. The only cure is to stop making requests.
 
     The contract on sessions here is to return the session that ends up being used, or retiring the session if we
-    intend to raise an exception. We give up on max_wait timeout, not number of retries
+    intend to raise an exception. When and how often we retry is decided by the retry policy of the credentials, see
+    exchangelib.throttling.RetryPolicy.
+
+    If 'stream' is True, the body of a successful response is not downloaded. It must be read by the caller, e.g. using
+    r.iter_content(), before the session can be reused.
+
+    'trace' is an optional exchangelib.tracing.RequestTrace instance passed to the registered request hooks. If there
+    are registered hooks and no trace is given, a trace without service and account information is created.
     """
     thread_id = get_ident()
-    wait = 10  # seconds
+    wait = 0  # seconds
     retry = 0
+    attempts = {}  # The number of retries per error class
     redirects = 0
-    log_msg = '''\
-Retry: %(retry)s
-Waited: %(wait)s
-Timeout: %(timeout)s
-Session: %(session_id)s
-Thread: %(thread_id)s
-Auth type: %(auth)s
-URL: %(url)s
-Verify: %(verify)s
-Allow redirects: %(allow_redirects)s
-Response time: %(response_time)s
-Status code: %(status_code)s
-Request headers: %(request_headers)s
-Response headers: %(response_headers)s
-Request data: %(request_data)s
-Response data: %(response_data)s
-'''
+    t_start = time_func()
+    if trace is None and tracing.HOOKS:
+        trace = tracing.RequestTrace(service=None, account=None, protocol=protocol)
+    request_deadline = get_deadline()
+    timeout_from_deadline = False  # True if the deadline shortened the timeout of the current attempt
+
+    def get_log_vals():
+        # Only build this when it's actually needed. Getting the response text may be expensive.
+        return dict(retry=retry, wait=wait, timeout=timeout, session_id=session.session_id, thread_id=thread_id,
+                    auth=session.auth, url=url, verify=verify, allow_redirects=allow_redirects,
+                    response_time=d2 - d1, status_code=r.status_code, request_headers=r.request.headers,
+                    response_headers=r.headers, request_data=data,
+                    response_data='[streamed]' if stream and r.status_code == 200 else getattr(r, 'text', ''))
+
     try:
         while True:
             log.debug('Session %s thread %s: retry %s timeout %s POST\'ing to %s after %ss wait', session.session_id,
                       thread_id, retry, timeout, url, wait)
+            if trace is not None:
+                trace.url, trace.retry, trace.bytes_sent = url, retry, get_body_size(data)
+                tracing.call_hooks('on_request_start', trace)
+            if request_deadline is not None:
+                # Don't wait for the server longer than we have left
+                request_deadline.check()
+                remaining = request_deadline.remaining()
+                timeout_from_deadline = timeout is None or remaining < timeout
+                timeout = remaining if timeout is None else min(timeout, remaining)
             d1 = time_func()
             try:
                 r = session.post(url=url, headers=headers, data=data, allow_redirects=False, timeout=timeout,
-                                 verify=verify)
+                                 verify=verify, stream=stream, cookies=cookies)
             except CONNECTION_ERRORS as e:
                 log.debug('Session %s thread %s: connection error POST\'ing to %s', session.session_id, thread_id, url)
+                if timeout_from_deadline and isinstance(e, (requests.exceptions.Timeout, socket.timeout)):
+                    # We shortened the timeout to respect the deadline, so this is not a problem with the server
+                    raise DeadlineExceeded('Deadline of %s seconds exceeded' % request_deadline.seconds)
                 r = DummyResponse()
                 r.request.headers = headers
                 r.headers = {'TimeoutException': e}
             d2 = time_func()
-            log_vals = dict(retry=retry, wait=wait, timeout=timeout, session_id=session.session_id, thread_id=thread_id,
-                            auth=session.auth, url=url, verify=verify, allow_redirects=allow_redirects,
-                            response_time=d2 - d1, status_code=r.status_code, request_headers=r.request.headers,
-                            response_headers=r.headers, request_data=data, response_data=getattr(r, 'text', ''))
-            log.debug(log_msg, log_vals)
-            if _may_retry_on_error(r, protocol, wait):
+            if r.status_code == 503:
+                # The server is overloaded, or the request timed out
+                protocol.session_pool_controller.on_congestion()
+            if trace is not None:
+                trace.status_code, trace.response_time = r.status_code, d2 - d1
+                if stream:
+                    # Don't download the body here. We only know its size if the server tells us.
+                    trace.bytes_received = int(r.headers.get('Content-Length') or 0)
+                else:
+                    trace.bytes_received = len(getattr(r, 'content', None) or b'')
+                tracing.call_hooks('on_response', trace)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(POST_LOG_MSG, get_log_vals())
+            retry_delay = _get_retry_delay(r, url, protocol, attempts, elapsed=time_func() - t_start)
+            if retry_delay is not None:
+                error_class, delay, jitter = retry_delay
+                wait = delay + jitter
+                if request_deadline is not None:
+                    request_deadline.check(wait=max(wait, protocol.backoff_gate.remaining()))
                 log.info("Session %s thread %s: Connection error on URL %s (code %s). Cool down %s secs",
                          session.session_id, thread_id, url, r.status_code, wait)
-                time.sleep(wait)  # Increase delay for every retry
+                if trace is not None:
+                    trace.wait = wait
+                    tracing.call_hooks('on_retry', trace)
+                if r.status_code == 503:
+                    # The server is overloaded. Make all threads back off, not just this one. The jitter spreads out the
+                    # retries of the threads when the gate opens.
+                    protocol.backoff_gate.back_off(delay)
+                    protocol.backoff_gate.wait()
+                    time.sleep(jitter)
+                else:
+                    time.sleep(wait)
                 retry += 1
-                wait *= 2
+                attempts[error_class] += 1
                 session = protocol.renew_session(session)
                 continue
             if r.status_code in (301, 302):
                 url, redirects = _redirect_or_fail(r, redirects, allow_redirects)
                 continue
             break
-    except (RateLimitError, RedirectError) as e:
+    except (DeadlineExceeded, RateLimitError, RedirectError) as e:
         log.warning(e.value)
         protocol.retire_session(session)
         raise
     except Exception as e:
         # Let higher layers handle this. Add full context for better debugging.
-        log.error('%s: %s\n%s', e.__class__.__name__, text_type(e), log_msg % log_vals)
+        log.error('%s: %s\n%s', e.__class__.__name__, text_type(e), POST_LOG_MSG % get_log_vals())
         protocol.retire_session(session)
         raise
     if r.status_code == 500 and r.text and is_xml(r.text):
@@ -410,32 +822,55 @@ Response data: %(response_data)s
         log.debug('Got status code %s but trying to parse content anyway', r.status_code)
     elif r.status_code != 200:
         protocol.retire_session(session)
-        _raise_response_errors(r, protocol, log_msg, log_vals)  # Always raises an exception
+        _raise_response_errors(r, protocol, POST_LOG_MSG, get_log_vals())  # Always raises an exception
     log.debug('Session %s thread %s: Useful response from %s', session.session_id, thread_id, url)
     return r, session
 
 
-def _may_retry_on_error(r, protocol, wait):
+def get_body_size(data):
+    # Streamed request bodies know their size without being generated
+    if not isinstance(data, (bytes, string_types)):
+        return getattr(data, 'size', 0)
+    return len(data)
+
+
+def _get_retry_error_class(r):
+    # Returns the RetryPolicy error class of a response, or None if it's not an error that we may retry.
     # The genericerrorpage.htm/internalerror.asp is ridiculous behaviour for random outages. Redirect to
     # '/internalsite/internalerror.asp' or '/internalsite/initparams.aspx' is caused by e.g. SSL certificate
     # f*ckups on the Exchange server.
-    if (r.status_code == 401) \
-            or (r.headers.get('connection') == 'close') \
-            or (r.status_code == 302 and r.headers.get('location', '').lower() ==
-                '/ews/genericerrorpage.htm?aspxerrorpath=/ews/exchange.asmx') \
-            or (r.status_code == 503):
-        # Maybe stale session. Get brand new one. But wait a bit, since the server may be rate-limiting us.
-        # This can be 302 redirect to error page, 401 authentication error or 503 service unavailable
-        if r.status_code not in (302, 401, 503):
-            # Only retry if we didn't get a useful response
-            return False
-        if protocol.credentials.fail_fast:
-            return False
-        if wait > protocol.credentials.max_wait:
-            # We lost patience. Session is cleaned up in outer loop
-            raise RateLimitError('URL %s: Max timeout reached' % r.url)
-        return True
-    return False
+    from .throttling import RetryPolicy  # Avoid circular import
+    if r.status_code == 401:
+        return RetryPolicy.UNAUTHORIZED
+    if r.status_code == 503:
+        # Connection errors are reported as a 503 with the exception in a header
+        return RetryPolicy.CONNECTION_ERROR if 'TimeoutException' in r.headers else RetryPolicy.SERVER_BUSY
+    if r.status_code == 302 and r.headers.get('location', '').lower() == \
+            '/ews/genericerrorpage.htm?aspxerrorpath=/ews/exchange.asmx':
+        return RetryPolicy.ERROR_PAGE
+    return None
+
+
+def _get_retry_delay(r, url, protocol, attempts, elapsed):
+    # Maybe stale session. Get brand new one. But wait a bit, since the server may be rate-limiting us. Returns an
+    # (error class, delay, jitter) tuple if we should retry, otherwise None. 'attempts' is a dict of error class ->
+    # number of retries so far.
+    retry_policy = protocol.credentials.retry_policy
+    if retry_policy is None:
+        return None
+    error_class = _get_retry_error_class(r)
+    if error_class is None:
+        return None
+    attempts.setdefault(error_class, 0)
+    try:
+        retry_delay = retry_policy.get_delay(error_class=error_class, attempt=attempts[error_class], elapsed=elapsed)
+    except RateLimitError as e:
+        # We lost patience. Session is cleaned up in outer loop
+        raise RateLimitError('URL %s: %s' % (url, e.value))
+    if retry_delay is None:
+        return None
+    delay, jitter = retry_delay
+    return error_class, delay, jitter
 
 
 def _redirect_or_fail(r, redirects, allow_redirects):
@@ -464,8 +899,8 @@ def _raise_response_errors(r, protocol, log_msg, log_vals):
         raise ErrorInvalidSchemaVersionForMailboxVersion('Invalid server version')
     if 'The referenced account is currently locked out' in r.text:
         raise TransportError('The service account is currently locked out')
-    if r.status_code == 401 and protocol.credentials.fail_fast:
-        # This is a login failure
+    if r.status_code == 401:
+        # This is a login failure, or the retry policy told us not to retry
         raise UnauthorizedError('Wrong username or password for %s' % r.url)
     if 'TimeoutException' in r.headers:
         raise r.headers['TimeoutException']
@@ -10,7 +10,7 @@ from six import text_type
 
 from .errors import TransportError, ErrorInvalidSchemaVersionForMailboxVersion
 from .transport import TNS, SOAPNS, get_auth_instance
-from .util import is_xml, to_xml
+from .util import is_xml, to_xml, xml_to_str
 
 log = logging.getLogger(__name__)
 
@@ -181,8 +181,15 @@ class Version(object):
         corresponding API version first.
         """
         log.debug('Asking server for version info')
+        api_version = cls.get_api_version_hint(protocol=protocol)
+        return cls._guess_version_from_service(protocol=protocol, hint=api_version)
+
+    @classmethod
+    def get_api_version_hint(cls, protocol, docs_auth_type=None):
+        # Returns the API version according to types.xsd, or None. Only needs the docs auth type, so this can run before
+        # the session pool of the protocol is ready. 'docs_auth_type' defaults to protocol.docs_auth_type.
         # We can't use a session object from the protocol pool for docs because sessions are created with service auth.
-        auth = get_auth_instance(credentials=protocol.credentials, auth_type=protocol.docs_auth_type)
+        auth = get_auth_instance(credentials=protocol.credentials, auth_type=docs_auth_type or protocol.docs_auth_type)
         try:
             shortname = cls._get_shortname_from_docs(auth=auth, types_url=protocol.types_url,
                                                      verify_ssl=protocol.verify_ssl)
@@ -190,8 +197,7 @@ class Version(object):
         except (TransportError, ParseError) as e:
             log.info(text_type(e))
             shortname = None
-        api_version = VERSIONS[shortname][0] if shortname else None
-        return cls._guess_version_from_service(protocol=protocol, hint=api_version)
+        return VERSIONS[shortname][0] if shortname else None
 
     @staticmethod
     def _get_shortname_from_docs(auth, types_url, verify_ssl):
@@ -236,14 +242,19 @@ class Version(object):
                 raise ParseError()
         except ParseError:
             raise TransportError('Unknown XML response (%s)' % response)
+        return cls.from_soap_header(requested_api_version=requested_api_version, header=header)
 
+    @classmethod
+    def from_soap_header(cls, requested_api_version, header):
+        if header is None:
+            raise TransportError('No SOAP header in response')
         info = header.find('{%s}ServerVersionInfo' % TNS)
         if info is None:
-            raise TransportError('No ServerVersionInfo in response: %s' % response)
+            raise TransportError('No ServerVersionInfo in response: %s' % xml_to_str(header))
         try:
             build = Build.from_xml(elem=info)
         except ValueError:
-            raise TransportError('Bad ServerVersionInfo in response: %s' % response)
+            raise TransportError('Bad ServerVersionInfo in response: %s' % xml_to_str(header))
         # Not all Exchange servers send the Version element
         api_version_from_server = info.get('Version') or build.api_version()
         if api_version_from_server != requested_api_version:
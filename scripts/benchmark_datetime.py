@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+# Measures the time to parse and format EWS datetime strings. The strptime() and dateutil rows show what parsing cost
+# before EWSDateTime had its own parser.
+import datetime
+import sys
+import time
+
+import dateutil.parser
+
+from exchangelib import EWSDateTime, EWSTimeZone, UTC
+
+N = 1000000 if len(sys.argv) < 2 else int(sys.argv[1])  # Number of datetime strings
+
+tz = EWSTimeZone.timezone('Etc/GMT-1')
+naive_dts = [datetime.datetime(2000, 1, 1) + datetime.timedelta(seconds=i * 61) for i in range(N)]
+utc_strings = [dt.strftime('%Y-%m-%dT%H:%M:%SZ') for dt in naive_dts]
+offset_strings = [s.replace('Z', '+01:00') for s in utc_strings]
+utc_dts = [UTC.localize(EWSDateTime(*dt.timetuple()[:6])) for dt in naive_dts]
+offset_dts = [tz.localize(EWSDateTime(*dt.timetuple()[:6])) for dt in naive_dts]
+
+
+def measure(name, func, values):
+    t1 = time.time()
+    for v in values:
+        func(v)
+    t = time.time() - t1
+    print('%s: %.2f s, %.2f us per value, %.0f values per second' % (name, t, t * 1e6 / len(values), len(values) / t))
+
+
+def parse_strptime(s):
+    return UTC.localize(EWSDateTime.strptime(s, '%Y-%m-%dT%H:%M:%SZ'))
+
+
+def parse_dateutil(s):
+    return EWSDateTime.from_datetime(dateutil.parser.parse(s).astimezone(UTC))
+
+
+print('Python %s, %s datetime strings, started %s' % (sys.version.split()[0], N, time.ctime()))
+measure('Parse UTC values with from_string()', EWSDateTime.from_string, utc_strings)
+measure('Parse offset values with from_string()', EWSDateTime.from_string, offset_strings)
+measure('Parse UTC values with strptime()', parse_strptime, utc_strings)
+measure('Parse offset values with dateutil', parse_dateutil, offset_strings[:max(1, N // 10)])
+measure('Format UTC values with ewsformat()', EWSDateTime.ewsformat, utc_dts)
+measure('Format offset values with ewsformat()', EWSDateTime.ewsformat, offset_dts)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+# Measures the time to parse large GetItem and FindItem responses with each XML backend, without a server
+import copy
+import sys
+import time
+import timeit
+
+from exchangelib import EWSDateTime, UTC, CalendarItem, Build, Version
+from exchangelib.fields import BooleanField
+from exchangelib.services import GetItem, FindItem, StreamingResponse, SOAPNS, MNS, TNS
+from exchangelib.util import XML_BACKENDS, set_xml_backend, to_xml, xml_to_parts
+
+N = 5 if len(sys.argv) < 2 else int(sys.argv[1])  # Number of repetitions
+
+
+class BenchmarkAccount(object):
+    # The attributes of Account that are used when parsing responses
+    def __init__(self):
+        self.protocol = None
+        self.version = Version(Build(15, 1))
+
+
+class BenchmarkResponse(object):
+    # The parts of a requests.Response that StreamingResponse uses
+    def __init__(self, content):
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class BenchmarkFolder(object):
+    # The attributes of Folder that are used when parsing responses
+    def __init__(self, account):
+        self.account = account
+
+
+account = BenchmarkAccount()
+
+
+def generate_items(n):
+    tpl_item = CalendarItem(
+        start=UTC.localize(EWSDateTime(2000, 3, 1, 8, 30, 0)),
+        end=UTC.localize(EWSDateTime(2000, 3, 1, 9, 15, 0)),
+        body='This is a performance test of response parsing. ' * 20,
+        location="It's safe to delete this",
+        categories=['perftest', 'benchmark'],
+        reminder_minutes_before_start=15,
+        legacy_free_busy_status='Busy',
+    )
+    for j in range(n):
+        item = copy.copy(tpl_item)
+        item.subject = 'Performance test %s by exchangelib' % j
+        item_xml = b''.join(xml_to_parts(item.to_xml(version=account.version))).decode('utf-8')
+        for f in CalendarItem.FIELDS:
+            # Responses have 'true' and 'false' instead of '1' and '0'
+            if isinstance(f, BooleanField):
+                for request_value, response_value in (('1', 'true'), ('0', 'false')):
+                    item_xml = item_xml.replace('<%s>%s<' % (f.request_tag(), request_value),
+                                                '<%s>%s<' % (f.request_tag(), response_value))
+        yield item_xml.replace('<t:CalendarItem>', '<t:CalendarItem><t:ItemId Id="AAMkADEzOTExYjJkLTYw%s" '
+                                                   'ChangeKey="CQAAABYAAACz%s" />' % (j, j), 1)
+
+
+def envelope(body):
+    return ('''<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="%s">
+  <s:Header>
+    <h:ServerVersionInfo xmlns:h="%s" MajorVersion="15" MinorVersion="1" MajorBuildNumber="845" MinorBuildNumber="22" />
+  </s:Header>
+  <s:Body xmlns:m="%s" xmlns:t="%s">%s</s:Body>
+</s:Envelope>''' % (SOAPNS, TNS, MNS, TNS, body)).encode('utf-8')
+
+
+def get_item_response(n):
+    return envelope('<m:GetItemResponse><m:ResponseMessages>%s</m:ResponseMessages></m:GetItemResponse>' % ''.join(
+        '<m:GetItemResponseMessage ResponseClass="Success"><m:ResponseCode>NoError</m:ResponseCode>'
+        '<m:Items>%s</m:Items></m:GetItemResponseMessage>' % i for i in generate_items(n)
+    ))
+
+
+def find_item_response(n):
+    return envelope(
+        '<m:FindItemResponse><m:ResponseMessages><m:FindItemResponseMessage ResponseClass="Success">'
+        '<m:ResponseCode>NoError</m:ResponseCode>'
+        '<m:RootFolder TotalItemsInView="%s" IncludesLastItemInRange="true"><t:Items>%s</t:Items></m:RootFolder>'
+        '</m:FindItemResponseMessage></m:ResponseMessages></m:FindItemResponse>' % (n, ''.join(generate_items(n)))
+    )
+
+
+def parse_get_item(content, stream, lazy=False):
+    svc = GetItem(account=account)
+    if stream:
+        response = svc._get_streaming_soap_payload(response=StreamingResponse(
+            response=BenchmarkResponse(content), service_name=svc.SERVICE_NAME,
+            container_name=svc.element_container_name
+        ))
+    else:
+        response = svc._get_soap_payload(soap_response=to_xml(content.decode('utf-8')))
+    return [CalendarItem.from_xml(elem=e, account=None, lazy=lazy)
+            for e in svc._get_elements_in_response(response=response)]
+
+
+def parse_get_item_lazy(content, stream):
+    # Most fields are never read, so they are never decoded
+    items = parse_get_item(content, stream, lazy=True)
+    for item in items:
+        assert item.subject
+    return items
+
+
+def parse_find_item(content, stream):
+    svc = FindItem(folder=BenchmarkFolder(account=account))
+    if stream:
+        response = svc._get_streaming_soap_payload(response=StreamingResponse(
+            response=BenchmarkResponse(content), service_name=svc.SERVICE_NAME,
+            container_name=svc.element_container_name
+        ))
+    else:
+        response = svc._get_soap_payload(soap_response=to_xml(content.decode('utf-8')))
+    rootfolder, _ = svc._get_page(response)
+    container = svc._get_page_container(rootfolder)
+    return [CalendarItem.from_xml(elem=e, account=None)
+            for e in svc._iter_elements_in_container(response=response, container=container)]
+
+
+print('Python %s, %s repetitions, started %s' % (sys.version.split()[0], N, time.ctime()))
+responses = (
+    ('GetItem with 500 items', parse_get_item, get_item_response(500), 500),
+    ('GetItem with 500 lazy items, reading only the subject', parse_get_item_lazy, get_item_response(500), 500),
+    ('FindItem with 1000 items', parse_find_item, find_item_response(1000), 1000),
+)
+for name, func, content, count in responses:
+    for backend in XML_BACKENDS:
+        # Parsing alone, without converting the elements to items
+        set_xml_backend(backend)
+        text = content.decode('utf-8')
+        t = min(timeit.repeat(lambda: to_xml(text), number=N, repeat=3)) / N
+        print('%s (%s KB, parse only, %s backend): %.1f ms per response' % (
+            name, len(content) // 1024, backend, t * 1000))
+    for stream in (False, True):
+        for backend in XML_BACKENDS:
+            set_xml_backend(backend)
+            assert len(func(content, stream)) == count
+            t = min(timeit.repeat(lambda: func(content, stream), number=N, repeat=3)) / N
+            print('%s (%s KB, %s, %s backend): %.1f ms per response' % (
+                name, len(content) // 1024, 'streamed' if stream else 'not streamed', backend, t * 1000))
+set_xml_backend(XML_BACKENDS[0])
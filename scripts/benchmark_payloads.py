@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Measures the time to build request payloads, without a server. Run this before and after changing the XML code.
+import copy
+import sys
+import time
+import timeit
+
+from exchangelib import EWSDateTime, EWSTimeZone, UTC, CalendarItem, Contact, Build, Version
+from exchangelib.fields import FieldPath
+from exchangelib.services import GetItem, CreateItem
+from exchangelib.transport import wrap
+
+N = 100 if len(sys.argv) < 2 else int(sys.argv[1])  # Number of repetitions
+
+
+class BenchmarkAccount(object):
+    # The attributes of Account that are used when building payloads
+    def __init__(self):
+        self.protocol = None
+        self.version = Version(Build(15, 1))
+        self.primary_smtp_address = 'benchmark@example.com'
+        self.access_type = 'delegate'
+        self.default_timezone = EWSTimeZone.timezone('America/New_York')
+
+
+account = BenchmarkAccount()
+
+
+# Calendar item generator
+def generate_items(n):
+    start = UTC.localize(EWSDateTime(2000, 3, 1, 8, 30, 0))
+    end = UTC.localize(EWSDateTime(2000, 3, 1, 9, 15, 0))
+    tpl_item = CalendarItem(
+        start=start,
+        end=end,
+        body='This is a performance test of payload generation',
+        location="It's safe to delete this",
+        categories=['perftest'],
+    )
+    for j in range(n):
+        item = copy.copy(tpl_item)
+        item.subject = 'Performance test %s by exchangelib' % j
+        yield item
+
+
+def get_item_payload(ids, additional_fields):
+    return wrap(content=GetItem(account=account).get_payload(items=ids, additional_fields=additional_fields),
+                version=account.version.api_version, account=account)
+
+
+def create_item_payload(items):
+    return wrap(content=CreateItem(account=account).get_payload(
+        items=items, folder=None, message_disposition='SaveOnly', send_meeting_invitations='SendToNone'
+    ), version=account.version.api_version, account=account)
+
+
+def measure(name, func, *args):
+    t = min(timeit.repeat(lambda: func(*args), number=N, repeat=3)) / N
+    print('%s: %.3f ms per payload' % (name, t * 1000))
+
+
+get_ids = [('AAMkADEzOTExYjJkLTYwMzgtNDc1OC04MjU1LTM%s' % i, 'CQAAABYAAACz%s' % i) for i in range(100)]
+get_fields = [FieldPath(field=f) for f in CalendarItem.FIELDS if f.name in (
+    'subject', 'start', 'end', 'location', 'categories', 'body', 'datetime_created'
+)]
+all_contact_fields = [FieldPath(field=f) for f in Contact.supported_fields(version=account.version)]
+create_items = list(generate_items(25))
+
+print('Python %s, %s repetitions, started %s' % (sys.version.split()[0], N, time.ctime()))
+measure('GetItem with 100 items', get_item_payload, get_ids, get_fields)
+measure('GetItem with 100 items and all contact fields', get_item_payload, get_ids, all_contact_fields)
+measure('CreateItem with 25 items', create_item_payload, create_items)
@@ -1,5 +1,7 @@
 # coding=utf-8
+import base64
 from collections import namedtuple
+import copy
 import datetime
 from decimal import Decimal
 import glob
@@ -11,9 +13,10 @@ import psutil
 import random
 import socket
 import string
+import sys
 import time
 import unittest
-from xml.etree.ElementTree import ParseError
+from xml.etree.ElementTree import Element, ParseError
 
 import requests
 import requests_mock
@@ -31,7 +34,7 @@ from exchangelib.errors import RelativeRedirect, ErrorItemNotFound, ErrorInvalid
     ErrorNameResolutionNoResults, TransportError, RedirectError, CASError, RateLimitError, UnauthorizedError, \
     ErrorInvalidChangeKey, ErrorInvalidIdMalformed, ErrorContainsFilterWrongType, ErrorAccessDenied, \
     ErrorFolderNotFound, ErrorInvalidRequest, SOAPError, ErrorInvalidServerVersion, NaiveDateTimeNotAllowed, \
-    AmbiguousTimeError, NonExistentTimeError
+    AmbiguousTimeError, NonExistentTimeError, ErrorServerBusy
 from exchangelib.ewsdatetime import EWSDateTime, EWSDate, EWSTimeZone, UTC, UTC_NOW
 from exchangelib.extended_properties import ExtendedProperty, ExternId
 from exchangelib.fields import BooleanField, IntegerField, DecimalField, TextField, EmailField, URIField, ChoiceField, \
@@ -50,10 +53,16 @@ from exchangelib.recurrence import Recurrence, AbsoluteYearlyPattern, RelativeYe
     RelativeMonthlyPattern, WeeklyPattern, DailyPattern, FirstOccurrence, LastOccurrence, Occurrence, \
     DeletedOccurrence, NoEndPattern, EndDatePattern, NumberedPattern
 from exchangelib.restriction import Restriction, Q
-from exchangelib.services import GetServerTimeZones, GetRoomLists, GetRooms, GetAttachment, ResolveNames, TNS
-from exchangelib.transport import NOAUTH, BASIC, DIGEST, NTLM, wrap, _get_auth_method_from_response
+from exchangelib.services import GetServerTimeZones, GetRoomLists, GetRooms, GetAttachment, ResolveNames, GetItem, \
+    StreamingResponse, TNS, MNS
+from exchangelib.throttling import AIMDController, BackoffGate, RateLimiter, RetryPolicy, RetryRule, \
+    SharedBackoffGate, SharedRateLimiter
+from exchangelib.tracing import RequestHook, register_hook, unregister_hook
+from exchangelib.transport import NOAUTH, BASIC, DIGEST, NTLM, wrap, _get_auth_method_from_response, \
+    _create_envelope, StreamedRequestBody
 from exchangelib.util import chunkify, peek, get_redirect_url, to_xml, BOM, get_domain, \
-    post_ratelimited, create_element, CONNECTION_ERRORS
+    post_ratelimited, create_element, add_xml_child, set_xml_value, get_xml_attr, xml_to_str, xml_to_parts, \
+    CONNECTION_ERRORS, StreamedContent
 from exchangelib.version import Build, Version, EXCHANGE_2007, EXCHANGE_2010, EXCHANGE_2013, EXCHANGE_2016
 from exchangelib.winzone import generate_map, CLDR_TO_MS_TIMEZONE_MAP
 
@@ -239,6 +248,58 @@ class ConfigurationTest(unittest.TestCase):
             version=Version(build=Build(15, 1, 2, 3), api_version='foo'),
         )
 
+    @requests_mock.mock()
+    def test_rate_limiter(self, m):
+        rate_limiter = RateLimiter(requests_per_second=5)
+        config = Configuration(
+            service_endpoint='https://example.com/RateLimited.asmx',
+            credentials=Credentials('foo', 'bar'),
+            auth_type=NTLM,
+            version=Version(build=Build(15, 1, 2, 3)),
+            rate_limiter=rate_limiter,
+        )
+        self.assertEqual(id(config.credentials.rate_limiter), id(rate_limiter))
+        backoff_gate = BackoffGate()
+        config = Configuration(
+            service_endpoint='https://example.com/RateLimited.asmx',
+            credentials=Credentials('foo', 'bar'),
+            auth_type=NTLM,
+            version=Version(build=Build(15, 1, 2, 3)),
+            backoff_gate=backoff_gate,
+        )
+        self.assertEqual(id(config.protocol.backoff_gate), id(backoff_gate))
+        retry_policy = RetryPolicy(deadline=60)
+        config = Configuration(
+            service_endpoint='https://example.com/RateLimited.asmx',
+            credentials=Credentials('foo', 'bar'),
+            auth_type=NTLM,
+            version=Version(build=Build(15, 1, 2, 3)),
+            retry_policy=retry_policy,
+        )
+        self.assertEqual(id(config.credentials.retry_policy), id(retry_policy))
+        self.assertFalse(config.credentials.fail_fast)
+        # Configurations with equal credentials share a protocol. Don't silently replace the values of another config
+        for kwargs in (dict(rate_limiter=RateLimiter(requests_per_second=1)), dict(retry_policy=RetryPolicy())):
+            with self.assertRaises(ValueError):
+                Configuration(
+                    service_endpoint='https://example.com/RateLimited.asmx',
+                    credentials=Credentials('foo', 'bar'),
+                    auth_type=NTLM,
+                    version=Version(build=Build(15, 1, 2, 3)),
+                    **kwargs
+                )
+        self.assertEqual(id(config.credentials.rate_limiter), id(rate_limiter))
+        self.assertEqual(id(config.credentials.retry_policy), id(retry_policy))
+        # Passing the same values again is fine
+        Configuration(
+            service_endpoint='https://example.com/RateLimited.asmx',
+            credentials=Credentials('foo', 'bar'),
+            auth_type=NTLM,
+            version=Version(build=Build(15, 1, 2, 3)),
+            rate_limiter=rate_limiter,
+            retry_policy=retry_policy,
+        )
+
 
 class ProtocolTest(unittest.TestCase):
 
@@ -267,6 +328,564 @@ class ProtocolTest(unittest.TestCase):
             self.assertEqual(id(base_p.thread_pool), id(p.thread_pool))
             self.assertEqual(id(base_p._session_pool), id(p._session_pool))
 
+    def test_bounded_executor(self):
+        from threading import Event, Lock
+        from exchangelib.protocol import BoundedExecutor, get_executor, shutdown_executor
+        executor = BoundedExecutor(max_workers=2)
+        lock = Lock()
+        release = Event()
+        state = dict(running=0, max_running=0)
+
+        def work(i):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+            release.wait(1)
+            with lock:
+                state['running'] -= 1
+            return i
+
+        futures = [executor.submit(work, i) for i in range(2)]
+        # A third task must wait for a free slot
+        self.assertFalse(executor._acquire(timeout=0))
+        release.set()
+        futures += [executor.submit(work, i) for i in range(2, 6)]
+        self.assertEqual([f.result() for f in futures], list(range(6)))
+        self.assertLessEqual(state['max_running'], 2)
+        # The worker threads are shared by all protocols, and the executor is re-created after shutdown
+        shared = get_executor()
+        self.assertIs(get_executor(), shared)
+        shutdown_executor()
+        self.assertIsNot(get_executor(), shared)
+
+    def test_session_pool_controller(self):
+        controller = AIMDController(window=4, min_window=1, max_window=5)
+        # Additive increase after 'window' stable responses
+        for _ in range(4):
+            controller.on_success(latency=0.1)
+        self.assertEqual(controller.window, 5)
+        # Never above max_window
+        for _ in range(10):
+            controller.on_success(latency=0.1)
+        self.assertEqual(controller.window, 5)
+        # Unstable response times don't increase the window
+        controller.window = 2
+        controller.on_success(latency=0.1)
+        controller.on_success(latency=10)
+        controller.on_success(latency=0.1)
+        self.assertEqual(controller.window, 2)
+        # Multiplicative decrease, but only once per round-trip
+        controller.window = 5
+        controller.on_congestion()
+        self.assertEqual(controller.window, 2)
+        controller.on_congestion()
+        self.assertEqual(controller.window, 2)
+        controller._last_decrease -= 100
+        controller.on_congestion()
+        self.assertEqual(controller.window, 1)
+        controller._last_decrease -= 100
+        controller.on_congestion()
+        self.assertEqual(controller.window, 1)  # Never below min_window
+
+    def test_backoff_gate(self):
+        gate = BackoffGate()
+        self.assertEqual(gate.remaining(), 0)
+        gate.back_off(0.2)
+        self.assertGreater(gate.remaining(), 0)
+        # A shorter back off does not open the gate earlier
+        gate.back_off(0)
+        self.assertGreater(gate.remaining(), 0)
+        t1 = time.time()
+        gate.wait()
+        self.assertGreater(time.time() - t1, 0.1)
+        self.assertEqual(gate.remaining(), 0)
+
+    def test_rate_limiter(self):
+        # Token bucket
+        rate_limiter = RateLimiter(requests_per_second=20, burst=1)
+        t1 = time.time()
+        for _ in range(5):
+            with rate_limiter:
+                pass
+        self.assertGreater(time.time() - t1, 0.15)
+        self.assertEqual(rate_limiter.in_flight, 0)
+        # Concurrency limit
+        rate_limiter = RateLimiter(max_concurrent=2)
+        self.assertEqual(rate_limiter.try_acquire(), 0)
+        self.assertEqual(rate_limiter.try_acquire(), 0)
+        self.assertEqual(rate_limiter.try_acquire(), RateLimiter.POLL_INTERVAL)
+        rate_limiter.release()
+        self.assertEqual(rate_limiter.try_acquire(), 0)
+        self.assertEqual(rate_limiter.in_flight, 2)
+
+    def test_retry_policy(self):
+        rule = RetryRule(initial_delay=1, multiplier=3, max_delay=5, jitter=0.5, max_attempts=4)
+        self.assertEqual([rule.get_delay(i) for i in range(4)], [1, 3, 5, 5])
+        for _ in range(10):
+            self.assertTrue(0 <= rule.get_jitter(2) <= 1)
+        policy = RetryPolicy(rules={RetryPolicy.CONNECTION_ERROR: rule, RetryPolicy.UNAUTHORIZED: None}, deadline=20)
+        delay, jitter = policy.get_delay(RetryPolicy.CONNECTION_ERROR, attempt=1, elapsed=0)
+        self.assertEqual(delay, 3)
+        # Error classes mapped to None are not retried
+        self.assertIsNone(policy.get_delay(RetryPolicy.UNAUTHORIZED, attempt=0, elapsed=0))
+        # Max attempts and the deadline make us give up
+        with self.assertRaises(RateLimitError):
+            policy.get_delay(RetryPolicy.CONNECTION_ERROR, attempt=4, elapsed=0)
+        with self.assertRaises(RateLimitError):
+            policy.get_delay(RetryPolicy.SERVER_BUSY, attempt=0, elapsed=15)
+        # ServiceAccount keeps the max_wait API
+        credentials = ServiceAccount('foo', 'bar', max_wait=15)
+        self.assertEqual(credentials.retry_policy.deadline, 15)
+        credentials.max_wait = 30
+        self.assertEqual(credentials.retry_policy.deadline, 30)
+        self.assertTrue(Credentials('foo', 'bar').fail_fast)
+
+    @requests_mock.mock()
+    def test_retry_connection_error(self, m):
+        # Connection errors are retried quickly
+        url = 'https://example.com/Retry.asmx'
+        m.post(url, [dict(exc=requests.exceptions.ConnectionError), dict(text='OK', status_code=200)])
+        retry_policy = RetryPolicy(rules={RetryPolicy.CONNECTION_ERROR: RetryRule(initial_delay=0.01, max_attempts=1)})
+        protocol = Protocol(service_endpoint=url, credentials=Credentials('A', 'B', retry_policy=retry_policy),
+                            auth_type=NTLM, verify_ssl=True, version=Version(Build(15, 1)))
+        session = protocol.get_session()
+        t1 = time.time()
+        r, session = post_ratelimited(protocol=protocol, session=session, url=url, headers=None, data='')
+        self.assertLess(time.time() - t1, 1)
+        self.assertEqual(r.text, 'OK')
+        self.assertEqual(m.call_count, 2)
+        # We give up after max_attempts retries
+        m.post(url, exc=requests.exceptions.ConnectionError)
+        with self.assertRaises(RateLimitError):
+            post_ratelimited(protocol=protocol, session=session, url=url, headers=None, data='')
+
+    @requests_mock.mock()
+    def test_deadline(self, m):
+        from exchangelib.errors import DeadlineExceeded
+        from exchangelib.protocol import BoundedExecutor
+        from exchangelib.util import deadline, get_deadline
+        url = 'https://example.com/Deadline.asmx'
+        protocol = Protocol(service_endpoint=url, credentials=ServiceAccount('A', 'B'), auth_type=NTLM,
+                            verify_ssl=True, version=Version(Build(15, 1)))
+        # Nested deadlines can only shorten the outer deadline
+        self.assertIsNone(get_deadline())
+        with deadline(1) as outer:
+            with deadline(5) as inner:
+                self.assertIs(inner, outer)
+            with deadline(0.5) as inner:
+                self.assertLess(inner.remaining(), 0.6)
+            self.assertIs(get_deadline(), outer)
+            # Worker threads get the deadline of the thread that submitted the task
+            self.assertIs(BoundedExecutor(max_workers=1).submit(get_deadline).result(), outer)
+        self.assertIsNone(get_deadline())
+        # We don't wait for a session longer than the deadline allows
+        sessions = [protocol.get_session() for _ in range(protocol.session_pool_controller.window)]
+        t1 = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            with deadline(0.2):
+                protocol.get_session()
+        self.assertLess(time.time() - t1, 1)
+        for session in sessions:
+            protocol.release_session(session)
+        # We don't retry if the retry would happen after the deadline
+        m.post(url, status_code=503)
+        session = protocol.get_session()
+        t1 = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            with deadline(2):
+                post_ratelimited(protocol=protocol, session=session, url=url, headers=None, data='')
+        self.assertLess(time.time() - t1, 1)
+        # A request that times out because the deadline shortened the timeout exceeds the deadline, also when the
+        # credentials don't retry
+        url = 'https://example.com/DeadlineTimeout.asmx'
+        m.post(url, exc=requests.exceptions.ReadTimeout)
+        protocol = Protocol(service_endpoint=url, credentials=Credentials('A', 'B'), auth_type=NTLM,
+                            verify_ssl=True, version=Version(Build(15, 1)))
+        session = protocol.get_session()
+        with self.assertRaises(DeadlineExceeded):
+            with deadline(2):
+                post_ratelimited(protocol=protocol, session=session, url=url, headers=None, data='', timeout=10)
+        session = protocol.get_session()
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            with deadline(20):
+                post_ratelimited(protocol=protocol, session=session, url=url, headers=None, data='', timeout=10)
+        # We don't wait for a slot in a busy executor longer than the deadline allows
+        executor = BoundedExecutor(max_workers=1)
+        future = executor.submit(time.sleep, 0.5)
+        t1 = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            with deadline(0.1):
+                executor.submit(time.sleep, 0)
+        self.assertLess(time.time() - t1, 0.4)
+        future.result()
+        self.assertEqual(executor.submit(time.sleep, 0).result(), None)
+
+    def test_hedged_requests(self):
+        from threading import Lock
+        from exchangelib.services import CreateItem, UpdateItem, DeleteItem, SendItem, MoveItem, FindItem
+
+        class HedgingProtocol(Protocol):
+            HEDGE_REQUESTS = True
+
+        calls = []
+        lock = Lock()
+
+        class SlowResolveNames(ResolveNames):
+            def _send_single_request(self, soap_payload, stream=False):
+                with lock:
+                    calls.append(soap_payload)
+                    n = len(calls)
+                if n == 1:
+                    # The first request hits a slow backend
+                    time.sleep(0.5)
+                    return 'slow', 0.5
+                return 'fast', 0.01
+
+        protocol = HedgingProtocol(service_endpoint='https://example.com/Hedging.asmx',
+                                   credentials=Credentials('A', 'B'), auth_type=NTLM, verify_ssl=True,
+                                   version=Version(Build(15, 1)))
+        # We don't hedge until we know the usual response time
+        self.assertIsNone(protocol.get_hedge_delay('ResolveNames'))
+        for _ in range(20):
+            protocol.get_latency_tracker('ResolveNames').add(0.05)
+        self.assertEqual(protocol.get_hedge_delay('ResolveNames'), 0.05)
+        t1 = time.time()
+        r, _ = SlowResolveNames(protocol=protocol)._send_request(soap_payload='')
+        self.assertLess(time.time() - t1, 0.4)
+        self.assertEqual(r, 'fast')
+        self.assertEqual(len(calls), 2)
+        # Fast responses are not hedged
+        r, _ = SlowResolveNames(protocol=protocol)._send_request(soap_payload='')
+        self.assertEqual(len(calls), 3)
+        # Services that change anything on the server are never hedged
+        for service_cls in (CreateItem, UpdateItem, DeleteItem, SendItem, MoveItem):
+            self.assertFalse(service_cls.READ_ONLY)
+        for service_cls in (GetItem, FindItem, ResolveNames):
+            self.assertTrue(service_cls.READ_ONLY)
+
+    def test_coalesced_requests(self):
+        from threading import Event, Thread
+        from exchangelib.util import SingleFlight
+        # Concurrent calls with the same key share one call
+        single_flight = SingleFlight()
+        started, release = Event(), Event()
+        calls = []
+
+        def func():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return len(calls)
+
+        results = []
+        leader = Thread(target=lambda: results.append(single_flight.do(key='a', func=func)))
+        leader.start()
+        started.wait(2)
+        followers = [Thread(target=lambda: results.append(single_flight.do(key='a', func=func))) for _ in range(5)]
+        for t in followers:
+            t.start()
+        # Calls with another key are not coalesced
+        self.assertEqual(single_flight.do(key='b', func=lambda: 'b'), 'b')
+        time.sleep(0.2)  # Let the followers start waiting
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+        self.assertEqual(results, [1] * 6)
+        self.assertEqual(len(single_flight), 0)
+        # Exceptions are shared, too. Finished calls are not cached.
+        with self.assertRaises(ValueError):
+            single_flight.do(key='a', func=lambda: int('x'))
+        self.assertEqual(single_flight.do(key='a', func=lambda: 2), 2)
+
+    def test_coalesced_service_requests(self):
+        from threading import Event, Thread
+        from exchangelib.services import CreateItem
+
+        class CoalescingProtocol(Protocol):
+            COALESCE_REQUESTS = True
+
+        started, release = Event(), Event()
+        calls = []
+
+        class SlowResolveNames(ResolveNames):
+            def _send_read_request(self, soap_payload):
+                calls.append(soap_payload)
+                n = len(calls)
+                started.set()
+                release.wait(2)
+                return n, 0
+
+        class FakeCreateItem(CreateItem):
+            def _send_single_request(self, soap_payload, stream=False):
+                return 'created', 0
+
+        protocol = CoalescingProtocol(service_endpoint='https://example.com/Coalescing.asmx',
+                                      credentials=Credentials('A', 'B'), auth_type=NTLM, verify_ssl=True,
+                                      version=Version(Build(15, 1)))
+        self.assertFalse(Protocol.COALESCE_REQUESTS)
+        results = {}
+
+        def read(name):
+            results[name] = SlowResolveNames(protocol=protocol)._send_request(soap_payload='x')[0]
+
+        # Identical reads that are in flight at the same time share the response
+        first, second = Thread(target=read, args=('first',)), Thread(target=read, args=('second',))
+        first.start()
+        started.wait(2)
+        second.start()
+        time.sleep(0.2)  # Let the second read start waiting
+        # A read that starts after a write has finished doesn't join the read that started before the write
+        self.assertEqual(FakeCreateItem(account=mock_account(protocol=protocol, version=protocol.version))
+                         ._send_request(soap_payload='y'), ('created', 0))
+        third = Thread(target=read, args=('third',))
+        third.start()
+        time.sleep(0.2)
+        release.set()
+        for t in (first, second, third):
+            t.join()
+        self.assertEqual(results, {'first': 1, 'second': 1, 'third': 2})
+        self.assertEqual(len(calls), 2)
+
+    def test_shared_throttling_state(self):
+        import tempfile
+        # Instances using the same state file behave as if they were different processes sharing the state
+        tmpdir = tempfile.mkdtemp()
+        gate_path, rate_path = os.path.join(tmpdir, 'backoff'), os.path.join(tmpdir, 'rate')
+        gate1, gate2 = SharedBackoffGate(gate_path), SharedBackoffGate(gate_path)
+        self.assertEqual(gate2.remaining(), 0)
+        gate1.back_off(0.2)
+        self.assertGreater(gate2.remaining(), 0)
+        t1 = time.time()
+        gate2.wait()
+        self.assertGreater(time.time() - t1, 0.1)
+        self.assertEqual(gate1.remaining(), 0)
+        # The token bucket is shared
+        rate_limiter1 = SharedRateLimiter(rate_path, requests_per_second=20, burst=1)
+        rate_limiter2 = SharedRateLimiter(rate_path, requests_per_second=20, burst=1)
+        self.assertEqual(rate_limiter1.try_acquire(), 0)
+        self.assertGreater(rate_limiter2.try_acquire(), 0)
+        t1 = time.time()
+        for rate_limiter in (rate_limiter1, rate_limiter2, rate_limiter1, rate_limiter2):
+            with rate_limiter:
+                pass
+        self.assertGreater(time.time() - t1, 0.15)
+        # A garbled state file is reset
+        with open(gate_path, 'w') as f:
+            f.write('foo')
+        self.assertEqual(gate1.remaining(), 0)
+        for path in (gate_path, rate_path):
+            os.remove(path)
+        os.rmdir(tmpdir)
+
+    @requests_mock.mock()
+    def test_session_pool_size(self, m):
+        protocol = Protocol(service_endpoint='https://example.com/Pool.asmx', credentials=Credentials('A', 'B'),
+                            auth_type=NTLM, verify_ssl=True, version=Version(Build(15, 1)))
+        self.assertEqual(protocol._session_pool_size, protocol.SESSION_POOLSIZE)
+        # Sessions are created lazily when the window grows
+        protocol.session_pool_controller.window = 6
+        sessions = [protocol.get_session() for _ in range(6)]
+        self.assertEqual(protocol._session_pool_size, 6)
+        # Sessions are closed when they are released and the window has shrunk
+        protocol.session_pool_controller.window = 2
+        for session in sessions:
+            protocol.release_session(session)
+        self.assertEqual(protocol._session_pool_size, 2)
+        self.assertEqual(protocol._session_pool.qsize(), 2)
+
+    @requests_mock.mock()
+    def test_idle_sessions(self, m):
+        from exchangelib.protocol import start_keep_warm_thread, stop_keep_warm_thread
+        from exchangelib.util import time_func
+        pool_sizes = []
+        status_codes = [200]
+        rate_limiter = RateLimiter(max_concurrent=1)
+
+        def callback(request, context):
+            # Record the number of sessions available to other threads while we are warming up
+            pool_sizes.append(protocol._session_pool.qsize())
+            self.assertEqual(rate_limiter.in_flight, 1)
+            context.status_code = status_codes[0]
+            return ''
+
+        m.post('https://example.com/Idle.asmx', text=callback)
+        protocol = Protocol(service_endpoint='https://example.com/Idle.asmx',
+                            credentials=Credentials('A', 'B', rate_limiter=rate_limiter), auth_type=NTLM,
+                            verify_ssl=True, version=Version(Build(15, 1)))
+        # Recently used sessions are re-used
+        session = protocol.get_session()
+        protocol.release_session(session)
+        self.assertIs(protocol.get_session(), session)
+        # Sessions that have been idle for too long are replaced
+        session.last_used -= protocol.SESSION_KEEPALIVE + 1
+        protocol.release_session(session)
+        session.last_used -= protocol.SESSION_KEEPALIVE + 1
+        new_session = protocol.get_session()
+        self.assertIsNot(new_session, session)
+        protocol.release_session(new_session)
+        self.assertEqual(protocol._session_pool.qsize(), protocol.SESSION_POOLSIZE)
+        # Keeping warm only sends requests on sessions that have been idle for a while
+        idle_session = protocol.get_session()
+        protocol.release_session(idle_session)
+        idle_session.last_used -= protocol.SESSION_KEEPALIVE / 2 + 1
+        for s in list(protocol._session_pool.queue):
+            if s is not idle_session:
+                s.last_used = time_func()
+        protocol.keep_warm()
+        self.assertEqual(m.call_count, 1)
+        self.assertEqual(pool_sizes, [protocol.SESSION_POOLSIZE - 1])
+        self.assertLess(time_func() - idle_session.last_used, 1)
+        self.assertEqual(protocol._session_pool.qsize(), protocol.SESSION_POOLSIZE)
+        self.assertEqual(rate_limiter.in_flight, 0)
+        # Sessions that fail authentication are replaced
+        idle_session.last_used -= protocol.SESSION_KEEPALIVE / 2 + 1
+        status_codes[0] = 401
+        protocol.keep_warm()
+        self.assertEqual(m.call_count, 2)
+        self.assertNotIn(idle_session, protocol._session_pool.queue)
+        self.assertEqual(protocol._session_pool.qsize(), protocol.SESSION_POOLSIZE)
+        # We don't warm up sessions while the server has asked us to back off
+        for s in list(protocol._session_pool.queue):
+            s.last_used -= protocol.SESSION_KEEPALIVE / 2 + 1
+        protocol.backoff_gate.back_off(10)
+        protocol.keep_warm()
+        self.assertEqual(m.call_count, 2)
+        # The keep-warm thread can be started and stopped
+        start_keep_warm_thread()
+        stop_keep_warm_thread()
+
+    @requests_mock.mock()
+    def test_parallel_startup(self, m):
+        class ParallelProtocol(Protocol):
+            PARALLEL_STARTUP = True
+            USE_SETTINGS_CACHE = False
+
+        service_response = """\
+<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Header>
+    <h:ServerVersionInfo MajorBuildNumber="845" MajorVersion="15" MinorBuildNumber="22" MinorVersion="1"
+        Version="V2016_10_10" xmlns:h="http://schemas.microsoft.com/exchange/services/2006/types"/>
+  </s:Header>
+  <s:Body>
+    <m:ResolveNamesResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages">
+      <m:ResponseMessages>
+        <m:ResolveNamesResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+        </m:ResolveNamesResponseMessage>
+      </m:ResponseMessages>
+    </m:ResolveNamesResponse>
+  </s:Body>
+</s:Envelope>"""
+
+        def service_callback(request, context):
+            # Only accept authenticated requests
+            if 'Authorization' not in request.headers:
+                context.status_code = 401
+                context.headers['WWW-Authenticate'] = 'Basic realm="example.com"'
+                return ''
+            context.status_code = 200
+            return service_response
+
+        def types_callback(request, context):
+            if 'Authorization' not in request.headers:
+                context.status_code = 401
+                context.headers['WWW-Authenticate'] = 'Basic realm="example.com"'
+                return ''
+            context.status_code = 200
+            return '<?xml version="1.0" encoding="utf-8"?><xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" ' \
+                   'version="Exchange2013"/>'
+
+        m.post('https://example.com/Parallel.asmx', text=service_callback)
+        m.get('https://example.com/EWS/types.xsd', text=types_callback)
+        protocol = ParallelProtocol(service_endpoint='https://example.com/Parallel.asmx',
+                                    credentials=Credentials('A', 'B'), auth_type=None, verify_ssl=True)
+        self.assertEqual(protocol.auth_type, BASIC)
+        self.assertEqual(protocol.docs_auth_type, BASIC)
+        self.assertEqual(protocol.version.build, Build(15, 1, 845, 22))
+        # All sessions were authenticated up front, and the version was guessed using the hint from types.xsd
+        authenticated = [r for r in m.request_history if r.method == 'POST' and 'Authorization' in r.headers]
+        self.assertEqual(len(authenticated), protocol.SESSION_POOLSIZE + 1)
+        self.assertIn(b'Exchange2013', authenticated[-1].body)
+        self.assertEqual(protocol._session_pool.qsize(), protocol.SESSION_POOLSIZE)
+
+        # Like the serial startup, we read types.xsd with the service auth type if we can't get the docs auth type
+        def docs_callback(request, context):
+            if 'Authorization' not in request.headers:
+                context.status_code = 500
+                return ''
+            return types_callback(request, context)
+
+        m.get('https://example.com/EWS/types.xsd', text=docs_callback)
+        protocol.close()
+        ParallelProtocol.clear_cache()
+        protocol = ParallelProtocol(service_endpoint='https://example.com/Parallel.asmx',
+                                    credentials=Credentials('A', 'B'), auth_type=None, verify_ssl=True)
+        self.assertEqual(protocol.docs_auth_type, BASIC)
+        authenticated = [r for r in m.request_history if r.method == 'POST' and 'Authorization' in r.headers]
+        self.assertIn(b'Exchange2013', authenticated[-1].body)
+
+    @requests_mock.mock()
+    def test_settings_cache(self, m):
+        from exchangelib.protocol import _protocol_settings_cache
+
+        class CachingSettingsProtocol(Protocol):
+            USE_SETTINGS_CACHE = True
+
+        endpoint = 'https://example.com/Cached.asmx'
+        version = Version(Build(15, 1, 845, 22))
+        _protocol_settings_cache.set(service_endpoint=endpoint, auth_type=NTLM, docs_auth_type=BASIC, version=version)
+        try:
+            # No requests are needed to create the protocol when the settings are cached
+            protocol = CachingSettingsProtocol(service_endpoint=endpoint, credentials=Credentials('A', 'B'),
+                                               auth_type=None, verify_ssl=True)
+            self.assertEqual(m.call_count, 0)
+            self.assertTrue(protocol.settings_from_cache)
+            self.assertEqual(protocol.auth_type, NTLM)
+            self.assertEqual(protocol.docs_auth_type, BASIC)
+            self.assertEqual(protocol.version.build, version.build)
+            self.assertEqual(protocol.version.api_version, version.api_version)
+            # Expired entries are ignored
+            _protocol_settings_cache.TTL = 0
+            self.assertIsNone(_protocol_settings_cache.get(endpoint))
+            del _protocol_settings_cache.TTL
+            self.assertIsNotNone(_protocol_settings_cache.get(endpoint))
+
+            # When the cached auth type doesn't work, we probe the server again and retry the request
+            def service_callback(request, context):
+                if not request.headers.get('Authorization', '').startswith('Basic'):
+                    context.status_code = 401
+                    context.headers['WWW-Authenticate'] = 'Basic realm="example.com"'
+                    return ''
+                context.status_code = 200
+                return """\
+<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:ResolveNamesResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages">
+      <m:ResponseMessages>
+        <m:ResolveNamesResponseMessage ResponseClass="Error">
+          <m:MessageText>No results were found.</m:MessageText>
+          <m:ResponseCode>ErrorNameResolutionNoResults</m:ResponseCode>
+        </m:ResolveNamesResponseMessage>
+      </m:ResponseMessages>
+    </m:ResolveNamesResponse>
+  </s:Body>
+</s:Envelope>"""
+
+            m.post(endpoint, text=service_callback)
+            with self.assertRaises(ErrorNameResolutionNoResults):
+                list(ResolveNames(protocol=protocol).call(unresolved_entries=['xxx']))
+            self.assertFalse(protocol.settings_from_cache)
+            self.assertEqual(protocol.auth_type, BASIC)
+            self.assertEqual(_protocol_settings_cache.get(endpoint)[0], BASIC)
+            # A wrong auth type that didn't come from the cache is not retried
+            m.post(endpoint, status_code=401)
+            with self.assertRaises(UnauthorizedError):
+                list(ResolveNames(protocol=protocol).call(unresolved_entries=['xxx']))
+        finally:
+            _protocol_settings_cache.delete(endpoint)
+
     def test_close(self):
         proc = psutil.Process()
         ip_addr = socket.gethostbyname('example.com')
@@ -425,6 +1044,40 @@ class EWSDateTimeTest(unittest.TestCase):
         # Test normalize, for completeness
         self.assertEqual(tz.normalize(tz.localize(EWSDateTime(2000, 1, 1))).ewsformat(), '2000-01-01T00:00:00+01:00')
 
+    def test_ewsdatetime_from_string(self):
+        # Offsets are converted to UTC
+        for date_string, utc_dt in (
+                ('2000-01-02T03:04:05Z', EWSDateTime(2000, 1, 2, 3, 4, 5)),
+                ('2000-01-02T03:04:05+05:30', EWSDateTime(2000, 1, 1, 21, 34, 5)),
+                ('2000-12-31T23:04:05-02:15', EWSDateTime(2001, 1, 1, 1, 19, 5)),
+                ('2000-01-02T03:04:05.1234567Z', EWSDateTime(2000, 1, 2, 3, 4, 5, 123456)),
+                ('2000-01-02T03:04:05.5+01:00', EWSDateTime(2000, 1, 2, 2, 4, 5, 500000)),
+        ):
+            dt = EWSDateTime.from_string(date_string)
+            self.assertIsInstance(dt, EWSDateTime)
+            self.assertEqual(dt, UTC.localize(utc_dt))
+            self.assertEqual(dt.tzinfo, UTC)
+        with self.assertRaises(NaiveDateTimeNotAllowed) as e:
+            EWSDateTime.from_string('2000-01-02T03:04:05')
+        self.assertEqual(e.exception.args[0], EWSDateTime(2000, 1, 2, 3, 4, 5))
+        for invalid in ('2000-13-02T03:04:05Z', 'XXX'):
+            with self.assertRaises(ValueError):
+                EWSDateTime.from_string(invalid)
+        for date_string in ('2000-01-02', '2000-01-02Z', '2000-01-02+01:00', '2000-01-02-01:00'):
+            self.assertEqual(EWSDate.from_string(date_string), EWSDate(2000, 1, 2))
+
+        # Formatting
+        self.assertEqual(UTC.localize(EWSDateTime(2000, 1, 2, 3, 4, 5, 6)).ewsformat(), '2000-01-02T03:04:05Z')
+        self.assertEqual(UTC.localize(EWSDateTime(5, 1, 2, 3, 4, 5)).ewsformat(), '0005-01-02T03:04:05Z')
+        for location, ewsformat in (
+                ('Etc/GMT-5', '2000-01-02T03:04:05+05:00'),
+                ('Etc/GMT+5', '2000-01-02T03:04:05-05:00'),
+        ):
+            dt = EWSTimeZone.timezone(location).localize(EWSDateTime(2000, 1, 2, 3, 4, 5, 6))
+            self.assertEqual(dt.ewsformat(), ewsformat)
+            self.assertEqual(dt.ewsformat(), dt.replace(microsecond=0).isoformat())
+            self.assertEqual(EWSDateTime.from_string(dt.ewsformat()), dt.replace(microsecond=0))
+
     def test_generate(self):
         try:
             self.assertDictEqual(generate_map(), CLDR_TO_MS_TIMEZONE_MAP)
@@ -501,6 +1154,51 @@ class PropertiesTest(unittest.TestCase):
         Item.add_field(field, 1)
         Item.remove_field(field)  # When _fields_map does not exist
 
+    def test_fields_from_xml(self):
+        payload = '''\
+<?xml version="1.0" encoding="utf-8"?>
+<t:CalendarItem xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+    <t:ItemId Id="AAA" ChangeKey="BBB"/>
+    <t:Subject>Hello</t:Subject>
+    <t:Subject>Ignored</t:Subject>
+    <t:Categories><t:String>foo</t:String><t:String>bar</t:String></t:Categories>
+    <t:Start>2017-01-02T03:04:05Z</t:Start>
+    <t:IsAllDayEvent>true</t:IsAllDayEvent>
+    <t:Organizer><t:Mailbox><t:Name>Foo</t:Name><t:EmailAddress>foo@example.com</t:EmailAddress></t:Mailbox>
+    </t:Organizer>
+    <t:Unknown>XXX</t:Unknown>
+</t:CalendarItem>'''
+        # The single pass over the children returns the same as searching the children for each field. Nested elements
+        # are cleared when parsed, so each method needs a fresh element.
+        kwargs = CalendarItem.fields_from_xml(elem=to_xml(payload), account=None)
+        elem = to_xml(payload)
+        self.assertEqual(kwargs, {f.name: f.from_xml(elem=elem, account=None) for f in CalendarItem.supported_fields()})
+        self.assertEqual(kwargs['subject'], 'Hello')
+        self.assertEqual(kwargs['categories'], ['foo', 'bar'])
+        self.assertEqual(kwargs['start'], UTC.localize(EWSDateTime(2017, 1, 2, 3, 4, 5)))
+        self.assertEqual(kwargs['is_all_day'], True)
+        self.assertEqual(kwargs['organizer'], Mailbox(name='Foo', email_address='foo@example.com'))
+        self.assertEqual(kwargs['legacy_free_busy_status'], 'Busy')  # The default value
+        item = CalendarItem.from_xml(elem=to_xml(payload), account=None)
+        self.assertEqual((item.item_id, item.changekey, item.subject), ('AAA', 'BBB', 'Hello'))
+
+        # Decoders are updated when fields are added or removed, also on subclasses that share the fields
+        class CustomItem(CalendarItem):
+            pass
+
+        field = TextField('foo', field_uri='calendar:Foo')
+        self.assertNotIn('{%s}Foo' % TNS, CustomItem._get_decoder()[0])
+        CalendarItem.add_field(field, 1)
+        try:
+            self.assertNotIn('_decoder', CustomItem.__dict__)
+            self.assertEqual(CustomItem._get_decoder()[0]['{%s}Foo' % TNS], [field])
+            self.assertEqual(CalendarItem.fields_from_xml(elem=to_xml(payload.replace('XXX', 'YYY').replace(
+                'Unknown', 'Foo')), account=None)['foo'], 'YYY')
+        finally:
+            CalendarItem.remove_field(field)
+        self.assertNotIn('{%s}Foo' % TNS, CalendarItem._get_decoder()[0])
+        self.assertNotIn('{%s}Foo' % TNS, CustomItem._get_decoder()[0])
+
     def test_itemid_equality(self):
         self.assertEqual(ItemId('X', 'Y'), ItemId('X', 'Y'))
         self.assertNotEqual(ItemId('X', 'Y'), ItemId('X', 'Z'))
@@ -655,6 +1353,38 @@ class ItemTest(unittest.TestCase):
         # We reset percent_complete to 0.0 if state is not_started
         self.assertEqual(task.percent_complete, Decimal(0))
 
+    def test_lazy_from_xml(self):
+        payload = '''\
+<?xml version="1.0" encoding="utf-8"?>
+<t:CalendarItem xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+    <t:ItemId Id="AAA" ChangeKey="BBB"/>
+    <t:Subject>Hello</t:Subject>
+    <t:Start>2017-01-02T03:04:05Z</t:Start>
+    <t:Organizer><t:Mailbox><t:Name>Foo</t:Name><t:EmailAddress>foo@example.com</t:EmailAddress></t:Mailbox>
+    </t:Organizer>
+</t:CalendarItem>'''
+        item = CalendarItem.from_xml(elem=to_xml(payload), account=None, lazy=True)
+        self.assertEqual((item.item_id, item.changekey), ('AAA', 'BBB'))
+        # Field values are decoded on first access
+        self.assertNotIn('subject', item.__dict__)
+        self.assertEqual(item.subject, 'Hello')
+        self.assertIn('subject', item.__dict__)
+        self.assertNotIn('start', item.__dict__)
+        # Shallow copies share the decoded values
+        item_copy = copy.copy(item)
+        self.assertEqual(item_copy.organizer, Mailbox(name='Foo', email_address='foo@example.com'))
+        self.assertEqual(item.organizer, Mailbox(name='Foo', email_address='foo@example.com'))
+        # Values that are set are not decoded
+        item.location = 'Bar'
+        self.assertEqual(item.location, 'Bar')
+        with self.assertRaises(AttributeError):
+            item.foo
+        # Lazy items have the same values as other items
+        self.assertEqual(repr(item_copy), repr(CalendarItem.from_xml(elem=to_xml(payload), account=None)))
+        self.assertEqual(item.attachments, [])
+        with self.assertRaises(AttributeError):
+            CalendarItem().foo
+
 
 class RestrictionTest(unittest.TestCase):
     def setUp(self):
@@ -763,6 +1493,14 @@ class QuerySetTest(unittest.TestCase):
         self.assertIsInstance(folder.filter(subject='foo'), QuerySet)
         self.assertIsInstance(folder.exclude(subject='foo'), QuerySet)
 
+    def test_lazy(self):
+        qs = QuerySet(folder=Inbox(account='XXX'))
+        self.assertFalse(qs.is_lazy)
+        lazy_qs = qs.lazy()
+        self.assertTrue(lazy_qs.is_lazy)
+        self.assertFalse(qs.is_lazy)
+        self.assertTrue(lazy_qs.filter(subject='foo').is_lazy)
+
     def test_queryset_copy(self):
         qs = QuerySet(folder=Inbox(account='XXX'))
         qs.q = Q()
@@ -836,6 +1574,436 @@ class ServicesTest(unittest.TestCase):
         with self.assertRaises(NotImplementedError):
             GetRooms(protocol=account.protocol).call('XXX')
 
+    def test_additional_properties_cache(self):
+        version = Version(build=EXCHANGE_2013)
+        account = mock_account(version=version, protocol=None)
+        additional_fields = [FieldPath(field=f) for f in Contact.supported_fields(version=version)]
+        payload = GetItem(account=account).get_payload(items=[('AAA', 'BBB')], additional_fields=additional_fields)
+        additional_properties = list(payload.iter('t:AdditionalProperties'))[0]
+        expected = create_element('t:AdditionalProperties')
+        set_xml_value(expected, chain(*(f.expand(version=version) for f in additional_fields)), version)
+        self.assertEqual(xml_to_parts(additional_properties), xml_to_parts(expected))
+
+        # The element is reused for the same set of fields, in any order
+        payload = GetItem(account=account).get_payload(items=[('CCC', 'DDD')],
+                                                       additional_fields=reversed(additional_fields))
+        self.assertIs(list(payload.iter('t:AdditionalProperties'))[0], additional_properties)
+        payload = GetItem(account=account).get_payload(items=[('CCC', 'DDD')],
+                                                       additional_fields=additional_fields[1:])
+        self.assertIsNot(list(payload.iter('t:AdditionalProperties'))[0], additional_properties)
+
+        # Registering and deregistering fields clears the cache
+        class TestProp(ExtendedProperty):
+            property_set_id = 'deadbeaf-cafe-cafe-cafe-deadbeefcafe'
+            property_name = 'Test Property'
+            property_type = 'Integer'
+
+        Contact.register(attr_name='dead_beef', attr_cls=TestProp)
+        try:
+            payload = GetItem(account=account).get_payload(items=[('AAA', 'BBB')],
+                                                           additional_fields=additional_fields)
+            self.assertIsNot(list(payload.iter('t:AdditionalProperties'))[0], additional_properties)
+        finally:
+            Contact.deregister(attr_name='dead_beef')
+
+        # Extended properties registered with the same name on different item classes don't share elements
+        class MessageProp(ExtendedProperty):
+            property_set_id = 'aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa'
+            property_name = 'Test Property'
+            property_type = 'Integer'
+
+        class CalendarProp(ExtendedProperty):
+            property_set_id = 'bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb'
+            property_name = 'Test Property'
+            property_type = 'Integer'
+
+        Message.register(attr_name='custom', attr_cls=MessageProp)
+        CalendarItem.register(attr_name='custom', attr_cls=CalendarProp)
+        try:
+            for item_cls, property_set_id in ((Message, MessageProp.property_set_id),
+                                              (CalendarItem, CalendarProp.property_set_id)):
+                field_path = FieldPath(field=item_cls.get_field_by_fieldname('custom'))
+                payload = GetItem(account=account).get_payload(items=[('AAA', 'BBB')], additional_fields=[field_path])
+                xml = b''.join(xml_to_parts(list(payload.iter('t:AdditionalProperties'))[0]))
+                self.assertIn(property_set_id.encode('ascii'), xml)
+        finally:
+            Message.deregister(attr_name='custom')
+            CalendarItem.deregister(attr_name='custom')
+
+        # The build is unknown until we have talked to the server
+        version = Version(build=None, api_version='Exchange2013')
+        account = mock_account(version=version, protocol=None)
+        field_path = FieldPath(field=Message.get_field_by_fieldname('subject'))
+        payload = GetItem(account=account).get_payload(items=[('AAA', 'BBB')], additional_fields=[field_path])
+        self.assertIn(b'item:Subject', b''.join(xml_to_parts(payload)))
+        # Cached elements can also be serialized by ElementTree, which wrap() falls back to for qualified tag names
+        payload.append(Element('{%s}Foo' % TNS))
+        soap_xml = wrap(content=payload, version=version.api_version)
+        self.assertIn(b'<t:FieldURI FieldURI="item:Subject"', soap_xml)
+
+    @requests_mock.mock()
+    def test_server_busy_back_off(self, m):
+        # Test that we get the BackOffMilliseconds value from both SOAP faults and response messages
+        soap_xml = """\
+<?xml version="1.0" encoding="utf-8" ?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <s:Fault>
+      <faultcode xmlns:a="http://schemas.microsoft.com/exchange/services/2006/types">a:ErrorServerBusy</faultcode>
+      <faultstring xml:lang="en-US">The server cannot service this request right now. Try again later.</faultstring>
+      <detail xmlns:e="http://schemas.microsoft.com/exchange/services/2006/errors"
+              xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+        <e:ResponseCode>ErrorServerBusy</e:ResponseCode>
+        <e:Message>Try again later.</e:Message>
+        <t:MessageXml>
+          <t:Value Name="BackOffMilliseconds">297749</t:Value>
+        </t:MessageXml>
+      </detail>
+    </s:Fault>
+  </s:Body>
+</s:Envelope>"""
+        with self.assertRaises(ErrorServerBusy) as e:
+            ResolveNames._get_soap_payload(to_xml(soap_xml))
+        self.assertEqual(e.exception.back_off, 297.749)
+
+        msg_xml = to_xml("""\
+<m:MessageXml xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+              xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+  <t:Value Name="BackOffMilliseconds">1500</t:Value>
+</m:MessageXml>""")
+        with self.assertRaises(ErrorServerBusy) as e:
+            ResolveNames._raise_errors(code='ErrorServerBusy', text='Try again later.', msg_xml=msg_xml)
+        self.assertEqual(e.exception.back_off, 1.5)
+        with self.assertRaises(ErrorServerBusy) as e:
+            ResolveNames._raise_errors(code='ErrorServerBusy', text='Try again later.', msg_xml=None)
+        self.assertIsNone(e.exception.back_off)
+
+        # A server that stays busy makes us give up when the retry policy runs out of time...
+        url = 'https://example.com/ServerBusy.asmx'
+        m.post(url, status_code=500, text=soap_xml.replace('297749', '1'))
+        retry_policy = RetryPolicy(rules={RetryPolicy.SERVER_BUSY: RetryRule(initial_delay=0.001)}, deadline=0.2)
+        protocol = Protocol(service_endpoint=url, credentials=Credentials('A', 'B', retry_policy=retry_policy),
+                            auth_type=NTLM, verify_ssl=True, version=Version(Build(15, 1)))
+        t1 = time.time()
+        with self.assertRaises(RateLimitError):
+            GetServerTimeZones(protocol=protocol).call()
+        self.assertLess(time.time() - t1, 1)
+        self.assertGreater(m.call_count, 1)
+        # ... or out of attempts
+        m.reset_mock()
+        retry_policy.rules[RetryPolicy.SERVER_BUSY] = RetryRule(initial_delay=0, max_attempts=2)
+        with self.assertRaises(RateLimitError):
+            GetServerTimeZones(protocol=protocol).call()
+        self.assertEqual(m.call_count, 3)
+
+    def test_streaming_response(self):
+        xml = b"""\
+<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Header>
+    <h:ServerVersionInfo MajorBuildNumber="845" MajorVersion="15" MinorBuildNumber="22" MinorVersion="1"
+        Version="V2016_10_10" xmlns:h="http://schemas.microsoft.com/exchange/services/2006/types"/>
+  </s:Header>
+  <s:Body>
+    <m:GetItemResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+        xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:GetItemResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:Items>
+            <t:Message><t:Subject>1</t:Subject></t:Message>
+            <t:Message><t:Subject>2</t:Subject></t:Message>
+          </m:Items>
+        </m:GetItemResponseMessage>
+        <m:GetItemResponseMessage ResponseClass="Error">
+          <m:MessageText>The specified object was not found in the store.</m:MessageText>
+          <m:ResponseCode>ErrorItemNotFound</m:ResponseCode>
+        </m:GetItemResponseMessage>
+        <m:GetItemResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:Items><t:Message><t:Subject>3</t:Subject></t:Message></m:Items>
+        </m:GetItemResponseMessage>
+      </m:ResponseMessages>
+    </m:GetItemResponse>
+  </s:Body>
+</s:Envelope>"""
+
+        class MockResponse(object):
+            # Serves the content in small chunks, and records how much was read
+            def __init__(self, content):
+                self.content = content
+                self.pos = 0
+                self.closed = False
+
+            def iter_content(self, chunk_size):
+                while self.pos < len(self.content):
+                    self.pos += 100
+                    yield self.content[self.pos - 100:self.pos]
+
+            def close(self):
+                self.closed = True
+
+        closed = []
+        r = MockResponse(xml)
+        response = StreamingResponse(response=r, service_name='GetItem', container_name='{%s}Items' % MNS,
+                                     on_close=lambda: closed.append(True))
+        self.assertEqual(response.read_body().tag, '{%s}GetItemResponse' % MNS)
+        self.assertEqual(response.header.find('{%s}ServerVersionInfo' % TNS).get('MajorVersion'), '15')
+        subjects, codes = [], []
+        for msg in response:
+            codes.append(get_xml_attr(msg, '{%s}ResponseCode' % MNS))
+            container = msg.find('{%s}Items' % MNS)
+            if container is not None:
+                for elem in response.iter_children(container):
+                    subjects.append(get_xml_attr(elem, '{%s}Subject' % TNS))
+                    # The response is parsed incrementally
+                    self.assertLess(r.pos, len(xml))
+                # Consumed elements are detached
+                self.assertEqual(len(container), 0)
+        self.assertEqual(subjects, ['1', '2', '3'])
+        self.assertEqual(codes, ['NoError', 'ErrorItemNotFound', 'NoError'])
+        response.close()
+        self.assertTrue(r.closed)
+        self.assertEqual(closed, [True])
+        response.close()
+        self.assertEqual(closed, [True])  # Only released once
+
+        # Bad XML and premature end of data
+        for content in (xml.replace(b'</m:Items>', b'</m:Foo>'), xml[:xml.index(b'</m:ResponseMessages>')]):
+            response = StreamingResponse(response=MockResponse(content), service_name='GetItem',
+                                         container_name='{%s}Items' % MNS)
+            response.read_body()
+            with self.assertRaises(SOAPError):
+                list(response)
+
+    @requests_mock.mock()
+    def test_streaming_service(self, m):
+        protocol = Protocol(service_endpoint='https://example.com/Streaming.asmx', credentials=Credentials('A', 'B'),
+                            auth_type=NOAUTH, verify_ssl=True, version=Version(Build(15, 1)))
+        xml = b"""\
+<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:GetRoomListsResponse ResponseClass="Success"
+        xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+        xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseCode>NoError</m:ResponseCode>
+      <m:RoomLists>
+        <t:Address><t:EmailAddress>roomlist1@example.com</t:EmailAddress></t:Address>
+        <t:Address><t:EmailAddress>roomlist2@example.com</t:EmailAddress></t:Address>
+      </m:RoomLists>
+    </m:GetRoomListsResponse>
+  </s:Body>
+</s:Envelope>"""
+        m.post('https://example.com/Streaming.asmx', status_code=200, content=xml)
+        ws = GetRoomLists(protocol=protocol)
+        idle_sessions = protocol._session_pool.qsize()
+        res = ws._get_elements(payload=ws.get_payload(), stream=True)
+        # The session is busy until we have consumed the response
+        self.assertEqual(protocol._session_pool.qsize(), idle_sessions - 1)
+        self.assertEqual(
+            [RoomList.from_xml(elem=elem, account=None).email_address for elem in res],
+            ['roomlist1@example.com', 'roomlist2@example.com']
+        )
+        self.assertEqual(protocol._session_pool.qsize(), idle_sessions)
+        # SOAP faults are raised before any elements are returned
+        m.post('https://example.com/Streaming.asmx', status_code=500, content=b"""\
+<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <s:Fault>
+      <faultcode xmlns:a="http://schemas.microsoft.com/exchange/services/2006/types">a:ErrorAccessDenied</faultcode>
+      <faultstring>Access is denied.</faultstring>
+    </s:Fault>
+  </s:Body>
+</s:Envelope>""")
+        with self.assertRaises(SOAPError):
+            ws._get_elements(payload=ws.get_payload(), stream=True)
+        self.assertEqual(protocol._session_pool.qsize(), idle_sessions)
+
+    @requests_mock.mock()
+    def test_affinity(self, m):
+        class MockAccount(object):
+            def __init__(self, protocol, primary_smtp_address):
+                self.protocol = protocol
+                self.version = protocol.version
+                self.primary_smtp_address = primary_smtp_address
+                self.access_type = DELEGATE
+                self.affinity_cookie = None
+
+        protocol = Protocol(service_endpoint='https://example.com/Affinity.asmx', credentials=Credentials('A', 'B'),
+                            auth_type=NOAUTH, verify_ssl=True, version=Version(Build(15, 1)))
+        account1 = MockAccount(protocol, 'foo@example.com')
+        account2 = MockAccount(protocol, 'bar@example.com')
+        for session in protocol._session_pool.queue:
+            # requests_mock doesn't store response cookies in the session like a real response does
+            session.hooks['response'].append(lambda r, session=session, **kwargs: session.cookies.update(r.cookies))
+        m.post('https://example.com/Affinity.asmx', status_code=200, content=b'',
+               headers={'Set-Cookie': 'X-BackEndOverrideCookie=BACKEND1; path=/'})
+        GetItem(account=account1)._send_request(soap_payload=b'')
+        request = m.request_history[-1]
+        self.assertEqual(request.headers['X-AnchorMailbox'], 'foo@example.com')
+        self.assertEqual(request.headers['X-PreferServerAffinity'], 'True')
+        self.assertNotIn('Cookie', request.headers)
+        self.assertEqual(account1.affinity_cookie, 'BACKEND1')
+        # The cookie is not sent with requests for other accounts, even though they share sessions
+        m.post('https://example.com/Affinity.asmx', status_code=200, content=b'')
+        for _ in range(protocol.SESSION_POOLSIZE):
+            GetItem(account=account2)._send_request(soap_payload=b'')
+            request = m.request_history[-1]
+            self.assertEqual(request.headers['X-AnchorMailbox'], 'bar@example.com')
+            self.assertNotIn('Cookie', request.headers)
+        self.assertIsNone(account2.affinity_cookie)
+        # The cookie is replayed for the account it belongs to
+        GetItem(account=account1)._send_request(soap_payload=b'')
+        self.assertEqual(m.request_history[-1].headers['Cookie'], 'X-BackEndOverrideCookie=BACKEND1')
+        self.assertEqual(account1.affinity_cookie, 'BACKEND1')
+
+    @requests_mock.mock()
+    def test_request_hooks(self, m):
+        events = []
+
+        class Hook(RequestHook):
+            def on_session_wait(self, trace):
+                events.append(('on_session_wait', trace.service, trace.session_wait is not None))
+
+            def on_request_start(self, trace):
+                events.append(('on_request_start', trace.url, trace.bytes_sent > 0))
+
+            def on_response(self, trace):
+                events.append(('on_response', trace.status_code, trace.bytes_received))
+
+        protocol = Protocol(service_endpoint='https://example.com/Hooks.asmx', credentials=Credentials('A', 'B'),
+                            auth_type=NOAUTH, verify_ssl=True, version=Version(Build(15, 1)))
+        response = AsyncTest.TIMEZONES_RESPONSE.encode('utf-8')
+        m.post('https://example.com/Hooks.asmx', status_code=200, content=response)
+        hook = Hook()
+        register_hook(hook)
+        try:
+            self.assertEqual(len(list(GetServerTimeZones(protocol=protocol).call())), 2)
+        finally:
+            unregister_hook(hook)
+        self.assertEqual(events, [
+            ('on_session_wait', 'GetServerTimeZones', True),
+            ('on_request_start', 'https://example.com/Hooks.asmx', True),
+            ('on_response', 200, len(response)),
+        ])
+        # Unregistered hooks are not called
+        list(GetServerTimeZones(protocol=protocol).call())
+        self.assertEqual(len(events), 3)
+
+
+@unittest.skipIf(sys.version_info < (3, 6), 'The asyncio transport requires Python 3.6+')
+class AsyncTest(unittest.TestCase):
+    # Test the asyncio transport against a local HTTP server. The coroutines are driven explicitly using the event loop,
+    # since this file must be importable on Python 2.
+    TIMEZONES_RESPONSE = '''\
+<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <m:GetServerTimeZonesResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages"
+        xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:GetServerTimeZonesResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:TimeZoneDefinitions>
+            <t:TimeZoneDefinition Id="Romance Standard Time" Name="(UTC+01:00) Brussels, Copenhagen, Madrid, Paris"/>
+            <t:TimeZoneDefinition Id="UTC" Name="(UTC) Coordinated Universal Time"/>
+          </m:TimeZoneDefinitions>
+        </m:GetServerTimeZonesResponseMessage>
+      </m:ResponseMessages>
+    </m:GetServerTimeZonesResponse>
+  </s:Body>
+</s:Envelope>'''
+
+    def setUp(self):
+        try:
+            import aiohttp  # noqa
+        except ImportError:
+            self.skipTest("The 'aiohttp' package is not installed")
+        import asyncio
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        from threading import Thread
+        test = self
+        self.requests = []
+        self.status_code = 200
+        self.response_text = self.TIMEZONES_RESPONSE
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                test.requests.append(self.rfile.read(int(self.headers['Content-Length'])))
+                body = test.response_text.encode('utf-8')
+                self.send_response(test.status_code)
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        Thread(target=self.server.serve_forever).start()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        import asyncio
+        from exchangelib.aio import close_connections as close_async_connections
+        self.loop.run_until_complete(close_async_connections())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_protocol(self, credentials):
+        return Protocol(service_endpoint='http://127.0.0.1:%s/EWS/Exchange.asmx' % self.server.server_port,
+                        credentials=credentials, auth_type=NOAUTH, verify_ssl=True, version=Version(Build(15, 1)))
+
+    def test_get_elements(self):
+        from exchangelib.aio import get_elements
+        service = GetServerTimeZones(protocol=self.get_protocol(Credentials('A', 'B')))
+        payload = service.get_payload(returnfulltimezonedata=False)
+        res = self.loop.run_until_complete(get_elements(service=service, payload=payload))
+        self.assertEqual(res, [
+            ('Romance Standard Time', '(UTC+01:00) Brussels, Copenhagen, Madrid, Paris'),
+            ('UTC', '(UTC) Coordinated Universal Time'),
+        ])
+        self.assertEqual(len(self.requests), 1)
+        self.assertIn(b'GetServerTimeZones', self.requests[0])
+
+    def test_error_response(self):
+        from exchangelib.aio import get_elements
+        service = GetServerTimeZones(protocol=self.get_protocol(Credentials('A', 'B')))
+        payload = service.get_payload(returnfulltimezonedata=False)
+        self.status_code = 401
+        self.response_text = ''
+        with self.assertRaises(UnauthorizedError):
+            self.loop.run_until_complete(get_elements(service=service, payload=payload))
+        self.status_code = 500
+        self.response_text = 'XXX'
+        with self.assertRaises(TransportError):
+            self.loop.run_until_complete(get_elements(service=service, payload=payload))
+
+    def test_unsupported_auth_type(self):
+        from exchangelib.aio import AsyncProtocol
+        protocol = self.get_protocol(Credentials('A', 'B'))
+        protocol.auth_type = NTLM
+        with self.assertRaises(ValueError):
+            AsyncProtocol(protocol=protocol)
+
+    def test_queryset_aiter(self):
+        qs = QuerySet(folder=Inbox(account='XXX'))
+        qs._cache = [1, 2]
+        it = qs.__aiter__()
+        self.assertEqual(self.loop.run_until_complete(it.__anext__()), 1)
+        self.assertEqual(self.loop.run_until_complete(it.__anext__()), 2)
+        with self.assertRaises(StopAsyncIteration):
+            self.loop.run_until_complete(it.__anext__())
+        it = qs.none().__aiter__()
+        with self.assertRaises(StopAsyncIteration):
+            self.loop.run_until_complete(it.__anext__())
+
 
 class TransportTest(unittest.TestCase):
     @requests_mock.mock()
@@ -908,6 +2076,50 @@ class TransportTest(unittest.TestCase):
         r = requests.get(url)
         self.assertEqual(_get_auth_method_from_response(r), DIGEST)
 
+    def test_streamed_request_body(self):
+        data = os.urandom(StreamedContent.MIN_SIZE + 1)
+        content = create_element('m:CreateAttachment')
+        content.append(Base64Field('content', field_uri='Content').to_xml(data, version=None))
+        text = create_element('t:Data')
+        text.text = StreamedContent('<' * (StreamedContent.CHUNK_SIZE + 1))
+        content.append(text)
+        body = wrap(content=content, version=EXCHANGE_2010.api_version(), stream=True)
+        self.assertIsInstance(body, StreamedRequestBody)
+        self.assertFalse(hasattr(body, '__len__'))  # Makes 'requests' use chunked transfer encoding
+        streamed_xml = b''.join(body)
+        self.assertEqual(b''.join(body), streamed_xml)  # The body can be iterated again
+        self.assertEqual(body.size, len(streamed_xml))
+        # The streamed body must be identical to the normal body, and the content must be reusable
+        self.assertEqual(wrap(content=content, version=EXCHANGE_2010.api_version()), streamed_xml)
+        self.assertIsInstance(text.text, StreamedContent)
+        self.assertIn(base64.b64encode(data), streamed_xml)
+        self.assertIn(b'&lt;' * (StreamedContent.CHUNK_SIZE + 1), streamed_xml)
+
+        # Small content is not streamed
+        content = create_element('m:CreateAttachment')
+        content.append(Base64Field('content', field_uri='Content').to_xml(b'XXX', version=None))
+        self.assertIsInstance(wrap(content=content, version=EXCHANGE_2010.api_version(), stream=True), bytes)
+
+    def test_envelope_cache(self):
+        MockTZ = namedtuple('EWSTimeZone', ['ms_id'])
+        MockAccount = namedtuple('Account', ['access_type', 'primary_smtp_address', 'default_timezone'])
+        for account in (
+            None,
+            MockAccount(DELEGATE, 'foo@example.com', MockTZ('XXX')),
+            MockAccount(IMPERSONATION, 'foo@example.com', MockTZ('XXX')),
+            MockAccount(IMPERSONATION, 'bar@example.com', MockTZ('YYY')),
+        ):
+            content = create_element('m:AAA')
+            add_xml_child(content, 't:BBB', 'CCC')
+            envelope, body = _create_envelope(version='Exchange2010', account=account)
+            body.append(content)
+            # The cached envelope must give the same result as serializing the full envelope, also on cache hits
+            for _ in range(2):
+                self.assertEqual(wrap(content=content, version='Exchange2010', account=account),
+                                 xml_to_str(envelope, encoding='utf-8', xml_declaration=True))
+        # The impersonated mailbox is part of the cache key
+        self.assertIn(b'bar@example.com', wrap(content=content, version='Exchange2010', account=account))
+
 
 class UtilTest(unittest.TestCase):
     def test_chunkify(self):
@@ -1008,6 +2220,70 @@ class UtilTest(unittest.TestCase):
             # Not all lxml versions throw an error here, so we can't use assertRaises
             self.assertIn('Offending text: [...]<t:Foo><t:Bar>Baz</t[...]', e.args[0])
 
+    def test_create_element(self):
+        e1 = create_element('t:FieldURI', FieldURI='item:Subject')
+        self.assertEqual((e1.tag, e1.attrib), ('t:FieldURI', {'FieldURI': 'item:Subject'}))
+        # Changing one element must not affect the next
+        e1.attrib['Id'] = 'XXX'
+        e1.text = 'YYY'
+        e1.append(create_element('t:Child'))
+        e2 = create_element('t:FieldURI', FieldURI='item:Subject')
+        self.assertEqual((e2.attrib, e2.text, len(e2)), ({'FieldURI': 'item:Subject'}, None, 0))
+        self.assertEqual(create_element('t:FieldURI', FieldURI='item:Body').attrib, {'FieldURI': 'item:Body'})
+
+    def test_xml_to_parts(self):
+        root = create_element('m:Root', Id='a&b<c>"d"\ne')
+        child = create_element('t:Child')
+        child.text = 'x & y < z >'
+        root.append(child)
+        root.append(create_element('t:Empty', Foo='Bar'))
+        nested = create_element('t:Nested')
+        add_xml_child(nested, 't:Value', '1')
+        root.append(nested)
+        parts = xml_to_parts(root, encoding='utf-8', xml_declaration=True)
+        self.assertEqual(len(parts), 1)
+        # The output must be identical to that of ElementTree
+        self.assertEqual(parts[0], xml_to_str(root, encoding='utf-8', xml_declaration=True))
+
+        # Streamed content is returned as-is between the serialized parts
+        data = create_element('t:Data')
+        data.text = StreamedContent('XXX')
+        root.append(data)
+        parts = xml_to_parts(root)
+        self.assertEqual(len(parts), 3)
+        self.assertTrue(parts[0].endswith(b'<t:Data>'))
+        self.assertIs(parts[1], data.text)
+        self.assertEqual(parts[2], b'</t:Data></m:Root>')
+
+        # Qualified tag names are not supported
+        with self.assertRaises(ValueError):
+            xml_to_parts(create_element('{%s}Foo' % TNS))
+
+    def test_xml_backend(self):
+        from io import BytesIO
+        from xml.etree.ElementTree import ParseError
+        from exchangelib.util import set_xml_backend, get_xml_backend, iterparse, ETREE, LXML
+        self.assertEqual(get_xml_backend(), ETREE)
+        with self.assertRaises(ValueError):
+            set_xml_backend('XXX')
+        data = '<?xml version="1.0" encoding="utf-8"?><Foo xmlns="%s"><Bar>Baz</Bar></Foo>' % TNS
+        try:
+            set_xml_backend(LXML)
+            # Parsed elements have the same API as with the default backend
+            root = to_xml(BOM + data)
+            self.assertEqual(root.find('{%s}Bar' % TNS).text, 'Baz')
+            self.assertEqual(xml_to_str(root), '<Foo xmlns="%s"><Bar>Baz</Bar></Foo>' % TNS)
+            # Faulty XML is recovered
+            self.assertEqual(to_xml('<Foo><Bar>Baz</Foo>').find('Bar').text, 'Baz')
+            with self.assertRaises(ParseError):
+                to_xml('Not XML')
+            self.assertEqual([(e, elem.tag) for e, elem in iterparse(BytesIO(data.encode('utf-8')), ('end',))],
+                             [('end', '{%s}Bar' % TNS), ('end', '{%s}Foo' % TNS)])
+            with self.assertRaises(ParseError):
+                list(iterparse(BytesIO(b'<Foo></Bar>'), ('end',)))
+        finally:
+            set_xml_backend(ETREE)
+
     def test_get_domain(self):
         self.assertEqual(get_domain('foo@example.com'), 'example.com')
         with self.assertRaises(ValueError):